@@ -5,25 +5,46 @@ author_url: https://github.com/rex-nihilo/open-webui-toolkit
 funding_url: https://github.com/open-webui
 required_open_webui_version: 0.6.10
 tested_open_webui_version: 0.6.36
-version: 0.4.008
-date: 2025-11-10
+version: 0.5.000
+date: 2026-10-19
 license: MIT
 
 description: A configurable Function Filter for Open WebUI to debug and log inlet/outlet/stream data. Logs to chat, console, or file with options for data selection, obfuscation, and rotation. Ideal for plugin development and understanding Open WebUI internals.
 
 """
 
+import asyncio
+import base64
+import contextlib
+import functools
+import hashlib
+import heapq
+import itertools
 import json
 import os
+import random
 import re
+import socket
+import stat
+import sys
+import tempfile
+import threading
+import time
+import types
+import urllib.request
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional, Callable, List, Any
+from typing import Optional, Callable, List, Any, Iterator
 from pydantic import BaseModel, Field
 from collections.abc import Mapping, Sequence
 import logging
 from logging.handlers import RotatingFileHandler
 
 
+SHARED_STATE_MODULE = "debug_filter_data_shared" # Name of the process-wide namespace shared by the instances (see get_shared_state)
+
+
 class Config:
     """Centralized configuration constants for the plugin.
 
@@ -33,17 +54,23 @@ class Config:
 
     # Valves: Priority by default
     VALVES_PRIORITY = 0 # Priority level for filter execution order (int)
+    VALVES_PROFILER_ROLE = "off" # Filter chain profiler probe: off, start (lowest priority) or end (highest priority) (str)
 
     # Valves: Interaction to debug by default
     VALVES_LOG_INLET = True # Log inlet data (incoming requests) (bool)
     VALVES_LOG_OUTLET = True # Log outlet data (outgoing requests) (bool)
     VALVES_LOG_STREAM = False # Log stream data (streamed model responses) (bool)
+    VALVES_STREAM_KEEP_EVENTS = False # Keep and log the raw stream events, not only the reconstructed response (bool)
+    VALVES_STREAM_MONITOR = False # Show the live throughput of the stream and report the stalls (bool)
+    VALVES_STREAM_STALL_SECONDS = 5.0 # Gap between two stream chunks reported as a stall (float)
 
     # Valves: Send to by default
     VALVES_SEND_TO_CHAT = True # Send debug info directly in chat interface (bool)
     VALVES_SEND_TO_CONSOLE = True # Send debug info to console (bool)
     VALVES_SEND_TO_FILE = False # Send debug info to file (bool)
     VALVES_FILE_PATH = "/app/backend/data/debug_filter_data.log" # Path of log file (str)
+    VALVES_FILE_PER_PROCESS = False # Write one log file per worker process, required with several uvicorn workers (bool)
+    VALVES_TAIL_SOCKET = "" # Unix socket path of the live tail, e.g. '/tmp/debug_filter_data.sock' (empty: disabled) (str)
 
     # Valves: Data to show by default
     VALVES_SHOW_SUMMARY = True # Show summary info (bool)
@@ -62,6 +89,55 @@ class Config:
     VALVES_SHOW_TASK = False # Show __task__ info (bool)
     VALVES_SHOW_TASK_BODY = False # Show __task_body__ info (bool)
     VALVES_SHOW_TOOLS = False # Show __tools__ info (bool)
+    VALVES_SHOW_MEMORY = False # Show the deep memory size of the main sections (profiling) (bool)
+
+    # Valves: Sink profiles by default (empty: the show_* valves)
+    VALVES_CHAT_PROFILE = "" # Data sent to the chat: preset or list, e.g. 'summary' or 'summary, body' (str)
+    VALVES_CONSOLE_PROFILE = "" # Data sent to the console: preset or list (str)
+    VALVES_FILE_PROFILE = "" # Data sent to the log file: preset or list (str)
+    VALVES_TAIL_PROFILE = "" # Data sent to the live tail: preset or list (str)
+
+    # Valves: Capture targeting by default
+    VALVES_CAPTURE_ONLY = "" # Capture only the matching requests, e.g. 'user:<id>, model:llama3' (str)
+    VALVES_CAPTURE_IGNORE = "" # Never capture the matching requests, e.g. 'task:title_generation' (str)
+    VALVES_CAPTURE_ARMED_REQUESTS = 0 # Armed capture: disable capture after N captured requests (0: no limit) (int)
+    VALVES_CAPTURE_ARMED_MINUTES = 0 # Armed capture: disable capture after T minutes (0: no limit) (int)
+
+    # Valves: Multi-model comparison by default
+    VALVES_COMPARE_MODELS = False # Compare side by side the responses of the models selected for one prompt (bool)
+
+    # Valves: Background tasks by default
+    VALVES_TASK_POLICIES = "" # Capture policy per task, e.g. 'title_generation:skip, *:summary' (empty: full for all) (str)
+    VALVES_TASK_ACCOUNTING = False # Count the background task calls of each chat turn and their duration (bool)
+
+    # Valves: Tracing by default
+    VALVES_TRACE_EXPORT = False # Export each request as a trace (OTLP-JSON spans) (bool)
+    VALVES_TRACE_ENDPOINT = "/app/backend/data/debug_filter_data.traces.jsonl" # File path or OTLP/HTTP URL (e.g. 'http://localhost:4318/v1/traces') (str)
+
+    # Valves: Schema inference by default
+    VALVES_SCHEMA_INFERENCE = False # Infer the merged schema of the payloads and report drifts (bool)
+    VALVES_SCHEMA_PATH = "/app/backend/data/debug_filter_data.schema.json" # File where the schema is saved and reloaded as baseline (empty: memory only) (str)
+
+    # Valves: Flight recorder by default
+    VALVES_FLIGHT_RECORDER = False # Keep the last requests in memory and dump them only when a trigger fires (bool)
+    VALVES_FLIGHT_LATENCY_SECONDS = 0.0 # Latency (inlet to outlet) that triggers a dump (0: no latency trigger) (float)
+    VALVES_FLIGHT_PATH = "/app/backend/data/debug_filter_data.flight.jsonl" # File where the dumps are appended (JSON lines) (str)
+
+    # Valves: Rolling statistics by default
+    VALVES_ROLLING_STATS = False # Keep rolling statistics per model and task (bool)
+
+    # Valves: Prompt prefix analysis by default
+    VALVES_PREFIX_ANALYSIS = False # Compare the prompt of each turn with the previous turn of the chat (prompt cache reuse) (bool)
+
+    # Valves: Context budget by default
+    VALVES_CONTEXT_BUDGET = False # Break the size of the prompt down by source, compared with the context length (bool)
+    VALVES_TOKENIZER = "" # Tokenizer of the counts: 'tiktoken:<encoding>', 'hf:<model>' (empty: heuristic) (str)
+
+    # Valves: Data handling by default
+    VALVES_DIGEST_LARGE_DATA = True # Replace large strings (base64 images, file contents) by a digest (bool)
+    VALVES_OFFLOAD_THRESHOLD_KB = 256 # Data larger than this (estimated, in KB) is formatted in a worker thread (0: always inline) (int)
+    VALVES_OFFLOAD_WORKERS = 2 # Number of formatting worker threads (int)
+    VALVES_OFFLOAD_TIMEOUT_SECONDS = 10.0 # Formatting time after which the report is truncated (float)
 
     # Debug options
     DEBUG_INFO = False # Enable debug info in console (for plugin development ONLY) (recommended: False) (bool)
@@ -73,6 +149,7 @@ class Config:
     LOG_ERROR_WARNING = True  # Show warnings in console if file logging fails (bool)
     LOG_LEVEL = "INFO"  # Log level for file (DEBUG, INFO, WARNING, ERROR) (str)
     LOG_SIZE = 10  # Limit log size (in MB) (int)
+    LOG_CHUNK_SIZE = 65536  # Number of characters written at once by the console and file sinks, bounds the memory of a report (int)
 
     # Message options
     MESSAGE_CLEAN_CHAT_HISTORY = True # Clean the message history of the plugin content displayed in the chat (recommended: True) (bool)
@@ -88,6 +165,13 @@ class Config:
     SECURITY_OBFUSCATE = True # Obfuscate sensitive data (recommended: True) (bool)
     SECURITY_OBFUSCATE_DATA = ["email","date_of_birth", "api_key"] # List of keys whose values must be obfuscated (list)
     SECURITY_OBFUSCATE_MASK = "**** OBFUSCATED ****" # Text used to indicate that the value is obfuscated (str)
+    SECURITY_SANITIZE_MAX_DEPTH = 64 # Nesting depth above which data is no longer walked (int)
+
+    # Type adapter options (objects that are not JSON data, see TypeAdapters)
+    ADAPTER_REQUEST_HEADERS = ["host", "user-agent", "content-type", "content-length", "origin", "referer", "x-forwarded-for"] # Headers shown for a request, never add 'authorization' or 'cookie' (list)
+    ADAPTER_MAX_ATTRIBUTES = 50 # Maximum number of attributes shown for an unknown object (int)
+    ADAPTER_MAX_REPR = 500 # Maximum length of the str() of an object without attributes (int)
+    ADAPTER_SIZE_CACHE = 256 # Maximum number of tool specs whose serialized size is kept, by identity (int)
 
     # Status features in Open WebUI chat
     STATUS_USE = True # Show status info when running (bool)
@@ -98,6 +182,7 @@ class Config:
     STATUS_INFO_OUTLET_OK = "🗐 Debug Filter Data - Step outlet OK" # Text of the status at the inlet end (str)
     STATUS_INFO_STREAM_START = "🗐 Debug Filter Data - Step stream..." # Text of the status at the stream start (str)
     STATUS_INFO_STREAM_OK = "🗐 Debug Filter Data - Step stream OK" # Text of the status at the stream end (str)
+    STATUS_INFO_STREAM_LIVE = "⚡️ Streaming:" # Prefix of the live throughput status (str)
     STATUS_INFO_COMPLETED = "🗐 Debug Filter Data completed" # Text of the status at the end (str)
 
     # Title options
@@ -105,12 +190,1855 @@ class Config:
     TITLE_INLET = "🔵 INLET DATA" # Title for intlet data (str)
     TITLE_OUTLET = "🟢 OUTLET DATA" # Title for outlet data (str)
     TITLE_STREAM = "⚡️ STREAM DATA" # Title for stream data (str)
+    TITLE_CHAIN = "🔗 FILTER CHAIN" # Title for the filter chain profiler measures (str)
+    TITLE_SCHEMA = "🧬 SCHEMA" # Title for the inferred schema (str)
+    TITLE_SCHEMA_DRIFT = "🧬 SCHEMA DRIFT" # Title for the schema drifts (str)
+    TITLE_STATS = "📈 MODEL STATS" # Title for the rolling statistics (str)
+    TITLE_STALL = "🐢 STREAM STALL" # Title for the stream stall warnings (str)
+    TITLE_FLIGHT = "✈️ FLIGHT RECORDER DUMP" # Title for the flight recorder dumps (str)
+    TITLE_PREFIX = "✂️ PROMPT PREFIX" # Title for the broken prompt prefixes (str)
+    TITLE_COMPARE = "⚖️ MODEL COMPARISON" # Title for the multi-model comparisons (str)
+    TITLE_CAPACITY = "DEBUG FILTER DATA CAPACITY REPORT" # Title for the capacity report (command 'report') (str)
+
+    # Digest options (large strings replaced by a descriptor, see 'digest_large_data')
+    DIGEST_BASE64_MIN_SIZE = 1024 # Minimum length of a data URI or base64 string to digest it (int)
+    DIGEST_BASE64_SAMPLES = 16 # Number of windows of 64 characters, spread over the whole string, checked to recognize raw base64 (int)
+    DIGEST_TEXT_MAX_SIZE = 16384 # Plain text longer than this is digested (int)
+    DIGEST_TEXT_PREVIEW = 200 # Number of characters kept as preview of a digested text (int)
+    DIGEST_CHUNK_SIZE = 65536 # Number of characters hashed at once, bounds the memory used by the hash (int)
+    DIGEST_HASH = "sha256" # Hash algorithm of the digest (any hashlib algorithm) (str)
+
+    # Capture targeting options
+    CAPTURE_TARGETS = ["user", "email", "chat", "model", "task"] # Target types accepted in 'capture_only' and 'capture_ignore' (list)
+    CAPTURE_TASK_CHAT = "chat" # Task name matching the requests without task (regular chat) (str)
+
+    # Request temp options
+    REQUEST_MAX_PENDING = 1000 # Maximum number of requests kept between inlet and outlet, the oldest are dropped (int)
+
+    # Multi-model comparison options (see 'compare_models')
+    COMPARE_PARENT_KEYS = ["parent_message_id", "parent_id"] # Keys of the parent message id in __metadata__ or body, the last user message is used if none (list)
+    COMPARE_MAX_GROUPS = 256 # Maximum number of prompts compared at once, the least recently used are dropped (int)
+
+    # Background task options (see 'task_policies' and 'task_accounting')
+    TASK_POLICIES = ["skip", "summary", "full"] # Capture policies: nothing (accounting only), the summary only, everything (list)
+    TASK_ANY = "*" # Task name matching all the background tasks in 'task_policies' (str)
+    TASK_MAX_CHATS = 256 # Maximum number of chats accounted, the least recently used are dropped (int)
+
+    # Trace options (see 'trace_export')
+    TRACE_SERVICE_NAME = "open-webui" # Value of the 'service.name' resource attribute (str)
+    TRACE_BATCH_SIZE = 512 # Maximum number of spans exported at once (int)
+    TRACE_FLUSH_INTERVAL = 5 # Seconds between two exports (float)
+    TRACE_QUEUE_SIZE = 10000 # Maximum number of spans waiting for export, the oldest are dropped (int)
+    TRACE_IDLE_TIMEOUT = 60 # Seconds without span before the export thread stops (float)
+    TRACE_HTTP_TIMEOUT = 5 # Timeout of a request to the collector in seconds (float)
+
+    # Memory report options (see 'show_memory')
+    MEMORY_SECTIONS = ["body", "__metadata__", "__model__", "__tools__", "__files__", "__messages__"] # Sections measured (list)
+    MEMORY_TOP_PATHS = 10 # Number of heaviest subpaths shown per section (int)
+    MEMORY_PATH_DEPTH = 4 # Maximum depth of the subpaths shown (int)
+
+    # Filter chain profiler options (see 'profiler_role')
+    PROFILER_MAX_PENDING = 1000 # Maximum number of requests stamped by the start probe and not yet measured (int)
+
+    # Schema inference options (see 'schema_inference')
+    SCHEMA_SECTIONS = ["body", "__metadata__", "__model__"] # Sections merged in the schema (list)
+    SCHEMA_MAX_DEPTH = 8 # Nesting depth above which the structure is not merged (int)
+    SCHEMA_MAX_KEYS = 200 # Maximum number of keys tracked per object, the others are only counted (int)
+    SCHEMA_MAX_ITEMS = 50 # Number of items of an array merged (the first ones) (int)
+    SCHEMA_MAX_NODES = 20000 # Maximum number of schema nodes over all the roots, the new paths beyond are only counted (int)
+    SCHEMA_UNION_PATHS = ["messages[].content", "messages[].content[]"] # Paths whose type and keys vary by request (text or multimodal parts), never reported as drift (list)
+    SCHEMA_STABLE_COUNT = 20 # Number of observations after which a change of a path is reported as drift (int)
+    SCHEMA_MAX_DRIFTS = 20 # Maximum number of drifts reported per interaction (int)
+    SCHEMA_REPORT_EVERY = 100 # Log and save the schema every N requests (int)
+    SCHEMA_REPORT_INTERVAL = 3600 # Log and save the schema at least every N seconds (float)
+
+    # Rolling statistics options (see 'rolling_stats')
+    STATS_RESERVOIR_SIZE = 256 # Number of values sampled per metric for the percentiles (int)
+    STATS_PERCENTILES = [50, 90, 99] # Percentiles shown (list)
+    STATS_MAX_GROUPS = 100 # Maximum number of model/task groups, the others are merged in 'other' (int)
+    STATS_DUMP_INTERVAL = 300 # Log the statistics of all the groups every N seconds (float)
+
+    # Stream monitor options (see 'stream_monitor')
+    MONITOR_STATUS_INTERVAL = 1.0 # Minimum seconds between two live throughput statuses (float)
+    MONITOR_RATE_WINDOW = 3.0 # Window of the moving tokens/sec rate in seconds (float)
+    MONITOR_MAX_STALLS = 20 # Maximum number of stalls kept per response (all are counted and logged) (int)
+
+    # Prompt prefix options (see 'prefix_analysis')
+    PREFIX_BLOCK_SIZE = 64 # Bytes hashed per block, precision of the common prefix (int)
+    PREFIX_MAX_BLOCKS = 16384 # Maximum number of blocks kept per chat (8 bytes each), the prompt beyond is compared by message (int)
+    PREFIX_MAX_CHATS = 256 # Maximum number of chats kept, the least recently used are dropped (int)
+    PREFIX_PREVIEW = 120 # Number of bytes of the new prompt shown at the first difference (int)
+
+    # Token count options (see 'tokenizer')
+    TOKENS_BYTES_PER_TOKEN = 4 # Bytes per token of the heuristic estimate (int)
+    TOKENS_CACHE_SIZE = 4096 # Maximum number of text token counts kept (int)
+    TOKENS_MAX_EXACT_SIZE = 1048576 # Texts longer than this (characters) are estimated, not tokenized (int)
+
+    # Context budget options (see 'context_budget')
+    CONTEXT_SOURCES = ["system", "user", "assistant", "tool_results", "rag", "tool_specs", "images"] # Sources of the breakdown, in display order (list)
+    CONTEXT_RAG_PATTERN = r"<context>.*?</context>" # Retrieved context (RAG, files) injected in the messages by the RAG template (str)
+    CONTEXT_TOKENS_PER_IMAGE = 768 # Tokens counted per image, depends on the model and the resolution (int)
+    CONTEXT_LENGTH_PATHS = ["body.options.num_ctx", "body.num_ctx", "__model__.info.params.num_ctx", "__model__.context_length", "__model__.openai.context_length", "__model__.info.meta.context_length"] # Paths of the context length, first found wins (list)
+    CONTEXT_WARNING_RATIO = 0.9 # Share of the context length above which the prompt is near truncation (float)
+
+    # Flight recorder options (see 'flight_recorder')
+    FLIGHT_SIZE = 20 # Number of requests kept in the recorder (int)
+    FLIGHT_STALL_SECONDS = 600.0 # Time without outlet after which a request is dumped as stalled, by the next inlet (float)
+
+    # Live tail options (see 'tail_socket')
+    TAIL_BUFFER_SIZE = 4194304 # Maximum characters queued per subscriber, the oldest records are dropped (int)
+    TAIL_BUFFER_RECORDS = 1000 # Maximum records queued per subscriber (int)
+    TAIL_MAX_RECORD_SIZE = 1048576 # Records longer than this (characters) are truncated for the tail (int)
+    TAIL_FILTER_TIMEOUT = 1.0 # Seconds a new subscriber has to send its filter line (float)
+    TAIL_RETRY_SECONDS = 60.0 # Seconds before a failed live tail start is retried (float)
+
+    # Formatting offload options (see 'offload_threshold_kb')
+    OFFLOAD_TRUNCATED = "\n... (TRUNCATED: formatting timeout)\n" # Text ending a report truncated by the formatting timeout (str)
+
+    # Section cache options (see SectionCache)
+    CACHE_SECTIONS = ["__user__", "__model__", "__tools__"] # Sections rendered once and served from the cache while unchanged (empty: no cache) (list)
+    CACHE_SIZE = 64 # Maximum number of rendered sections kept (int)
+    CACHE_MAX_SECTION_SIZE = 1048576 # Rendered sections longer than this (characters) are not cached (int)
+    CACHE_FINGERPRINTS = 1024 # Maximum number of objects whose fingerprint is kept by identity and length (int)
+    CACHE_FINGERPRINT_TTL = 2.0 # Seconds a fingerprint kept by identity is reused: an object modified in place (e.g. a model edited in the admin panel) is seen after this delay (float)
+
+    # Sink profile options (see 'chat_profile', 'console_profile', 'file_profile', 'tail_profile')
+    PROFILE_PRESETS = {"summary": ["summary"], "full": ["summary", "body", "user", "metadata", "model", "messages", "chat_id", "session_id", "message_id", "files", "task", "task_body", "tools", "custom"]} # Profile names expanded to data lists (dict)
+
+    # Summary options
+    SUMMARY_FIELDS = ["TYPE", "MODEL", "USER", "MESSAGES COUNT", "KEYS OF body", "KEYS OF __user__", "KEYS OF __metadata__", "KEYS OF __model__", "KEYS OF __messages__", "FILTER CHAIN", "SCHEMA DRIFT", "MODEL STATS", "STREAM MONITOR", "PROMPT PREFIX", "CONTEXT BUDGET", "BACKGROUND TASKS", "MODEL COMPARISON"] # Fields computed in the summary, remove a field to skip it (list)
 
     # Other data
     KEYS_UPPERCASE = ["summary"] # Keys displayed in uppercase (list)
     SWITCH_ICON = """data:image/svg+xml;base64,PD94bWwgdmVyc2lvbj0iMS4wIiBlbmNvZGluZz0iVVRGLTgiPz4KPCEtLSBHZW5lcmF0b3I6IHZpc2lvbmNvcnRleCBWVHJhY2VyIDAuNi40IC0tPgo8c3ZnIHZlcnNpb249IjEuMSIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIiB3aWR0aD0iMTI4IiBoZWlnaHQ9IjEyOCI+CjxwYXRoIGQ9Ik0wIDAgQzI1LjQxIDAgNTAuODIgMCA3NyAwIEM3NyAzLjk2IDc3IDcuOTIgNzcgMTIgQzgxLjYyIDEyIDg2LjI0IDEyIDkxIDEyIEM5MSAxNS45NiA5MSAxOS45MiA5MSAyNCBDOTUuNjIgMjQgMTAwLjI0IDI0IDEwNSAyNCBDMTA1IDU3LjY2IDEwNSA5MS4zMiAxMDUgMTI2IEM3Ny45NCAxMjYgNTAuODggMTI2IDIzIDEyNiBDMjMgMTIxLjM4IDIzIDExNi43NiAyMyAxMTIgQzE5LjM3IDExMiAxNS43NCAxMTIgMTIgMTEyIEMxMiAxMDcuMzggMTIgMTAyLjc2IDEyIDk4IEM4LjA0IDk4IDQuMDggOTggMCA5OCBDMCA2NS42NiAwIDMzLjMyIDAgMCBaIE00IDQgQzQgMzMuNyA0IDYzLjQgNCA5NCBDNi42NCA5NCA5LjI4IDk0IDEyIDk0IEMxMiA2Ni45NCAxMiAzOS44OCAxMiAxMiBDMzIuMTMgMTIgNTIuMjYgMTIgNzMgMTIgQzczIDkuMzYgNzMgNi43MiA3MyA0IEM1MC4yMyA0IDI3LjQ2IDQgNCA0IFogTTE2IDE2IEMxNiA0Ni4zNiAxNiA3Ni43MiAxNiAxMDggQzE4LjMxIDEwOCAyMC42MiAxMDggMjMgMTA4IEMyMyA4MC4yOCAyMyA1Mi41NiAyMyAyNCBDNDQuMTIgMjQgNjUuMjQgMjQgODcgMjQgQzg3IDIxLjM2IDg3IDE4LjcyIDg3IDE2IEM2My41NyAxNiA0MC4xNCAxNiAxNiAxNiBaIE0yOCAyOCBDMjggNTkuMDIgMjggOTAuMDQgMjggMTIyIEM1Mi4wOSAxMjIgNzYuMTggMTIyIDEwMSAxMjIgQzEwMSA5MC45OCAxMDEgNTkuOTYgMTAxIDI4IEM3Ni45MSAyOCA1Mi44MiAyOCAyOCAyOCBaICIgZmlsbD0iIzAwMDAwMCIgdHJhbnNmb3JtPSJ0cmFuc2xhdGUoMTIsMSkiLz4KPHBhdGggZD0iTTAgMCBDMTcuODIgMCAzNS42NCAwIDU0IDAgQzU0IDEuMzIgNTQgMi42NCA1NCA0IEMzNi4xOCA0IDE4LjM2IDQgMCA0IEMwIDIuNjggMCAxLjM2IDAgMCBaICIgZmlsbD0iIzAwMDAwMCIgdHJhbnNmb3JtPSJ0cmFuc2xhdGUoNDksMTA4KSIvPgo8cGF0aCBkPSJNMCAwIEMxNy44MiAwIDM1LjY0IDAgNTQgMCBDNTQgMS4zMiA1NCAyLjY0IDU0IDQgQzM2LjE4IDQgMTguMzYgNCAwIDQgQzAgMi42OCAwIDEuMzYgMCAwIFogIiBmaWxsPSIjMDAwMDAwIiB0cmFuc2Zvcm09InRyYW5zbGF0ZSg0OSw5NCkiLz4KPHBhdGggZD0iTTAgMCBDMTcuODIgMCAzNS42NCAwIDU0IDAgQzU0IDEuMzIgNTQgMi42NCA1NCA0IEMzNi4xOCA0IDE4LjM2IDQgMCA0IEMwIDIuNjggMCAxLjM2IDAgMCBaICIgZmlsbD0iIzAwMDAwMCIgdHJhbnNmb3JtPSJ0cmFuc2xhdGUoNDksODApIi8+CjxwYXRoIGQ9Ik0wIDAgQzE3LjgyIDAgMzUuNjQgMCA1NCAwIEM1NCAxLjMyIDU0IDIuNjQgNTQgNCBDMzYuMTggNCAxOC4zNiA0IDAgNCBDMCAyLjY4IDAgMS4zNiAwIDAgWiAiIGZpbGw9IiMwMDAwMDAiIHRyYW5zZm9ybT0idHJhbnNsYXRlKDQ5LDY2KSIvPgo8cGF0aCBkPSJNMCAwIEMxNy44MiAwIDM1LjY0IDAgNTQgMCBDNTQgMS4zMiA1NCAyLjY0IDU0IDQgQzM2LjE4IDQgMTguMzYgNCAwIDQgQzAgMi42OCAwIDEuMzYgMCAwIFogIiBmaWxsPSIjMDAwMDAwIiB0cmFuc2Zvcm09InRyYW5zbGF0ZSg0OSw1MikiLz4KPHBhdGggZD0iTTAgMCBDMTcuODIgMCAzNS42NCAwIDU0IDAgQzU0IDEuMzIgNTQgMi42NCA1NCA0IEMzNi4xOCA0IDE4LjM2IDQgMCA0IEMwIDIuNjggMCAxLjM2IDAgMCBaICIgZmlsbD0iIzAwMDAwMCIgdHJhbnNmb3JtPSJ0cmFuc2xhdGUoNDksMzkpIi8+Cjwvc3ZnPgo=""" # Icon for UI (with a Data URI) will show up as a little image next to the filter's name. You can use any SVG as long as it's Data URI encoded (str)
 
 
+class CapturePlan:
+    """Capture plan compiled from the Valves.
+
+    Decides once per valve change which sections, summary fields and sinks are live,
+    so the hooks can return immediately when nothing would be emitted.
+    """
+
+    # Sections in display order (key, valve)
+    SECTIONS = (
+        ("body", "show_body"),
+        ("__user__", "show_user"),
+        ("__metadata__", "show_metadata"),
+        ("__model__", "show_model"),
+        ("__messages__", "show_messages"),
+        ("__chat_id__", "show_chat_id"),
+        ("__session_id__", "show_session_id"),
+        ("__message_id__", "show_message_id"),
+        ("__event_emitter__", "show_event_emitter"),
+        ("__event_call__", "show_event_call"),
+        ("__files__", "show_files"),
+        ("__request__", "show_request"),
+        ("__task__", "show_task"),
+        ("__task_body__", "show_task_body"),
+        ("__tools__", "show_tools"),
+    )
+
+    # Sinks with a data profile
+    SINKS = ("chat", "console", "file", "tail")
+    LOG_SINKS = ("console", "file", "tail")
+
+    def __init__(self, valves: BaseModel, signature: tuple):
+        self.signature = signature # Valves values used to detect changes
+
+        # Sinks
+        self.send_to_chat = valves.send_to_chat
+        self.send_to_console = valves.send_to_console
+        self.send_to_file = valves.send_to_file
+        self.send_to_tail = bool((valves.tail_socket or "").strip())
+        self.tail_path = (valves.tail_socket or "").strip().replace("{pid}", str(os.getpid()))
+        self.send_to_log = self.send_to_console or self.send_to_file or self.send_to_tail
+        self.file_settings = (valves.file_path, Config.LOG_LEVEL.upper(), valves.file_per_process, Config.LOG_SIZE, Config.LOG_BACKUP_COUNT) if self.send_to_file else None
+
+        # Data profile of each live sink (ordered tuple of data names, the show_* valves when not set)
+        self.custom_key = (valves.show_custom_key or "").strip()
+        shown = ("summary",) * valves.show_summary + tuple(key for key, valve in self.SECTIONS if getattr(valves, valve)) + ("custom",) * bool(self.custom_key) + ("memory",) * valves.show_memory
+        live_sinks = {"chat": self.send_to_chat, "console": self.send_to_console, "file": self.send_to_file, "tail": self.send_to_tail}
+        self.profiles = {sink: self._parse_profile(getattr(valves, f"{sink}_profile"), shown) for sink in self.SINKS if live_sinks[sink]}
+        self.profiles = {sink: tuple(name for name in profile if name != "custom" or self.custom_key) for sink, profile in self.profiles.items()}
+        self.chat_profile = self.profiles.get("chat", ())
+
+        # Log sinks grouped by profile (each profile is formatted once, see Filter._log_report)
+        self.log_groups = {}
+        for sink in self.LOG_SINKS:
+            if sink in self.profiles:
+                self.log_groups.setdefault(self.profiles[sink], set()).add(sink)
+        self.log_groups = {profile: frozenset(sinks) for profile, sinks in self.log_groups.items()}
+
+        # Data (union of the profiles: selected once, each sink gets its view)
+        used = frozenset(name for profile in self.profiles.values() for name in profile)
+        self.summary_fields = frozenset(Config.SUMMARY_FIELDS) if "summary" in used else frozenset()
+        self.summary = bool(self.summary_fields)
+        self.sections = tuple(key for key, valve in self.SECTIONS if key in used)
+        self.section_set = frozenset(self.sections)
+        self.custom_key = self.custom_key if "custom" in used else ""
+        self.memory = "memory" in used
+        self.profile_keys = {profile: frozenset(f"CUSTOM KEY {self.custom_key}" if name == "custom" else name for name in profile) for profile in set(self.profiles.values())}
+        self.digest = valves.digest_large_data
+        self.offload_threshold = max(0, valves.offload_threshold_kb) * 1024
+        self.offload_workers = max(1, valves.offload_workers)
+        self.offload_timeout = max(0.1, valves.offload_timeout_seconds)
+        self.obfuscate_keys = frozenset(key.lower() for key in Config.SECURITY_OBFUSCATE_DATA) if Config.SECURITY_OBFUSCATE else frozenset()
+
+        # Interactions (the chat report needs the inlet/stream data captured even without console/file)
+        self.inlet = valves.log_inlet and (self.send_to_log or self.send_to_chat)
+        self.outlet = valves.log_outlet and (self.send_to_log or self.send_to_chat)
+        self.stream = valves.log_stream and (self.send_to_log or self.send_to_chat)
+        self.stream_events = valves.stream_keep_events
+        self.monitor = valves.stream_monitor
+        self.stall_seconds = max(0.1, valves.stream_stall_seconds)
+
+        # Multi-model comparison
+        self.compare = valves.compare_models
+
+        # Background tasks
+        self.task_policies = self._parse_policies(valves.task_policies)
+        self.accounting = valves.task_accounting
+
+        # Tracing
+        self.trace = valves.trace_export
+        self.trace_endpoint = (valves.trace_endpoint or Config.VALVES_TRACE_ENDPOINT).strip()
+
+        # Schema inference
+        self.schema = valves.schema_inference
+        self.schema_path = (valves.schema_path or "").strip()
+
+        # Rolling statistics
+        self.stats = valves.rolling_stats
+
+        # Prompt prefix analysis
+        self.prefix = valves.prefix_analysis
+
+        # Context budget (a summary field)
+        self.budget = valves.context_budget and "CONTEXT BUDGET" in self.summary_fields
+        self.tokenizer = (valves.tokenizer or "").strip()
+
+        # Flight recorder
+        self.flight = valves.flight_recorder
+        self.flight_latency = max(0.0, valves.flight_latency_seconds)
+        self.flight_path = (valves.flight_path or Config.VALVES_FLIGHT_PATH).strip()
+
+        # Filter chain profiler probe
+        self.probe = (valves.profiler_role or "").strip().lower()
+        self.probe = self.probe if self.probe in ("start", "end") else None
+
+        # Something would be emitted (report: chat/console/file)
+        self.report = self.send_to_chat or (self.send_to_log and (self.inlet or self.outlet or self.stream))
+        self.active = self.report or self.trace or self.schema or self.stats or self.prefix or self.accounting or self.compare or self.monitor or self.flight or self.probe is not None
+
+        # Targeting (sets of values per target type)
+        self.capture_only = self._parse_targets(valves.capture_only)
+        self.capture_ignore = self._parse_targets(valves.capture_ignore)
+        self.target_types = frozenset(self.capture_only) | frozenset(self.capture_ignore)
+
+        # Armed capture (the state is kept by _get_plan while these valves do not change)
+        self.armed_settings = (max(0, valves.capture_armed_requests), max(0, valves.capture_armed_minutes))
+        self.armed = any(self.armed_settings)
+        self.armed_remaining = self.armed_settings[0]
+        self.armed_deadline = time.monotonic() + self.armed_settings[1] * 60 if self.armed_settings[1] else None
+        self.armed_over = False
+
+        # Requests must be checked before capture
+        self.targeted = bool(self.capture_only or self.capture_ignore or self.armed)
+
+    @staticmethod
+    def _parse_policies(policies: str) -> dict:
+        """Parse a 'task:policy, task:policy' valve into a dict of policies by task name."""
+
+        # Init
+        parsed = {}
+
+        for entry in re.split(r'[,\n]', policies or ""):
+            task, separator, policy = entry.strip().rpartition(":")
+            task = task.strip()
+            policy = policy.strip().lower()
+
+            # Invalid policy
+            if not separator or not task or policy not in Config.TASK_POLICIES:
+                if entry.strip() and Config.DEBUG_WARNING:
+                    print(f"[DEBUG FILTER DATA] WARNING | Invalid task policy ignored: '{entry.strip()}'")
+                continue
+
+            parsed[task] = policy
+
+        return parsed
+
+    @classmethod
+    def _parse_profile(cls, profile: str, default: tuple) -> tuple:
+        """Parse a sink profile valve (presets of Config.PROFILE_PRESETS and data names) into data names in display order.
+
+        Data names are 'summary', 'custom', 'memory' and the sections, with or without underscores ('user' or '__user__').
+        Returns the default profile (the show_* valves) when the valve is empty.
+        """
+
+        # Default profile
+        if not (profile or "").strip():
+            return default
+
+        # Names
+        known = {key.strip("_"): key for key, valve in cls.SECTIONS} | {"summary": "summary", "custom": "custom", "memory": "memory"}
+        names = set()
+        for name in re.split(r'[,\n]', profile):
+            name = name.strip().lower()
+            for item in Config.PROFILE_PRESETS.get(name, [name]):
+                item = item.strip("_")
+                if item in known:
+                    names.add(known[item])
+                elif item and Config.DEBUG_WARNING:
+                    print(f"[DEBUG FILTER DATA] WARNING | Invalid profile data ignored: '{item}'")
+
+        return tuple(name for name in ("summary", *(key for key, valve in cls.SECTIONS), "custom", "memory") if name in names)
+
+    def task_policy(self, task: str | None) -> str:
+        """Return the capture policy of a task (None: regular chat, named Config.CAPTURE_TASK_CHAT)."""
+
+        if not task:
+            return self.task_policies.get(Config.CAPTURE_TASK_CHAT, "full")
+
+        return self.task_policies.get(task, self.task_policies.get(Config.TASK_ANY, "full"))
+
+    @staticmethod
+    def _parse_targets(targets: str) -> dict:
+        """Parse a 'type:value, type:value' valve into a dict of frozensets by target type."""
+
+        # Init
+        parsed = {}
+
+        for target in re.split(r'[,\n]', targets or ""):
+            target_type, separator, value = target.strip().partition(":")
+            target_type = target_type.strip().lower()
+            value = value.strip()
+
+            # Invalid target
+            if not separator or not value or target_type not in Config.CAPTURE_TARGETS:
+                if target.strip() and Config.DEBUG_WARNING:
+                    print(f"[DEBUG FILTER DATA] WARNING | Invalid capture target ignored: '{target.strip()}'")
+                continue
+
+            parsed.setdefault(target_type, set()).add(value.lower() if target_type == "email" else value)
+
+        return {target_type: frozenset(values) for target_type, values in parsed.items()}
+
+
+class ModelComparison:
+    """Sibling requests of a multi-model prompt (same chat and parent message), compared side by side.
+
+    Each request is measured from its inlet (time to first chunk, generation time, chunks, finish reason) to its
+    outlet (output size, total time). A comparison is complete when all the requests of the group reached their
+    outlet. The groups are kept in an LRU of Config.COMPARE_MAX_GROUPS entries.
+    """
+
+    def __init__(self):
+        self.groups = OrderedDict() # {group key: {request key: metrics}}, least recently used first
+
+    def add(self, group_key: str, request_key: str, model: str) -> dict:
+        """Add a request to its group and return its metrics (updated by chunk and end)."""
+
+        metrics = {"model": model, "start": time.monotonic(), "first_chunk": None, "last_chunk": None, "end": None, "chunks": 0, "output_bytes": None, "finish_reason": None}
+        self.groups.setdefault(group_key, {})[request_key] = metrics
+        self.groups.move_to_end(group_key)
+        while len(self.groups) > Config.COMPARE_MAX_GROUPS:
+            self.groups.popitem(last=False)
+
+        return metrics
+
+    @staticmethod
+    def chunk(metrics: dict, event: dict) -> None:
+        """Count a stream chunk of a request."""
+
+        metrics["last_chunk"] = time.monotonic()
+        if metrics["first_chunk"] is None:
+            metrics["first_chunk"] = metrics["last_chunk"]
+        metrics["chunks"] += 1
+        for choice in event.get("choices") or []:
+            if choice.get("finish_reason"):
+                metrics["finish_reason"] = choice["finish_reason"]
+
+    def end(self, group_key: str, request_key: str, output_bytes: int) -> tuple:
+        """End a request at outlet, return (rendered comparison or None for a single model, group complete)."""
+
+        group = self.groups.get(group_key)
+        if not group or request_key not in group:
+            return None, False
+
+        # Metrics
+        metrics = group[request_key]
+        metrics["end"] = time.monotonic()
+        metrics["output_bytes"] = output_bytes
+
+        # Complete
+        complete = all(sibling["end"] is not None for sibling in group.values())
+        if complete:
+            self.groups.pop(group_key)
+
+        return (self.render(group) if len(group) > 1 else None), complete
+
+    @staticmethod
+    def render(group: dict) -> dict:
+        """Return the metrics of the requests of a group by model, with the fastest ones."""
+
+        def seconds(start, stop):
+            return round(stop - start, 3) if start is not None and stop is not None else None
+
+        # Models (same model selected twice: numbered)
+        models = {}
+        for metrics in group.values():
+            name = metrics["model"] or "UNKNOWN"
+            if name in models:
+                name = f"{name} #{sum(1 for other in models if other.split(' #')[0] == name) + 1}"
+            generation = seconds(metrics["first_chunk"], metrics["last_chunk"])
+            models[name] = {
+                "status": "done" if metrics["end"] is not None else "running",
+                "ttft_s": seconds(metrics["start"], metrics["first_chunk"]),
+                "generation_s": generation,
+                "total_s": seconds(metrics["start"], metrics["end"]),
+                "chunks": metrics["chunks"],
+                "chunks_per_s": round(metrics["chunks"] / generation, 1) if generation else None,
+                "output_bytes": metrics["output_bytes"],
+                "finish_reason": metrics["finish_reason"],
+            }
+
+        # Fastest
+        def fastest(key):
+            return min((name for name, values in models.items() if values[key] is not None), key=lambda name: models[name][key], default=None)
+
+        return {"models": models, "fastest_ttft": fastest("ttft_s"), "fastest_total": fastest("total_s")}
+
+
+class PrefixTracker:
+    """Fingerprints of the last prompt of each chat, to measure the prefix shared by the next turn (prompt/KV cache reuse).
+
+    Each message is serialized and hashed as a whole and by blocks of Config.PREFIX_BLOCK_SIZE bytes (8 bytes per
+    block, at most Config.PREFIX_MAX_BLOCKS per chat): the common prefix is known to the block without keeping the
+    prompt. The chats are kept in an LRU of Config.PREFIX_MAX_CHATS entries.
+    """
+
+    def __init__(self):
+        self.chats = OrderedDict() # {chat key: [(size, hash, block hashes), ...] per message}, least recently used first
+        self.lock = threading.Lock()
+
+    def compare(self, key: str, messages: list) -> dict | None:
+        """Store the fingerprint of the messages of a chat and compare them with the previous turn (None on the first turn)."""
+
+        # Init
+        with self.lock:
+            previous = self.chats.get(key)
+        block_size = Config.PREFIX_BLOCK_SIZE
+        budget = Config.PREFIX_MAX_BLOCKS
+        current = []
+        offset = 0 # Common prefix in bytes
+        difference = None
+
+        for index, message in enumerate(messages):
+
+            # Fingerprint (the serialized message is not kept)
+            data = json.dumps(message, ensure_ascii=False, default=str).encode("utf-8")
+            blocks = b"".join(hashlib.blake2b(data[start:start + block_size], digest_size=8).digest() for start in range(0, min(len(data), max(0, budget) * block_size), block_size))
+            budget -= len(blocks) // 8
+            current.append((len(data), hashlib.blake2b(data, digest_size=16).digest(), blocks))
+
+            # Same message or nothing to compare (first turn, new message, difference already found)
+            if previous is None or difference is not None or index >= len(previous):
+                continue
+            previous_size, previous_hash, previous_blocks = previous[index]
+            if previous_hash == current[-1][1]:
+                offset += len(data)
+                continue
+
+            # First difference (common blocks of the message)
+            common = 0
+            while (common + 1) * 8 <= min(len(blocks), len(previous_blocks)) and blocks[common * 8:(common + 1) * 8] == previous_blocks[common * 8:(common + 1) * 8]:
+                common += 1
+            within = min(common * block_size, len(data), previous_size)
+            offset += within
+            difference = {
+                "message": index,
+                "role": message.get("role") if isinstance(message, dict) else None,
+                "change": "modified",
+                "byte_offset": offset,
+                "message_offset": within,
+                "current": data[within:within + Config.PREFIX_PREVIEW].decode("utf-8", errors="replace"),
+            }
+
+        # Removed messages
+        if previous is not None and difference is None and len(messages) < len(previous):
+            difference = {"message": len(messages), "role": None, "change": "removed", "byte_offset": offset, "message_offset": 0, "current": ""}
+
+        # Store (least recently used chats dropped)
+        with self.lock:
+            self.chats[key] = current
+            self.chats.move_to_end(key)
+            while len(self.chats) > Config.PREFIX_MAX_CHATS:
+                self.chats.popitem(last=False)
+
+        # First turn
+        if previous is None:
+            return None
+
+        previous_bytes = sum(size for size, message_hash, blocks in previous)
+        return {
+            "stable": difference is None,
+            "common_prefix_bytes": offset,
+            "common_prefix_tokens": TokenCounter.estimate(offset),
+            "previous_bytes": previous_bytes,
+            "reused": f"{offset / previous_bytes:.1%}" if previous_bytes else "-",
+            "precision_bytes": block_size,
+            "first_difference": difference,
+        }
+
+
+class ProcessFileHandler(RotatingFileHandler):
+    """Rotating file handler writing one segment file per process.
+
+    With several workers, each process writes and rotates its own file ('<name>.<pid><ext>'),
+    so no rotation race can corrupt or lose records. Use merge_log_segments() to read them back in order.
+    """
+
+    RECORD_START = re.compile(r'\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d{3} - ') # Start of a record written with the formatter '%(asctime)s - %(message)s'
+
+    def __init__(self, file_path: str, **kwargs):
+        self.file_path = file_path # Path given in the valves (without pid)
+        self.pid = os.getpid()
+        super().__init__(self.segment_path(file_path, self.pid), **kwargs)
+
+    @staticmethod
+    def segment_path(file_path: str, pid: int) -> str:
+        """Return the path of the segment file of a process."""
+
+        root, ext = os.path.splitext(file_path)
+        return f"{root}.{pid}{ext}"
+
+    def check_process(self) -> None:
+        """Switch to a new segment if the process was forked (never share the segment of the parent)."""
+
+        if os.getpid() != self.pid:
+            self.acquire()
+            try:
+                if os.getpid() != self.pid:
+                    self.pid = os.getpid()
+                    if self.stream:
+                        self.stream.close()
+                        self.stream = None
+                    self.baseFilename = os.path.abspath(self.segment_path(self.file_path, self.pid))
+            finally:
+                self.release()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Write the record in the segment of the current process."""
+
+        self.check_process()
+        super().emit(record)
+
+
+class RollingStats:
+    """Rolling statistics per model and task with bounded memory.
+
+    Each metric keeps a count, a sum, min/max and a fixed-size reservoir sample (Config.STATS_RESERVOIR_SIZE)
+    for the percentiles, so memory stays constant whatever the traffic. Groups above Config.STATS_MAX_GROUPS go to 'other'.
+    """
+
+    def __init__(self):
+        self.groups = {} # Statistics by group ('<model> / <task>')
+        self.last_dump = time.monotonic()
+        self.random = random.Random()
+
+    def add(self, model: str, task: str, values: dict) -> str:
+        """Add the metric values of a request and return its group."""
+
+        # Group
+        group_name = f"{model} / {task}"
+        if group_name not in self.groups and len(self.groups) >= Config.STATS_MAX_GROUPS:
+            group_name = "other"
+        group = self.groups.setdefault(group_name, {"requests": 0, "metrics": {}})
+        group["requests"] += 1
+
+        # Metrics
+        for name, value in values.items():
+            if value is None:
+                continue
+            metric = group["metrics"].setdefault(name, {"count": 0, "sum": 0, "min": value, "max": value, "reservoir": []})
+            metric["count"] += 1
+            metric["sum"] += value
+            metric["min"] = min(metric["min"], value)
+            metric["max"] = max(metric["max"], value)
+
+            # Reservoir sampling (each value kept with probability size/count)
+            reservoir = metric["reservoir"]
+            if len(reservoir) < Config.STATS_RESERVOIR_SIZE:
+                reservoir.append(value)
+            else:
+                index = self.random.randrange(metric["count"])
+                if index < Config.STATS_RESERVOIR_SIZE:
+                    reservoir[index] = value
+
+        return group_name
+
+    def render(self, group_name: str | None = None) -> dict:
+        """Return the statistics of a group (all the groups if group_name is None)."""
+
+        # All groups
+        if group_name is None:
+            return {name: self.render(name) for name in self.groups}
+
+        # Group
+        group = self.groups.get(group_name)
+        if group is None:
+            return {}
+        rendered = {"requests": group["requests"]}
+        for name, metric in group["metrics"].items():
+            sample = sorted(metric["reservoir"])
+            rendered[name] = {"mean": round(metric["sum"] / metric["count"], 3)}
+            for percentile in Config.STATS_PERCENTILES:
+                rendered[name][f"p{percentile}"] = round(sample[round(percentile / 100 * (len(sample) - 1))], 3)
+            rendered[name]["min"] = round(metric["min"], 3)
+            rendered[name]["max"] = round(metric["max"], 3)
+
+        return rendered
+
+
+class SchemaAccumulator:
+    """Merged structural schema of the payloads, with drift detection.
+
+    Only types, keys, array lengths and string length stats are kept (no values, safe for PII). Memory is bounded by
+    Config.SCHEMA_MAX_NODES over all the paths, and by SCHEMA_MAX_DEPTH, SCHEMA_MAX_KEYS and SCHEMA_MAX_ITEMS per path.
+    A path is stable once observed Config.SCHEMA_STABLE_COUNT times: a new key, a new type or a missing required key
+    there is reported as drift, once (a type already seen is not a drift). The type and keys of the paths of
+    Config.SCHEMA_UNION_PATHS vary by request (e.g. text or multimodal message content) and are never reported.
+    """
+
+    def __init__(self, path: str = ""):
+        self.path = path # Persistence file (empty: none)
+        self.roots = {} # Schema nodes by name (e.g. 'inlet.body')
+        self.requests = 0 # Number of requests merged
+        self.nodes = 0 # Number of schema nodes (see Config.SCHEMA_MAX_NODES)
+        self.unions = tuple(f".{union_path}" for union_path in Config.SCHEMA_UNION_PATHS) # Path suffixes without drift
+        self.last_report = time.monotonic()
+
+        # Baseline from a previous run (e.g. before an Open WebUI upgrade)
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as file:
+                    saved = json.load(file)
+                self.roots = saved.get("roots", {})
+                self.requests = saved.get("requests", 0)
+                self.nodes = sum(self.count_nodes(root) for root in self.roots.values())
+            except Exception as e:
+
+                # DEBUG WARNING
+                if Config.DEBUG_WARNING:
+                    print(f"[DEBUG FILTER DATA] WARNING | Failed to load schema '{self.path}': {e}")
+
+    @staticmethod
+    def type_name(value: Any) -> str:
+        """Return the JSON type name of a value."""
+
+        if value is None:
+            return "null"
+        if isinstance(value, bool):
+            return "boolean"
+        if isinstance(value, int):
+            return "integer"
+        if isinstance(value, float):
+            return "number"
+        if isinstance(value, str):
+            return "string"
+        if isinstance(value, Mapping):
+            return "object"
+        if isinstance(value, (list, tuple)):
+            return "array"
+
+        return type(value).__name__
+
+    @classmethod
+    def count_nodes(cls, node: dict) -> int:
+        """Return the number of nodes of a schema tree."""
+
+        return 1 + (cls.count_nodes(node["items"]) if "items" in node else 0) + sum(cls.count_nodes(child_node) for child_node in node.get("keys", {}).values())
+
+    def new_node(self) -> dict | None:
+        """Return a new schema node, None once Config.SCHEMA_MAX_NODES are in use."""
+
+        if self.nodes >= Config.SCHEMA_MAX_NODES:
+            return None
+        self.nodes += 1
+
+        return {"count": 0, "types": {}}
+
+    def add(self, name: str, value: Any) -> list:
+        """Merge a value in the schema of a name and return the drifts found."""
+
+        drifts = []
+        node = self.roots.get(name)
+        if node is None:
+            node = self.new_node()
+            if node is None:
+                return drifts
+            self.roots[name] = node
+        self.merge(node, value, name, 0, drifts)
+
+        return drifts
+
+    def merge(self, node: dict, value: Any, path: str, depth: int, drifts: list) -> None:
+        """Merge a value in a schema node."""
+
+        # Type
+        stable = node["count"] >= Config.SCHEMA_STABLE_COUNT and not path.endswith(self.unions)
+        node["count"] += 1
+        type_name = self.type_name(value)
+        types = node["types"]
+        if type_name not in types and stable:
+            drifts.append(f"{path}: new type '{type_name}' (was {', '.join(types)})")
+        types[type_name] = types.get(type_name, 0) + 1
+
+        # String: length stats
+        if type_name == "string":
+            length = len(value)
+            node["len_min"] = min(node.get("len_min", length), length)
+            node["len_max"] = max(node.get("len_max", length), length)
+            node["len_sum"] = node.get("len_sum", 0) + length
+
+        # Array: length range and merged items
+        elif type_name == "array":
+            length = len(value)
+            node["items_min"] = min(node.get("items_min", length), length)
+            node["items_max"] = max(node.get("items_max", length), length)
+            if depth < Config.SCHEMA_MAX_DEPTH and length:
+                items = node.get("items") or self.new_node()
+                if items is None:
+                    node["overflow"] = node.get("overflow", 0) + 1
+                else:
+                    node["items"] = items
+                    for item in itertools.islice(value, Config.SCHEMA_MAX_ITEMS):
+                        self.merge(items, item, f"{path}[]", depth + 1, drifts)
+
+        # Object: keys (optional when missing in some objects)
+        elif type_name == "object":
+            objects = node.get("objects", 0)
+            node["objects"] = objects + 1
+            stable = objects >= Config.SCHEMA_STABLE_COUNT and not path.endswith(self.unions)
+            if depth < Config.SCHEMA_MAX_DEPTH:
+                keys = node.setdefault("keys", {})
+                for key, child in value.items():
+                    key = str(key)
+                    child_node = keys.get(key)
+                    if child_node is None:
+                        child_node = self.new_node() if len(keys) < Config.SCHEMA_MAX_KEYS else None
+                        if child_node is None:
+                            node["overflow"] = node.get("overflow", 0) + 1
+                            continue
+                        if stable:
+                            drifts.append(f"{path}.{key}: new key")
+                        keys[key] = child_node
+                    self.merge(child_node, child, f"{path}.{key}", depth + 1, drifts)
+
+                # Required keys missing
+                if stable:
+                    for key, child_node in keys.items():
+                        if child_node.get("present", 0) == objects and key not in value:
+                            drifts.append(f"{path}.{key}: required key missing")
+
+                # Presence of the keys (count of objects containing the key)
+                for key in value.keys():
+                    child_node = keys.get(str(key))
+                    if child_node is not None:
+                        child_node["present"] = child_node.get("present", 0) + 1
+
+    def render(self, node: dict | None = None) -> dict:
+        """Return a readable schema (all the roots if node is None)."""
+
+        # All roots
+        if node is None:
+            return {name: self.render(root) for name, root in self.roots.items()}
+
+        # Type (most frequent first)
+        rendered = {"type": " | ".join(sorted(node["types"], key=node["types"].get, reverse=True))}
+
+        # String
+        if "len_min" in node:
+            string_count = node["types"].get("string", 0) or 1
+            rendered["length"] = f"{node['len_min']}..{node['len_max']} (mean {node['len_sum'] / string_count:.0f})"
+
+        # Array
+        if "items_min" in node:
+            rendered["items_count"] = f"{node['items_min']}..{node['items_max']}"
+            if "items" in node:
+                rendered["items"] = self.render(node["items"])
+
+        # Object
+        if "keys" in node:
+            properties = {}
+            for key, child_node in node["keys"].items():
+                properties[key] = self.render(child_node)
+                if child_node.get("present", 0) < node.get("objects", 0):
+                    properties[key]["optional"] = f"{child_node.get('present', 0)}/{node['objects']}"
+            rendered["properties"] = properties
+        if node.get("overflow"):
+            rendered["not_tracked"] = node["overflow"]
+
+        return rendered
+
+    def save(self) -> None:
+        """Persist the schema (atomic replace)."""
+
+        if not self.path:
+            return
+
+        try:
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump({"requests": self.requests, "roots": self.roots}, file)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+
+            # DEBUG WARNING
+            if Config.DEBUG_WARNING:
+                print(f"[DEBUG FILTER DATA] WARNING | Failed to save schema '{self.path}': {e}")
+
+
+class SectionCache:
+    """Bounded LRU cache of rendered sections, keyed by (section, user id, content digest).
+
+    Sections like __model__, __tools__ or __user__ are identical across many requests: they are rendered once and
+    served as text. Texts longer than Config.CACHE_MAX_SECTION_SIZE are not cached.
+    The fingerprints of the containers and objects are also kept by identity for Config.CACHE_FINGERPRINT_TTL seconds
+    (see _fingerprint): a section made of objects reused by the requests of a burst is fingerprinted once.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict() # {(section, user id, fingerprint): rendered text}, least recently used first
+        self.fingerprints = OrderedDict() # {object id: (object, length, fingerprint, time)}, least recently used first (the object is kept: its id is not reused)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock() # Sections are rendered by the formatting threads too (see _offload)
+
+    def get(self, key: tuple) -> str | None:
+        """Return the rendered text of a key (None on miss)."""
+
+        with self.lock:
+            text = self.entries.get(key)
+            if text is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def put(self, key: tuple, text: str) -> None:
+        """Add a rendered text, evicting the least recently used ones above Config.CACHE_SIZE."""
+
+        if len(text) > Config.CACHE_MAX_SECTION_SIZE:
+            return
+        with self.lock:
+            self.entries[key] = text
+            self.entries.move_to_end(key)
+            while len(self.entries) > Config.CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def known_fingerprint(self, obj: Any) -> bytes | None:
+        """Return the fingerprint of an object seen less than Config.CACHE_FINGERPRINT_TTL ago with the same length."""
+
+        with self.lock:
+            entry = self.fingerprints.get(id(obj))
+            if entry is None or entry[0] is not obj or entry[1] != self.length(obj) or time.monotonic() - entry[3] > Config.CACHE_FINGERPRINT_TTL:
+                return None
+            self.fingerprints.move_to_end(id(obj))
+            return entry[2]
+
+    def remember_fingerprint(self, obj: Any, fingerprint: bytes) -> None:
+        """Keep the fingerprint of an object, evicting the least recently used ones above Config.CACHE_FINGERPRINTS."""
+
+        with self.lock:
+            self.fingerprints[id(obj)] = (obj, self.length(obj), fingerprint, time.monotonic())
+            self.fingerprints.move_to_end(id(obj))
+            while len(self.fingerprints) > Config.CACHE_FINGERPRINTS:
+                self.fingerprints.popitem(last=False)
+
+    @staticmethod
+    def length(obj: Any) -> int | None:
+        """Length of a container (None for an object)."""
+
+        return len(obj) if isinstance(obj, (dict, list, tuple)) else None
+
+    def clear(self) -> None:
+        """Remove all the entries (the rendering options changed)."""
+
+        with self.lock:
+            self.entries.clear()
+            self.fingerprints.clear()
+
+
+class SinkManager:
+    """File sink of the shared 'debug_filter_data' logger, swapped when its settings change.
+
+    The handler is tagged with its settings and looked up on the logger itself, so a reloaded filter (new instance)
+    reuses or replaces the handler of the previous instance instead of adding one. Old handlers are closed.
+    """
+
+    LOGGER_NAME = "debug_filter_data" # Logger shared by all the instances of the filter
+
+    def __init__(self):
+        self.logger = logging.getLogger(self.LOGGER_NAME)
+        self.logger.propagate = False
+        self.lock = threading.Lock()
+
+    def configure(self, settings: tuple | None) -> None:
+        """Attach the file handler matching the settings, or none if settings is None.
+
+        settings: (file_path, level, per_process, size in MB, backup count). Cheap when nothing changed.
+        """
+
+        # Nothing changed
+        handlers = self.logger.handlers
+        if self.is_configured(handlers, settings):
+            return
+
+        with self.lock:
+            handlers = self.logger.handlers
+            if self.is_configured(handlers, settings):
+                return
+
+            # New handler
+            new_handlers = []
+            if settings is not None:
+                file_path, level, per_process, size, backup_count = settings
+                try:
+                    handler = (ProcessFileHandler if per_process else RotatingFileHandler)(
+                        file_path,
+                        maxBytes=int(size * 1024 * 1024),
+                        backupCount=backup_count
+                    )
+                    handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+                    self.logger.setLevel(getattr(logging, level, logging.INFO))
+                except Exception as e:
+
+                    #DEBUG ERROR
+                    if Config.DEBUG_ERROR:
+                        print(f"[DEBUG FILTER DATA] ERROR | Failed to initialize logger: {e}")
+
+                    # Fallback to NullHandler to avoid crashes (and retries until the settings change)
+                    handler = logging.NullHandler()
+
+                handler.dfd_settings = settings
+                new_handlers.append(handler)
+
+            # Swap (atomic list assignment) then close the old handlers
+            self.logger.handlers = new_handlers
+            for handler in handlers:
+                try:
+                    handler.close()
+                except Exception:
+                    pass
+
+            # DEBUG INFO
+            if Config.DEBUG_INFO:
+                print(f"[DEBUG FILTER DATA] INFO | File sink configured: {settings}")
+
+    @contextlib.contextmanager
+    def record(self, enabled: bool = True) -> Iterator[Callable[[str], Any] | None]:
+        """Open a record of the file sink and yield its write function (None without file sink).
+
+        The record is written chunk by chunk under the handler lock, so a large report is never held in memory as a
+        whole. Rotation is checked at the start of the record: a file may exceed its size limit by one record.
+        """
+
+        # No file sink
+        handlers = self.logger.handlers
+        handler = handlers[0] if enabled and handlers else None
+        if not isinstance(handler, logging.StreamHandler) or not self.logger.isEnabledFor(logging.INFO):
+            yield None
+            return
+
+        # Record (timestamp prefix of the formatter, chunks, terminator)
+        record = self.logger.makeRecord(self.logger.name, logging.INFO, "", 0, "", None, None)
+        handler.acquire()
+        try:
+            if isinstance(handler, ProcessFileHandler):
+                handler.check_process()
+            if handler.shouldRollover(record):
+                handler.doRollover()
+            if handler.stream is None:
+                handler.stream = handler._open()
+            handler.stream.write(handler.format(record))
+            yield handler.stream.write
+            handler.stream.write(handler.terminator)
+            handler.flush()
+        finally:
+            handler.release()
+
+    @staticmethod
+    def is_configured(handlers: list, settings: tuple | None) -> bool:
+        """Check that the handlers of the logger match the settings."""
+
+        if settings is None:
+            return not handlers
+        return len(handlers) == 1 and getattr(handlers[0], "dfd_settings", None) == settings
+
+
+class SpanExporter:
+    """Asynchronous, batched export of spans in OTLP-JSON.
+
+    Spans are queued without blocking (the oldest are dropped when the queue is full) and written in batches by a
+    background thread, to a JSON lines file or posted to an OTLP/HTTP collector ('http(s)://.../v1/traces').
+    The thread is started on demand and stops when idle, so a reloaded filter leaves no thread behind.
+    """
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint # File path or OTLP/HTTP URL
+        self.queue = deque(maxlen=max(1, Config.TRACE_QUEUE_SIZE)) # Spans waiting for export
+        self.dropped = 0 # Spans dropped because the queue was full
+        self.wakeup = threading.Event() # Set when a full batch is waiting
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def export(self, spans: list) -> None:
+        """Queue spans for export (never waits for the export, only for a worker stopping at the same time).
+
+        The spans are queued and the worker checked under the lock of its idle stop (see run), so they are never left
+        in the queue of a stopped worker.
+        """
+
+        with self.lock:
+
+            # Queue
+            overflow = len(self.queue) + len(spans) - self.queue.maxlen
+            if overflow > 0:
+                self.dropped += overflow
+            self.queue.extend(spans)
+            if len(self.queue) >= Config.TRACE_BATCH_SIZE:
+                self.wakeup.set()
+
+            # Worker
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="debug-filter-data-spans", daemon=True)
+                self.thread.start()
+
+    def run(self) -> None:
+        """Export the queued spans by batch until the exporter is idle."""
+
+        idle = 0.0
+        while True:
+            self.wakeup.wait(Config.TRACE_FLUSH_INTERVAL)
+            self.wakeup.clear()
+
+            # Batches
+            exported = False
+            while self.queue:
+                batch = []
+                while self.queue and len(batch) < Config.TRACE_BATCH_SIZE:
+                    batch.append(self.queue.popleft())
+                self.write(batch)
+                exported = True
+
+            # Stop when idle
+            idle = 0.0 if exported else idle + Config.TRACE_FLUSH_INTERVAL
+            if idle >= Config.TRACE_IDLE_TIMEOUT:
+                with self.lock:
+                    if not self.queue:
+                        self.thread = None
+                        return
+
+    def write(self, spans: list) -> None:
+        """Write a batch of spans as one OTLP-JSON document."""
+
+        document = {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": Config.TRACE_SERVICE_NAME}}]},
+                    "scopeSpans": [{"scope": {"name": SinkManager.LOGGER_NAME}, "spans": spans}],
+                }
+            ]
+        }
+
+        try:
+            payload = json.dumps(document, ensure_ascii=False)
+
+            # OTLP/HTTP collector
+            if self.endpoint.startswith(("http://", "https://")):
+                request = urllib.request.Request(self.endpoint, data=payload.encode("utf-8"), headers={"Content-Type": "application/json"}, method="POST")
+                with urllib.request.urlopen(request, timeout=Config.TRACE_HTTP_TIMEOUT) as response:
+                    response.read()
+
+            # JSON lines file
+            else:
+                with open(self.endpoint, "a", encoding="utf-8") as file:
+                    file.write(payload + "\n")
+
+        except Exception as e:
+
+            # DEBUG WARNING
+            if Config.DEBUG_WARNING:
+                print(f"[DEBUG FILTER DATA] WARNING | Span export failed ({len(spans)} spans): {e}")
+
+
+class StreamAssembler:
+    """Incremental reconstruction of a streamed response.
+
+    Assembles 'delta.content', the reasoning content and the 'tool_calls' argument fragments as chunks arrive.
+    Fragments are appended to lists and joined once when read, so each chunk costs O(1).
+    """
+
+    def __init__(self, keep_events: bool = False):
+        self.chunks = 0 # Number of stream events
+        self.content_parts = [] # Fragments of delta.content
+        self.reasoning_parts = [] # Fragments of delta.reasoning_content (or delta.reasoning)
+        self.tool_calls = {} # Tool calls by index: {"id", "name", "arguments" (fragments)}
+        self.finish_reason = None # Last finish reason received
+        self.usage = None # Usage sent by the backend (last chunk)
+        self.events = [] if keep_events else None # Raw events (optional)
+
+    def add(self, event: dict) -> None:
+        """Add a stream event."""
+
+        # Count
+        self.chunks += 1
+        if self.events is not None:
+            self.events.append(event)
+
+        # Usage
+        if event.get("usage"):
+            self.usage = event["usage"]
+
+        for choice in event.get("choices") or []:
+
+            # Delta
+            delta = choice.get("delta") or {}
+            content = delta.get("content")
+            if content:
+                self.content_parts.append(content)
+            reasoning = delta.get("reasoning_content") or delta.get("reasoning")
+            if reasoning:
+                self.reasoning_parts.append(reasoning)
+
+            # Tool calls
+            for tool_call in delta.get("tool_calls") or []:
+                tool_call_index = tool_call.get("index", len(self.tool_calls))
+                assembled = self.tool_calls.setdefault(tool_call_index, {"id": None, "name": None, "arguments": []})
+                if tool_call.get("id"):
+                    assembled["id"] = tool_call["id"]
+                function = tool_call.get("function") or {}
+                if function.get("name"):
+                    assembled["name"] = function["name"]
+                if function.get("arguments"):
+                    assembled["arguments"].append(function["arguments"])
+
+            # Finish reason
+            if choice.get("finish_reason"):
+                self.finish_reason = choice["finish_reason"]
+
+    @property
+    def content(self) -> str:
+        """Reconstructed text (joined once, then cached)."""
+
+        if len(self.content_parts) > 1:
+            self.content_parts[:] = ["".join(self.content_parts)]
+
+        return self.content_parts[0] if self.content_parts else ""
+
+    @property
+    def reasoning(self) -> str:
+        """Reconstructed reasoning content (joined once, then cached)."""
+
+        if len(self.reasoning_parts) > 1:
+            self.reasoning_parts[:] = ["".join(self.reasoning_parts)]
+
+        return self.reasoning_parts[0] if self.reasoning_parts else ""
+
+    def to_dict(self, final_content: str | None = None) -> dict:
+        """Return the reconstruction, compared with the final assistant message if given."""
+
+        # Reconstruction
+        content = self.content
+        data = {
+            "chunks": self.chunks,
+            "finish_reason": self.finish_reason,
+            "content_length": len(content),
+            "content": content,
+        }
+        if self.reasoning_parts:
+            data["reasoning_length"] = len(self.reasoning)
+            data["reasoning"] = self.reasoning
+        if self.tool_calls:
+            data["tool_calls"] = [
+                {"index": index, "id": tool_call["id"], "name": tool_call["name"], "arguments": "".join(tool_call["arguments"])}
+                for index, tool_call in sorted(self.tool_calls.items(), key=lambda item: (not isinstance(item[0], int), item[0] if isinstance(item[0], int) else str(item[0])))
+            ]
+        if self.usage:
+            data["usage"] = self.usage
+
+        # Consistency with the final message (both compared without surrounding whitespace, offset in content)
+        if final_content is not None:
+            data["final_message_length"] = len(final_content)
+            stripped, final_stripped = content.strip(), final_content.strip()
+            data["matches_final_message"] = stripped == final_stripped
+            if not data["matches_final_message"]:
+                data["first_difference_at"] = len(content) - len(content.lstrip()) + next(
+                    (index for index, (a, b) in enumerate(zip(stripped, final_stripped)) if a != b),
+                    min(len(stripped), len(final_stripped)),
+                )
+
+        # Raw events
+        if self.events is not None:
+            data["events"] = self.events
+
+        return data
+
+
+class StreamMonitor:
+    """Live throughput and stall detection of a streamed response.
+
+    Tokens are estimated as the chunks carrying text (content, reasoning or tool call arguments), the usage of the
+    backend is used when sent. The rate is a moving average over Config.MONITOR_RATE_WINDOW seconds (bounded deque).
+    """
+
+    def __init__(self, stall_seconds: float):
+        self.stall_seconds = stall_seconds # Gap between two chunks above which a stall is reported
+        self.start = time.monotonic() # First chunk
+        self.last = self.start # Last chunk
+        self.chunks = 0
+        self.tokens = 0
+        self.window = deque() # (time, tokens) of the chunks of the rate window
+        self.window_tokens = 0
+        self.max_gap = 0.0
+        self.stalls = [] # Stalls (at most Config.MONITOR_MAX_STALLS kept)
+        self.stall_count = 0
+        self.usage_tokens = None # completion_tokens of the backend usage
+        self.last_status = self.start # Time of the last status
+
+    def add(self, event: dict) -> dict | None:
+        """Add a stream event and return the stall it ends, if any."""
+
+        # Gap
+        now = time.monotonic()
+        gap = now - self.last
+        self.last = now
+        stall = None
+        if self.chunks and gap >= self.stall_seconds:
+            self.stall_count += 1
+            stall = {
+                "gap_seconds": round(gap, 3),
+                "after_chunk": self.chunks,
+                "after_tokens": self.tokens,
+                "at_seconds": round(now - gap - self.start, 3),
+            }
+            if len(self.stalls) < Config.MONITOR_MAX_STALLS:
+                self.stalls.append(stall)
+        if self.chunks:
+            self.max_gap = max(self.max_gap, gap)
+        self.chunks += 1
+
+        # Tokens (chunks carrying text)
+        tokens = 0
+        for choice in event.get("choices") or []:
+            delta = choice.get("delta") or {}
+            if delta.get("content") or delta.get("reasoning_content") or delta.get("reasoning") or delta.get("tool_calls"):
+                tokens += 1
+        if (event.get("usage") or {}).get("completion_tokens"):
+            self.usage_tokens = event["usage"]["completion_tokens"]
+        self.tokens += tokens
+
+        # Rate window
+        self.window.append((now, tokens))
+        self.window_tokens += tokens
+        while self.window and now - self.window[0][0] > Config.MONITOR_RATE_WINDOW:
+            self.window_tokens -= self.window.popleft()[1]
+
+        return stall
+
+    @property
+    def rate(self) -> float:
+        """Moving tokens/sec over the rate window."""
+
+        span = self.last - self.window[0][0] if self.window else 0
+        return self.window_tokens / span if span > 0 else 0.0
+
+    def status(self) -> str | None:
+        """Return the live status text, at most once per Config.MONITOR_STATUS_INTERVAL seconds."""
+
+        if self.last - self.last_status < Config.MONITOR_STATUS_INTERVAL:
+            return None
+        self.last_status = self.last
+
+        stalls_txt = f", {self.stall_count} stall(s)" if self.stall_count else ""
+        return f"{Config.STATUS_INFO_STREAM_LIVE} {self.tokens} tokens, {self.rate:.1f} tokens/s{stalls_txt}"
+
+    def to_dict(self) -> dict:
+        """Return the throughput and the stalls of the response."""
+
+        duration = self.last - self.start
+        data = {
+            "chunks": self.chunks,
+            "tokens": self.usage_tokens or self.tokens,
+            "tokens_source": "usage" if self.usage_tokens else "chunks",
+            "duration_seconds": round(duration, 3),
+            "average_tokens_per_second": round((self.usage_tokens or self.tokens) / duration, 1) if duration > 0 else None,
+            "max_gap_seconds": round(self.max_gap, 3),
+            "stall_count": self.stall_count,
+        }
+        if self.stalls:
+            data["stalls"] = self.stalls
+
+        return data
+
+
+class TailServer:
+    """Live tail of the log records over a local Unix-domain socket.
+
+    Each subscriber sends one filter line ('user=<id> model=<id> stage=inlet|outlet|stream', empty for all) then
+    receives the matching records. Records are queued in a bounded per-subscriber buffer (the oldest are dropped) and
+    sent by the thread of the subscriber, so a slow or stuck subscriber never blocks the request path.
+    Servers are shared by path (see get_shared_state), so a reloaded filter reuses the socket: each filter
+    acquires the server with get and releases it, the last release stops it. A failed start is retried after
+    Config.TAIL_RETRY_SECONDS only.
+    """
+
+    FILTER_KEYS = ("user", "model", "stage") # Keys accepted in a subscriber filter
+
+    def __init__(self, path: str):
+        self.path = path # Socket path
+        self.subscribers = [] # Subscribers (replaced, never mutated: read without lock on the request path)
+        self.lock = threading.Lock()
+        self.server = None # Listening socket (None: stopped)
+        self.users = 0 # Filters using the server (see get and release)
+        self.failed_at = None # Time of the last failed start (monotonic), None if none
+
+    @classmethod
+    def get(cls, path: str) -> "TailServer":
+        """Acquire the server of a path, started on first use (release it when no longer used)."""
+
+        servers = get_shared_state("tail_servers")
+        with get_shared_state("tail_locks").setdefault("servers", threading.Lock()):
+            server = servers.get(path)
+            if server is None:
+                server = servers[path] = cls(path)
+            server.users += 1
+            server.retry()
+
+        return server
+
+    def release(self) -> None:
+        """Release the server, stopped by its last user."""
+
+        servers = get_shared_state("tail_servers")
+        with get_shared_state("tail_locks").setdefault("servers", threading.Lock()):
+            self.users -= 1
+            if self.users > 0:
+                return
+            if servers.get(self.path) is self:
+                servers.pop(self.path)
+        self.stop()
+
+    def retry(self) -> None:
+        """Start the server if stopped, at most once per Config.TAIL_RETRY_SECONDS after a failure."""
+
+        if self.server is None and (self.failed_at is None or time.monotonic() - self.failed_at >= Config.TAIL_RETRY_SECONDS):
+            self.start()
+
+    def start(self) -> None:
+        """Bind the socket (a stale socket file is replaced) and accept the subscribers in a background thread."""
+
+        try:
+            if not hasattr(socket, "AF_UNIX"):
+                raise OSError("Unix-domain sockets are not available on this platform")
+
+            # Existing path: a socket file without server answering is stale, anything else is kept
+            if os.path.lexists(self.path):
+                if not stat.S_ISSOCK(os.lstat(self.path).st_mode):
+                    raise OSError(f"Path exists and is not a socket: {self.path}")
+                probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                try:
+                    probe.connect(self.path) # Closed without filter line: never registered as subscriber (see serve)
+                    raise OSError(f"Socket already served by another process: {self.path}")
+                except ConnectionRefusedError:
+                    os.unlink(self.path)
+                finally:
+                    probe.close()
+
+            # Bind (records may contain private data: bound in a private directory, made owner only, then moved in place)
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            private_dir = tempfile.mkdtemp(prefix=".dfd-tail-", dir=os.path.dirname(os.path.abspath(self.path)))
+            private_path = os.path.join(private_dir, "tail.sock")
+            try:
+                server.bind(private_path)
+                os.chmod(private_path, 0o600)
+                os.rename(private_path, self.path)
+            except OSError:
+                server.close()
+                raise
+            finally:
+                with contextlib.suppress(OSError):
+                    os.unlink(private_path)
+                os.rmdir(private_dir)
+            server.listen()
+            self.server = server
+            self.failed_at = None
+            threading.Thread(target=self.accept_loop, name="dfd-tail-accept", daemon=True).start()
+
+        except Exception as e:
+            self.failed_at = time.monotonic()
+
+            # DEBUG WARNING
+            if Config.DEBUG_WARNING:
+                print(f"[DEBUG FILTER DATA] WARNING | Live tail not started on '{self.path}' (retry in {Config.TAIL_RETRY_SECONDS:g}s): {e}")
+
+    def stop(self) -> None:
+        """Close the socket and disconnect the subscribers (see release for a shared server)."""
+
+        server, self.server = self.server, None
+        if server is not None:
+            try:
+                server.close()
+                os.unlink(self.path)
+            except OSError:
+                pass
+        for subscriber in self.subscribers:
+            self.close_subscriber(subscriber)
+
+    def accept_loop(self) -> None:
+        """Accept the subscribers until the server is stopped."""
+
+        server = self.server
+        while self.server is server and server is not None:
+            try:
+                connection, _ = server.accept()
+            except OSError:
+                break
+            threading.Thread(target=self.serve, args=(connection,), name="dfd-tail-subscriber", daemon=True).start()
+
+    def serve(self, connection: socket.socket) -> None:
+        """Read the filter of a subscriber, then send its records until it disconnects."""
+
+        # Filter line (closed before the end of the line: a probe, not a subscriber)
+        filters = {}
+        try:
+            connection.settimeout(Config.TAIL_FILTER_TIMEOUT)
+            line = b""
+            while b"\n" not in line and len(line) < 4096:
+                data = connection.recv(1024)
+                if not data:
+                    connection.close()
+                    return
+                line += data
+            for item in line.decode("utf-8", "replace").split():
+                key, _, values = item.partition("=")
+                if key in self.FILTER_KEYS and values:
+                    filters[key] = frozenset(values.split(","))
+        except OSError:
+            pass
+
+        # Register
+        subscriber = {"connection": connection, "filters": filters, "buffer": deque(), "size": 0, "dropped": 0, "ready": threading.Condition(), "open": True}
+        with self.lock:
+            self.subscribers = self.subscribers + [subscriber]
+
+        # Send loop
+        try:
+            connection.settimeout(None)
+            while True:
+                with subscriber["ready"]:
+                    while subscriber["open"] and not subscriber["buffer"]:
+                        subscriber["ready"].wait()
+                    if not subscriber["open"]:
+                        break
+                    records = list(subscriber["buffer"])
+                    subscriber["buffer"].clear()
+                    subscriber["size"] = 0
+                    dropped, subscriber["dropped"] = subscriber["dropped"], 0
+                if dropped:
+                    connection.sendall(f"[DEBUG FILTER DATA] TAIL | {dropped} record(s) dropped (slow subscriber)\n".encode("utf-8"))
+                for record in records:
+                    connection.sendall(record.encode("utf-8", "replace"))
+        except OSError:
+            pass
+        finally:
+            self.close_subscriber(subscriber)
+
+    def close_subscriber(self, subscriber: dict) -> None:
+        """Unregister a subscriber and close its connection."""
+
+        with self.lock:
+            self.subscribers = [item for item in self.subscribers if item is not subscriber]
+        with subscriber["ready"]:
+            subscriber["open"] = False
+            subscriber["ready"].notify()
+        try:
+            subscriber["connection"].close()
+        except OSError:
+            pass
+
+    @staticmethod
+    def matches(subscriber: dict, context: dict | None) -> bool:
+        """Check the context of a record (user, model, stage) against the filter of a subscriber."""
+
+        return all(str((context or {}).get(key)) in values for key, values in subscriber["filters"].items())
+
+    def wants(self, context: dict | None) -> bool:
+        """Check that at least one subscriber would receive a record (no formatting otherwise)."""
+
+        if self.server is None:
+            self.retry()
+
+        return any(self.matches(subscriber, context) for subscriber in self.subscribers)
+
+    def publish(self, record: str, context: dict | None) -> None:
+        """Queue a record for the matching subscribers, never blocking (the oldest records are dropped)."""
+
+        for subscriber in self.subscribers:
+            if not self.matches(subscriber, context):
+                continue
+            with subscriber["ready"]:
+                buffer = subscriber["buffer"]
+                buffer.append(record)
+                subscriber["size"] += len(record)
+                while len(buffer) > 1 and (subscriber["size"] > Config.TAIL_BUFFER_SIZE or len(buffer) > Config.TAIL_BUFFER_RECORDS):
+                    subscriber["size"] -= len(buffer.popleft())
+                    subscriber["dropped"] += 1
+                subscriber["ready"].notify()
+
+
+class TaskLedger:
+    """Background task calls (title, tags, follow-ups, queries, autocomplete) of each chat turn.
+
+    A turn starts at the inlet of a chat request and collects the task calls of the chat until the next one.
+    A call is timed from its inlet to its stream end or outlet when the filter sees them, otherwise only counted.
+    The chats are kept in an LRU of Config.TASK_MAX_CHATS entries.
+    """
+
+    def __init__(self):
+        self.turns = OrderedDict() # {chat key: {"message_id", "tasks": {task: counters}}}, least recently used first
+
+    def start_turn(self, chat_key: str, message_id: str | None) -> dict | None:
+        """Start a new turn of a chat and return the rendered previous turn (None if it had no task call)."""
+
+        previous = self.turns.pop(chat_key, None)
+        self.turns[chat_key] = {"message_id": message_id, "tasks": {}}
+        self.evict()
+
+        return self.render(previous)
+
+    def add_call(self, chat_key: str, task: str) -> dict:
+        """Count a task call in the current turn of its chat and return the call to pass to end_call."""
+
+        turn = self.turns.get(chat_key)
+        if turn is None:
+            turn = self.turns[chat_key] = {"message_id": None, "tasks": {}}
+            self.evict()
+        self.turns.move_to_end(chat_key)
+        counters = turn["tasks"].setdefault(task, {"calls": 0, "timed": 0, "seconds": 0.0})
+        counters["calls"] += 1
+
+        return {"counters": counters, "start": time.monotonic()}
+
+    @staticmethod
+    def end_call(call: dict) -> None:
+        """Add the duration of a call to its turn."""
+
+        call["counters"]["timed"] += 1
+        call["counters"]["seconds"] += time.monotonic() - call["start"]
+
+    def current(self, chat_key: str) -> dict | None:
+        """Return the rendered current turn of a chat (None if it has no task call yet)."""
+
+        return self.render(self.turns.get(chat_key))
+
+    def evict(self) -> None:
+        """Drop the least recently used chats above Config.TASK_MAX_CHATS."""
+
+        while len(self.turns) > Config.TASK_MAX_CHATS:
+            self.turns.popitem(last=False)
+
+    @staticmethod
+    def render(turn: dict | None) -> dict | None:
+        """Return the task calls of a turn by task, with totals (None if there is none)."""
+
+        if not turn or not turn["tasks"]:
+            return None
+
+        return {
+            "message_id": turn["message_id"],
+            "calls": sum(counters["calls"] for counters in turn["tasks"].values()),
+            "timed_seconds": round(sum(counters["seconds"] for counters in turn["tasks"].values()), 3),
+            "tasks": {task: {**counters, "seconds": round(counters["seconds"], 3)} for task, counters in turn["tasks"].items()},
+        }
+
+
+class TokenCounter:
+    """Token counts of texts with a pluggable tokenizer, an LRU cache and a fast heuristic fallback.
+
+    Tokenizers are named '<loader>:<argument>' ('tiktoken:cl100k_base', 'hf:Qwen/Qwen2.5-7B-Instruct') and loaded
+    on first use from their optional package, in a background thread (a download never blocks the hooks). Without
+    tokenizer, while it loads, when it cannot be loaded or for texts longer than Config.TOKENS_MAX_EXACT_SIZE, the
+    count is estimated from the UTF-8 size (Config.TOKENS_BYTES_PER_TOKEN).
+    """
+
+    def __init__(self):
+        self.name = "" # Tokenizer name (empty: heuristic)
+        self.loaders = {"tiktoken": self.load_tiktoken, "hf": self.load_huggingface} # {loader name: loader(argument) -> count(text)}
+        self.encode = None # Count function of the tokenizer (None: heuristic)
+        self.loaded = True # Load started (or no tokenizer)
+        self.cache = OrderedDict() # {text hash: tokens}, least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock() # Counts are made by the formatting threads too
+
+    @property
+    def label(self) -> str:
+        """Name of the tokenizer used."""
+
+        return self.name if self.encode is not None else f"heuristic ({Config.TOKENS_BYTES_PER_TOKEN} bytes/token)"
+
+    def configure(self, name: str) -> None:
+        """Use another tokenizer (loaded from the next count), the cached counts are dropped."""
+
+        if name == self.name:
+            return
+        with self.lock:
+            self.name = name
+            self.encode = None
+            self.loaded = not name
+            self.cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def register(self, name: str, loader: Callable[[str], Callable[[str], int]]) -> None:
+        """Register a tokenizer loader: called with the argument of the tokenizer name, returns a count function."""
+
+        self.loaders[name] = loader
+        if self.name.partition(":")[0] == name:
+            current, self.name = self.name, ""
+            self.configure(current)
+
+    @staticmethod
+    def load_tiktoken(encoding: str) -> Callable[[str], int]:
+        """Return the count function of a tiktoken encoding (requires tiktoken)."""
+
+        import tiktoken
+        tokenizer = tiktoken.get_encoding(encoding or "cl100k_base")
+        return lambda text: len(tokenizer.encode(text, disallowed_special=()))
+
+    @staticmethod
+    def load_huggingface(model: str) -> Callable[[str], int]:
+        """Return the count function of a Hugging Face tokenizer (requires transformers, downloads the tokenizer once)."""
+
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(model)
+        return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+
+    @staticmethod
+    def estimate(size: int) -> int:
+        """Return the heuristic token count of a UTF-8 size."""
+
+        return -(-size // Config.TOKENS_BYTES_PER_TOKEN)
+
+    def load(self) -> None:
+        """Start loading the tokenizer in a background thread (once), the heuristic is used until it is ready."""
+
+        with self.lock:
+            if self.loaded:
+                return
+            self.loaded = True
+            name = self.name
+
+        threading.Thread(target=self.load_tokenizer, args=(name,), name="dfd-tokenizer", daemon=True).start()
+
+    def load_tokenizer(self, name: str) -> None:
+        """Load a tokenizer (background thread), the heuristic is kept on failure or if another one was configured."""
+
+        loader_name, separator, argument = name.partition(":")
+        loader = self.loaders.get(loader_name)
+        try:
+            if loader is None:
+                raise ValueError(f"unknown loader '{loader_name}' (known: {', '.join(self.loaders)})")
+            encode = loader(argument)
+        except Exception as e:
+
+            # DEBUG WARNING
+            if Config.DEBUG_WARNING:
+                print(f"[DEBUG FILTER DATA] WARNING | Tokenizer '{name}' unavailable, heuristic used: {e}")
+
+            return
+
+        with self.lock:
+            if self.name == name:
+                self.encode = encode
+
+    def count(self, text: str, size: int | None = None) -> int:
+        """Return the token count of a text (size: its UTF-8 size if already known)."""
+
+        # Empty
+        if not text:
+            return 0
+
+        # Heuristic
+        if not self.loaded:
+            self.load()
+        encode = self.encode
+        if encode is None or len(text) > Config.TOKENS_MAX_EXACT_SIZE:
+            return self.estimate(len(text.encode("utf-8")) if size is None else size)
+
+        # Cached
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        with self.lock:
+            tokens = self.cache.get(key)
+            if tokens is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return tokens
+            self.misses += 1
+
+        # Tokenize
+        try:
+            tokens = encode(text)
+        except Exception:
+            tokens = self.estimate(len(text.encode("utf-8")) if size is None else size)
+
+        with self.lock:
+            self.cache[key] = tokens
+            while len(self.cache) > Config.TOKENS_CACHE_SIZE:
+                self.cache.popitem(last=False)
+
+        return tokens
+
+
+class TypeAdapters:
+    """Registry of adapters producing compact summaries of the objects that are not JSON data (see _sanitize_data).
+
+    Adapters are matched in order by a predicate (duck typing: Starlette or Open WebUI classes are not imported), the
+    match is cached per type. The generic fallback lists the public attributes, so nothing falls back to a costly str().
+    """
+
+    def __init__(self):
+        self.registry = [] # (name, predicate, adapter), first match wins
+        self.cache = {} # {type: adapter} matched adapter by type
+        self.sizes = OrderedDict() # {specs id: (specs, serialized size)} of the tools, least recently used first
+        self.lock = threading.Lock() # Objects are adapted by the formatting threads too (see _offload)
+
+        # Default adapters (generic fallback last)
+        self.register("request", self.is_request, self.adapt_request)
+        self.register("tool", self.is_tool, self.adapt_tool)
+        self.register("callable", callable, self.adapt_callable)
+        self.register("object", lambda obj: True, self.adapt_object)
+
+    def register(self, name: str, predicate: Callable[[Any], bool], adapter: Callable[[Any], Any]) -> None:
+        """Register an adapter, before the generic fallback (replaces an adapter of the same name)."""
+
+        self.registry = [entry for entry in self.registry if entry[0] != name]
+        position = len(self.registry) - 1 if self.registry and self.registry[-1][0] == "object" else len(self.registry)
+        self.registry.insert(position, (name, predicate, adapter))
+        self.cache.clear()
+
+    def adapt(self, obj: Any) -> Any:
+        """Return the summary of an object (a str, or data walked again by _sanitize_data)."""
+
+        # Adapter of the type
+        obj_type = type(obj)
+        adapter = self.cache.get(obj_type)
+        if adapter is None:
+            adapter = next(adapter for name, predicate, adapter in self.registry if predicate(obj))
+            self.cache[obj_type] = adapter
+
+        # Summary
+        try:
+            return adapter(obj)
+        except Exception as e:
+            return f"<{self.type_name(obj)}: {e}>"
+
+    @staticmethod
+    def type_name(obj: Any) -> str:
+        """Return the qualified name of the type of an object."""
+
+        obj_type = type(obj)
+        return f"{obj_type.__module__}.{obj_type.__qualname__}"
+
+    @staticmethod
+    def is_request(obj: Any) -> bool:
+        """Check for a Starlette/FastAPI Request (or WebSocket)."""
+
+        return isinstance(getattr(obj, "scope", None), Mapping) and hasattr(obj, "headers")
+
+    def adapt_request(self, obj: Any) -> dict:
+        """Method, path, client and the headers of Config.ADAPTER_REQUEST_HEADERS."""
+
+        scope = obj.scope
+        client = scope.get("client")
+        return {
+            "__type__": self.type_name(obj),
+            "method": scope.get("method"),
+            "path": scope.get("path"),
+            "query": (scope.get("query_string") or b"").decode("latin-1")[:Config.ADAPTER_MAX_REPR],
+            "client": f"{client[0]}:{client[1]}" if client else None,
+            "headers": {name: obj.headers.get(name) for name in Config.ADAPTER_REQUEST_HEADERS if name in obj.headers},
+        }
+
+    @staticmethod
+    def is_tool(obj: Any) -> bool:
+        """Check for an Open WebUI tool model (e.g. ToolUserModel)."""
+
+        return type(obj).__name__.startswith("Tool") and hasattr(obj, "specs") and hasattr(obj, "id")
+
+    def adapt_tool(self, obj: Any) -> dict:
+        """Id, name, number and size of the specs, size of the source code."""
+
+        specs = getattr(obj, "specs", None) or []
+        return {
+            "__type__": self.type_name(obj),
+            "id": getattr(obj, "id", None),
+            "name": getattr(obj, "name", None),
+            "user_id": getattr(obj, "user_id", None),
+            "specs": [spec.get("name") for spec in specs if isinstance(spec, Mapping)],
+            "specs_size": self.specs_size(specs),
+            "content_size": len(getattr(obj, "content", None) or ""),
+        }
+
+    def specs_size(self, specs: Any) -> int:
+        """Serialized size of the specs of a tool, computed once per specs object (Config.ADAPTER_SIZE_CACHE kept)."""
+
+        with self.lock:
+            entry = self.sizes.get(id(specs))
+            if entry is not None and entry[0] is specs:
+                self.sizes.move_to_end(id(specs))
+                return entry[1]
+
+        size = len(json.dumps(specs, default=str))
+        with self.lock:
+            self.sizes[id(specs)] = (specs, size)
+            while len(self.sizes) > Config.ADAPTER_SIZE_CACHE:
+                self.sizes.popitem(last=False)
+
+        return size
+
+    @staticmethod
+    def adapt_callable(obj: Any) -> str:
+        """Qualified name of the function, method or callable object."""
+
+        function = getattr(obj, "func", obj) # functools.partial
+        name = getattr(function, "__qualname__", None) or type(function).__qualname__
+        module = getattr(function, "__module__", None) or type(function).__module__
+        return f"<callable: {module}.{name}>"
+
+    def adapt_object(self, obj: Any) -> Any:
+        """Public attributes (at most Config.ADAPTER_MAX_ATTRIBUTES), or the truncated str() of an object without any."""
+
+        attributes = getattr(obj, "__dict__", None)
+        if isinstance(attributes, dict):
+            public = [(key, value) for key, value in attributes.items() if isinstance(key, str) and not key.startswith("_")]
+            if public:
+                adapted = {"__type__": self.type_name(obj)}
+                adapted.update(public[:Config.ADAPTER_MAX_ATTRIBUTES])
+                if len(public) > Config.ADAPTER_MAX_ATTRIBUTES:
+                    adapted["__more_attributes__"] = len(public) - Config.ADAPTER_MAX_ATTRIBUTES
+                return adapted
+
+        # No attributes (e.g. datetime, UUID, Enum, exceptions)
+        text = str(obj)
+        return text if len(text) <= Config.ADAPTER_MAX_REPR else f"{text[:Config.ADAPTER_MAX_REPR]}... ({len(text)} chars)"
+
+
 class Filter:
     """Main filter class for intercepting inlet/outlet/stream in Open WebUI.
 
@@ -129,6 +2057,10 @@ class Filter:
             default=Config.VALVES_PRIORITY,
             description=f"Priority level for filter execution order (default: '{Config.VALVES_PRIORITY}')",
         )
+        profiler_role: str = Field(
+            default=Config.VALVES_PROFILER_ROLE,
+            description=f"Filter chain profiler: install this filter twice, one copy with role 'start' and the lowest priority, one with role 'end' and the highest priority. The end probe reports the time and payload change of the filters in between (default: '{Config.VALVES_PROFILER_ROLE}')",
+        )
 
         # Interaction to debug
         log_inlet: bool = Field(
@@ -143,6 +2075,18 @@ class Filter:
             default=Config.VALVES_LOG_STREAM,
             description=f"Log stream (streamed model responses) (default: '{Config.VALVES_LOG_STREAM}')",
         )
+        stream_keep_events: bool = Field(
+            default=Config.VALVES_STREAM_KEEP_EVENTS,
+            description=f"Keep and log each raw stream event, in addition to the reconstructed response (verbose) (default: '{Config.VALVES_STREAM_KEEP_EVENTS}')",
+        )
+        stream_monitor: bool = Field(
+            default=Config.VALVES_STREAM_MONITOR,
+            description=f"Show the live throughput of the stream (tokens, tokens/s) in the status and report the stalls (default: '{Config.VALVES_STREAM_MONITOR}')",
+        )
+        stream_stall_seconds: float = Field(
+            default=Config.VALVES_STREAM_STALL_SECONDS,
+            description=f"Gap between two stream chunks reported as a stall, in seconds (default: '{Config.VALVES_STREAM_STALL_SECONDS}')",
+        )
 
         # Send to
         send_to_chat: bool = Field(
@@ -161,6 +2105,14 @@ class Filter:
             default=Config.VALVES_FILE_PATH,
             description=f"Path of log file (default: '{Config.VALVES_FILE_PATH}')",
         )
+        file_per_process: bool = Field(
+            default=Config.VALVES_FILE_PER_PROCESS,
+            description=f"Write one log file per worker process ('<name>.<pid>.log'), required with several uvicorn workers. Merge them with 'python debug-filter-data.py merge <file_path>' (default: '{Config.VALVES_FILE_PER_PROCESS}')",
+        )
+        tail_socket: str = Field(
+            default=Config.VALVES_TAIL_SOCKET,
+            description=f"Publish the log records to this Unix socket for a live tail: 'python debug-filter-data.py tail <path> [user=<id>] [model=<id>] [stage=inlet|outlet|stream]'. Use '{{pid}}' in the path with several workers. Empty: disabled (default: '{Config.VALVES_TAIL_SOCKET}')",
+        )
 
         # Data to show
         show_summary: bool = Field(
@@ -227,14 +2179,144 @@ class Filter:
             default=Config.VALVES_SHOW_TOOLS,
             description=f"Show '__tools__' info (default: '{Config.VALVES_SHOW_TOOLS}')",
         )
+        show_memory: bool = Field(
+            default=Config.VALVES_SHOW_MEMORY,
+            description=f"Show the deep memory size of {', '.join(Config.MEMORY_SECTIONS)} and their heaviest subpaths (profiling, slow on large payloads) (default: '{Config.VALVES_SHOW_MEMORY}')",
+        )
         show_custom_key: str = Field(
             default="",
             description="Custom key path to track (e.g., 'body.model.ollama.name' or 'body.messages[0].content' or '__metadata__.filter_ids'). Leave empty to disable."
         )
 
-        # This 'pass' helps for parsing and is recommended
-        pass
-
+        # Sink profiles
+        chat_profile: str = Field(
+            default=Config.VALVES_CHAT_PROFILE,
+            description=f"Data sent to the chat: preset ({', '.join(Config.PROFILE_PRESETS)}) or comma separated list of summary, custom, memory and section names (e.g. 'summary, body, metadata'). Empty: the show_* valves (default: '{Config.VALVES_CHAT_PROFILE}')",
+        )
+        console_profile: str = Field(
+            default=Config.VALVES_CONSOLE_PROFILE,
+            description=f"Data sent to the console, same syntax as 'chat_profile' (default: '{Config.VALVES_CONSOLE_PROFILE}')",
+        )
+        file_profile: str = Field(
+            default=Config.VALVES_FILE_PROFILE,
+            description=f"Data sent to the log file, same syntax as 'chat_profile' (default: '{Config.VALVES_FILE_PROFILE}')",
+        )
+        tail_profile: str = Field(
+            default=Config.VALVES_TAIL_PROFILE,
+            description=f"Data sent to the live tail, same syntax as 'chat_profile' (default: '{Config.VALVES_TAIL_PROFILE}')",
+        )
+
+        # Capture targeting
+        capture_only: str = Field(
+            default=Config.VALVES_CAPTURE_ONLY,
+            description="Capture only the matching requests, comma separated 'type:value' with type in user, email, chat, model, task (e.g. 'user:1234, model:llama3'). Same type: any value matches, different types: all must match. Leave empty to capture everything.",
+        )
+        capture_ignore: str = Field(
+            default=Config.VALVES_CAPTURE_IGNORE,
+            description=f"Never capture the matching requests, same syntax as 'capture_only' (e.g. 'task:title_generation, task:tags_generation'). Use 'task:{Config.CAPTURE_TASK_CHAT}' for regular chat requests.",
+        )
+        capture_armed_requests: int = Field(
+            default=Config.VALVES_CAPTURE_ARMED_REQUESTS,
+            description=f"Armed capture: capture stops after this number of captured requests, counted from the first request after the valves are saved (0: no limit) (default: '{Config.VALVES_CAPTURE_ARMED_REQUESTS}')",
+        )
+        capture_armed_minutes: int = Field(
+            default=Config.VALVES_CAPTURE_ARMED_MINUTES,
+            description=f"Armed capture: capture stops this number of minutes after the first request following the save of the valves (0: no limit) (default: '{Config.VALVES_CAPTURE_ARMED_MINUTES}')",
+        )
+
+        # Multi-model comparison
+        compare_models: bool = Field(
+            default=Config.VALVES_COMPARE_MODELS,
+            description=f"When several models answer one prompt, compare them side by side (time to first chunk, generation time, chunks, output size, finish reason), shown in the summary (MODEL COMPARISON) and logged when all have answered (default: '{Config.VALVES_COMPARE_MODELS}')",
+        )
+
+        # Background tasks
+        task_policies: str = Field(
+            default=Config.VALVES_TASK_POLICIES,
+            description=f"Capture policy of the background tasks (title, tags, follow-ups, queries, autocomplete), comma separated 'task:policy' with policy in {', '.join(Config.TASK_POLICIES)} and task '{Config.TASK_ANY}' for any task (e.g. '{Config.TASK_ANY}:summary, title_generation:skip'). Leave empty to capture everything.",
+        )
+        task_accounting: bool = Field(
+            default=Config.VALVES_TASK_ACCOUNTING,
+            description=f"Count the background task calls of each chat turn and their duration, shown in the summary (BACKGROUND TASKS) of the turn outlet and of the next turn inlet (default: '{Config.VALVES_TASK_ACCOUNTING}')",
+        )
+
+        # Tracing
+        trace_export: bool = Field(
+            default=Config.VALVES_TRACE_EXPORT,
+            description=f"Export each request as a trace (spans inlet -> stream -> outlet, OTLP-JSON, batched in background) (default: '{Config.VALVES_TRACE_EXPORT}')",
+        )
+        trace_endpoint: str = Field(
+            default=Config.VALVES_TRACE_ENDPOINT,
+            description=f"Trace destination: JSON lines file path or OTLP/HTTP collector URL, e.g. 'http://localhost:4318/v1/traces' (default: '{Config.VALVES_TRACE_ENDPOINT}')",
+        )
+
+        # Schema inference
+        schema_inference: bool = Field(
+            default=Config.VALVES_SCHEMA_INFERENCE,
+            description=f"Infer the merged schema of body, __metadata__ and __model__ (types, optional keys, lengths, no values), log it periodically and report drifts (default: '{Config.VALVES_SCHEMA_INFERENCE}')",
+        )
+        schema_path: str = Field(
+            default=Config.VALVES_SCHEMA_PATH,
+            description=f"File where the schema is saved and reloaded as baseline after a restart or an upgrade (empty: memory only) (default: '{Config.VALVES_SCHEMA_PATH}')",
+        )
+
+        # Rolling statistics
+        rolling_stats: bool = Field(
+            default=Config.VALVES_ROLLING_STATS,
+            description=f"Keep rolling statistics per model and task (requests, messages, body bytes, stream chunks, generation time with percentiles), shown in the summary and logged every {Config.STATS_DUMP_INTERVAL} seconds (default: '{Config.VALVES_ROLLING_STATS}')",
+        )
+
+        # Prompt prefix analysis
+        prefix_analysis: bool = Field(
+            default=Config.VALVES_PREFIX_ANALYSIS,
+            description=f"Compare the messages of each turn with the previous turn of the chat (hashes only, bounded memory) and report the common prefix in bytes and tokens and the first difference, i.e. what breaks the prompt cache of the inference server (default: '{Config.VALVES_PREFIX_ANALYSIS}')",
+        )
+
+        # Context budget
+        context_budget: bool = Field(
+            default=Config.VALVES_CONTEXT_BUDGET,
+            description=f"Show in the summary the size of the prompt by source ({', '.join(Config.CONTEXT_SOURCES)}) in bytes and tokens, compared with the context length of the model when known (default: '{Config.VALVES_CONTEXT_BUDGET}')",
+        )
+        tokenizer: str = Field(
+            default=Config.VALVES_TOKENIZER,
+            description=f"Tokenizer of the token counts: 'tiktoken:<encoding>' (e.g. 'tiktoken:o200k_base') or 'hf:<model>' (e.g. 'hf:Qwen/Qwen2.5-7B-Instruct'), requires the package. Empty or unavailable: {Config.TOKENS_BYTES_PER_TOKEN} bytes per token (default: '{Config.VALVES_TOKENIZER}')",
+        )
+
+        # Flight recorder
+        flight_recorder: bool = Field(
+            default=Config.VALVES_FLIGHT_RECORDER,
+            description=f"Keep the last {Config.FLIGHT_SIZE} requests in memory (no formatting) and dump them only when a trigger fires: error, empty reply, latency, stream without finish_reason (default: '{Config.VALVES_FLIGHT_RECORDER}')",
+        )
+        flight_latency_seconds: float = Field(
+            default=Config.VALVES_FLIGHT_LATENCY_SECONDS,
+            description=f"Latency from inlet to outlet that triggers a dump, in seconds (0: no latency trigger) (default: '{Config.VALVES_FLIGHT_LATENCY_SECONDS}')",
+        )
+        flight_path: str = Field(
+            default=Config.VALVES_FLIGHT_PATH,
+            description=f"File where the dumps are appended, one JSON line per dump (default: '{Config.VALVES_FLIGHT_PATH}')",
+        )
+
+        # Data handling
+        digest_large_data: bool = Field(
+            default=Config.VALVES_DIGEST_LARGE_DATA,
+            description=f"Replace large strings (base64 images, file contents) by a descriptor with mime type, size and hash (default: '{Config.VALVES_DIGEST_LARGE_DATA}')",
+        )
+        offload_threshold_kb: int = Field(
+            default=Config.VALVES_OFFLOAD_THRESHOLD_KB,
+            description=f"Data larger than this (estimated, in KB) is formatted in a worker thread, so the other chats are not stalled. 0: always inline (default: '{Config.VALVES_OFFLOAD_THRESHOLD_KB}')",
+        )
+        offload_workers: int = Field(
+            default=Config.VALVES_OFFLOAD_WORKERS,
+            description=f"Number of formatting worker threads (default: '{Config.VALVES_OFFLOAD_WORKERS}')",
+        )
+        offload_timeout_seconds: float = Field(
+            default=Config.VALVES_OFFLOAD_TIMEOUT_SECONDS,
+            description=f"Formatting time in a worker after which the report is truncated (default: '{Config.VALVES_OFFLOAD_TIMEOUT_SECONDS}')",
+        )
+
+        # This 'pass' helps for parsing and is recommended
+        pass
+
 
     def __init__(self):
         self.valves = self.Valves() # Initialize Valves instance
@@ -242,78 +2324,777 @@ class Filter:
         self.icon = Config.SWITCH_ICON # Icon for UI
         self.debug_inlet_temp = {} # Init debug temp to get inlet data from outlet data
         self.debug_stream_temp = {} # Init debug temp to get stream data from outlet data
+        self.debug_capture_temp = {} # Init debug temp to get the capture decision of the inlet (targeted capture)
+        self.debug_trace_temp = {} # Init debug temp to get the trace of the request from stream/outlet data
+        self.debug_stats_temp = {} # Init debug temp to get the request metrics from stream/outlet data
+        self.debug_monitor_temp = {} # Init debug temp to get the stream monitor from outlet data
+        self.debug_tail_temp = {} # Init debug temp to get the live tail context of the request from stream data
+        self.debug_flight_temp = {} # Init debug temp to get the flight record of the request from stream/outlet data
+        self.debug_task_temp = {} # Init debug temp to get the background task call from stream/outlet data (duration)
+        self.debug_compare_temp = {} # Init debug temp to get the comparison metrics of the request from stream/outlet data
+        self.request_temps = (self.debug_inlet_temp, self.debug_stream_temp, self.debug_capture_temp, self.debug_trace_temp, self.debug_stats_temp, self.debug_monitor_temp, self.debug_tail_temp, self.debug_flight_temp, self.debug_task_temp, self.debug_compare_temp) # Temps keyed by request (see _request_key)
+        self.pending_requests = OrderedDict() # Requests with temps, oldest first (see _track_request)
+        self.flight_recorder = deque(maxlen=Config.FLIGHT_SIZE) # Last requests (see flight_recorder)
+        self.flight_stalled = deque(maxlen=Config.FLIGHT_SIZE) # Records of the requests evicted without outlet, dumped by the next inlet (see _flight_check)
+        self.exporter = None # Span exporter (see trace_export)
+        self.plan = None # Capture plan compiled from the Valves (see _get_plan)
+        self.schema = None # Schema accumulator (see schema_inference)
+        self.stats = None # Rolling statistics (see rolling_stats)
+        self.prefixes = None # Prompt fingerprints of the chats (see prefix_analysis)
+        self.tokens = TokenCounter() # Token counter (see tokenizer)
+        self.tasks = None # Background task calls of the chat turns (see task_accounting)
+        self.comparison = ModelComparison() # Sibling requests of the multi-model prompts (see compare_models)
+        self.report_pattern = re.compile(f'{re.escape(Config.RESULT_KEYWORD_BEGIN)}.*?{re.escape(Config.RESULT_KEYWORD_END)}', flags=re.DOTALL) # Report delimiters
+        self.data_uri_pattern = re.compile(r'data:([\w.+-]+/[\w.+-]+)?((?:;[\w.+-]+=[^;,]*)*);base64,') # Data URI prefix (matched at the start only)
+        self.base64_pattern = re.compile(r'[A-Za-z0-9+/_-]+={0,2}') # Base64 sample
+        self.rag_pattern = re.compile(Config.CONTEXT_RAG_PATTERN, flags=re.DOTALL) # Retrieved context in the messages (see _context_budget)
+        self.json_encoder = json.JSONEncoder(indent=2, ensure_ascii=False) # Iterative encoder of the reports (see _format_json_chunks)
+        self.adapters = TypeAdapters() # Summaries of the objects that are not JSON data (see _sanitize_data)
+        self.section_cache = SectionCache() # Rendered stable sections (see Config.CACHE_SECTIONS)
+
+        # File sink (handler attached on first use, swapped when the valves change)
+        self.sinks = SinkManager()
+        self.logger = self.sinks.logger
+        self.tail = None # Live tail server (see tail_socket)
+
+        # DEBUG INFO
+        if Config.DEBUG_INFO:
+            print(f"[DEBUG FILTER DATA] INFO | Init")
+
+
+    def _account_task(
+        self,
+        user_id: str, # Id of the user (chat key fallback)
+        request_key: str, # Key of the request temps
+        task: str | None, # Background task (None: chat request)
+        __metadata__: dict | None = None,
+        __chat_id__: str | None = None,
+        __message_id__: str | None = None,
+        ) -> dict | None:
+        """Account an inlet in the task ledger: a chat request starts a turn, a task call is counted in the current one.
+
+        Returns the task calls of the previous turn for a chat request (None if there was none).
+        """
+
+        # Chat key
+        chat_key = __chat_id__ or (__metadata__ or {}).get("chat_id") or f"user:{user_id}"
+
+        # Chat request: new turn
+        if not task:
+            previous = self.tasks.start_turn(chat_key, __message_id__ or (__metadata__ or {}).get("message_id"))
+            return {"previous_turn": previous} if previous else None
 
-        # Setup logger for file output with rotation
-        self.logger = logging.getLogger("debug_filter_data")
+        # Task call (timed until its stream end or outlet)
+        self.debug_task_temp[request_key] = self.tasks.add_call(chat_key, task)
+        return None
+
+
+    def _analyze_prefix(
+        self,
+        plan: CapturePlan, # Capture plan
+        user_id: str, # Id of the user (chat key fallback)
+        body: dict | None = None,
+        __metadata__: dict | None = None,
+        __chat_id__: str | None = None,
+        __task__: str | None = None,
+        ) -> dict | None:
+        """Compare the messages of the request with the previous turn of the chat (same task).
+
+        A broken prefix (a message of the previous turn changed or removed) is logged as a warning record.
+        Returns None on the first turn of a chat.
+        """
+
+        # No messages
+        messages = (body or {}).get("messages")
+        if not isinstance(messages, list):
+            return None
+
+        # Compare
+        chat_id = __chat_id__ or (__metadata__ or {}).get("chat_id") or f"user:{user_id}"
+        task = __task__ or (__metadata__ or {}).get("task") or Config.CAPTURE_TASK_CHAT
+        prefix = self.prefixes.compare(f"{chat_id}|{task}", messages)
+
+        # Broken prefix
+        if prefix is not None and not prefix["stable"]:
+            self._log(f"{Config.TITLE_PREFIX} BROKEN [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]", {"chat_id": chat_id, "task": task, **prefix}, indent=True, delimiters=None, context={"user": user_id, "stage": "inlet"})
+
+            # DEBUG WARNING
+            if Config.DEBUG_WARNING and not plan.send_to_console:
+                print(f"[DEBUG FILTER DATA] WARNING | Prompt prefix broken at message {prefix['first_difference']['message']} (byte {prefix['common_prefix_bytes']})")
+
+        return prefix
+
+
+    def _build_summary(
+        self,
+        plan: CapturePlan, # Capture plan
+        interaction: str, # INLET or OUTLET
+        timestamp: str, # Timestamp of the interaction
+        body: dict | None = None,
+        __user__: dict | None = None,
+        __metadata__: dict | None = None,
+        __model__: dict | None = None,
+        __messages__: list | None = None,
+        chain: dict | None = None, # Measure of the filter chain profiler
+        drifts: list | None = None, # Schema drifts
+        stats: dict | None = None, # Rolling statistics of the model and task
+        monitor: dict | None = None, # Stream monitor of the response
+        prefix: dict | None = None, # Prompt prefix shared with the previous turn
+        budget: dict | None = None, # Context budget of the prompt
+        tasks: dict | None = None, # Background task calls of the chat turn
+        comparison: dict | None = None, # Multi-model comparison of the prompt
+        ) -> dict:
+        """Build the summary of an interaction.
+
+        Only the fields enabled in the capture plan are computed.
+        """
+
+        # Init
+        fields = plan.summary_fields
+        summary_info = {}
+
+        # Type
+        if "TYPE" in fields:
+            summary_info["TYPE"] = f"{interaction} (Priority: {self.valves.priority}) [{timestamp}]"
+
+        # Model
+        if "MODEL" in fields:
+            summary_model_id = __model__.get("id") if __model__ else "-"
+            summary_model_name = __model__.get("name") if __model__ else "UNKNOWN"
+            summary_info["MODEL"] = f"{summary_model_name} [{summary_model_id}]"
+
+        # User
+        if "USER" in fields:
+            summary_user_id = __user__.get("id") if __user__ else "-"
+            summary_user_name = __user__.get("name") if __user__ else "UNKNOWN"
+            summary_info["USER"] = f"{summary_user_name} [{summary_user_id}]"
+
+        # Messages count
+        if "MESSAGES COUNT" in fields:
+            summary_info["MESSAGES COUNT"] = len((body or {}).get("messages") or [])
+
+        # Keys
+        if "KEYS OF body" in fields:
+            summary_info["KEYS OF body"] = self._keys_txt(body)
+        if "KEYS OF __user__" in fields:
+            summary_info["KEYS OF __user__"] = self._keys_txt(__user__)
+        if "KEYS OF __metadata__" in fields:
+            summary_info["KEYS OF __metadata__"] = self._keys_txt(__metadata__)
+        if "KEYS OF __model__" in fields:
+            summary_info["KEYS OF __model__"] = self._keys_txt(__model__)
+        if "KEYS OF __messages__" in fields:
+            summary_info["KEYS OF __messages__"] = self._keys_txt(__messages__)
+
+        # Filter chain profiler
+        if chain and "FILTER CHAIN" in fields:
+            summary_info["FILTER CHAIN"] = chain
+
+        # Schema drifts
+        if drifts and "SCHEMA DRIFT" in fields:
+            summary_info["SCHEMA DRIFT"] = drifts
+
+        # Rolling statistics
+        if stats and "MODEL STATS" in fields:
+            summary_info["MODEL STATS"] = stats
+
+        # Stream monitor
+        if monitor and "STREAM MONITOR" in fields:
+            summary_info["STREAM MONITOR"] = monitor
+
+        # Prompt prefix
+        if prefix and "PROMPT PREFIX" in fields:
+            summary_info["PROMPT PREFIX"] = prefix
+
+        # Context budget
+        if budget and "CONTEXT BUDGET" in fields:
+            summary_info["CONTEXT BUDGET"] = budget
+
+        # Background tasks
+        if tasks and "BACKGROUND TASKS" in fields:
+            summary_info["BACKGROUND TASKS"] = tasks
+
+        # Multi-model comparison
+        if comparison and "MODEL COMPARISON" in fields:
+            summary_info["MODEL COMPARISON"] = comparison
+
+        return summary_info
+
+
+    def _clean_reports(self, body: dict, interaction: str) -> None:
+        """Remove Debug Filter Data reports from the messages of the body (in place).
+
+        A cheap substring check avoids running the regex on messages without report.
+        """
+
+        # No messages
+        if "messages" not in body or not body["messages"]:
+            return
+
+        for message_content in body["messages"]:
+            if "content" in message_content and isinstance(message_content["content"], str):
+                original_content = message_content["content"]
+
+                # No report
+                if Config.RESULT_KEYWORD_BEGIN not in original_content:
+                    continue
+
+                # Clean report
+                cleaned_content = self.report_pattern.sub('', original_content)
+
+                # Check for update
+                if cleaned_content != original_content:
+                    message_content["content"] = cleaned_content
+
+                    # DEBUG INFO
+                    if Config.DEBUG_INFO:
+                        print(f"[DEBUG FILTER DATA] INFO | Report CLEANED from {interaction}")
+
+
+    def _comparison_group(
+        self,
+        user_id: str, # Id of the user (chat key fallback)
+        body: dict | None = None,
+        __metadata__: dict | None = None,
+        __chat_id__: str | None = None,
+        ) -> str:
+        """Return the key shared by the sibling requests of a multi-model prompt: chat and parent message.
+
+        The parent message id is looked up in __metadata__ and body (Config.COMPARE_PARENT_KEYS). Without it, the
+        siblings are recognized by the number of messages and the last user message (the model system prompts differ).
+        """
+
+        # Chat
+        chat_id = __chat_id__ or (__metadata__ or {}).get("chat_id") or f"user:{user_id}"
+
+        # Parent message id
+        for key in Config.COMPARE_PARENT_KEYS:
+            parent_id = (__metadata__ or {}).get(key) or (body or {}).get(key)
+            if parent_id:
+                return f"{chat_id}|{parent_id}"
+
+        # Last user message
+        messages = (body or {}).get("messages") or []
+        last_user = next((message for message in reversed(messages) if isinstance(message, dict) and message.get("role") == "user"), None)
+        digest = hashlib.blake2b(json.dumps(last_user, ensure_ascii=False, default=str).encode("utf-8"), digest_size=8).hexdigest()
+        return f"{chat_id}|{len(messages)}:{digest}"
+
+
+    def _context_budget(self, body: dict | None = None, __model__: dict | None = None) -> dict:
+        """Break the size of the prompt down by source (Config.CONTEXT_SOURCES), in bytes and tokens.
+
+        The retrieved context (Config.CONTEXT_RAG_PATTERN) is counted apart from the message holding it, images as
+        Config.CONTEXT_TOKENS_PER_IMAGE tokens each. The total is compared with the context length of the model
+        when the body or __model__ exposes it (Config.CONTEXT_LENGTH_PATHS).
+        """
+
+        # Init
+        sources = {source: {"bytes": 0, "tokens": 0} for source in Config.CONTEXT_SOURCES}
+        images = 0
+
+        def add(source, text):
+            if text and source in sources:
+                size = len(text.encode("utf-8"))
+                sources[source]["bytes"] += size
+                sources[source]["tokens"] += self.tokens.count(text, size)
+
+        def add_image(size):
+            if "images" in sources:
+                sources["images"]["bytes"] += size
+                sources["images"]["tokens"] += Config.CONTEXT_TOKENS_PER_IMAGE
+
+        # Messages
+        for message in (body or {}).get("messages") or []:
+            if not isinstance(message, dict):
+                continue
+            source = {"system": "system", "developer": "system", "assistant": "assistant", "tool": "tool_results"}.get(message.get("role"), "user")
+            content = message.get("content")
+
+            for part in [content] if isinstance(content, str) else content if isinstance(content, list) else []:
+
+                # Text (without the retrieved context)
+                text = part if isinstance(part, str) else part.get("text") if isinstance(part, dict) and part.get("type") == "text" else None
+                if isinstance(text, str):
+                    contexts = self.rag_pattern.findall(text) if "<" in text else []
+                    for context in contexts:
+                        add("rag", context)
+                    add(source, self.rag_pattern.sub("", text) if contexts else text)
+
+                # Image
+                elif isinstance(part, dict) and part.get("type") == "image_url":
+                    images += 1
+                    add_image(len(str((part.get("image_url") or {}).get("url") or "")))
+
+            # Images (Ollama format) and tool calls
+            for image in message.get("images") or []:
+                images += 1
+                add_image(len(str(image)))
+            if message.get("tool_calls"):
+                add("assistant", json.dumps(message["tool_calls"], ensure_ascii=False, default=str))
+
+        # Tool specs
+        if (body or {}).get("tools"):
+            add("tool_specs", json.dumps(body["tools"], ensure_ascii=False, default=str))
+
+        # Breakdown
+        total_bytes = sum(values["bytes"] for values in sources.values())
+        total_tokens = sum(values["tokens"] for values in sources.values())
+        budget = {
+            "tokenizer": self.tokens.label,
+            "sources": {source: {**values, "share": f"{values['tokens'] / total_tokens:.1%}" if total_tokens else "-"} for source, values in sources.items() if values["bytes"]},
+            "total": {"bytes": total_bytes, "tokens": total_tokens},
+        }
+        if images and "images" in budget["sources"]:
+            budget["sources"]["images"]["count"] = images
+
+        # Context length
+        for path in Config.CONTEXT_LENGTH_PATHS:
+            context_length = self._get_by_path({"body": body, "__model__": __model__}, path)
+            if isinstance(context_length, (int, float)) and not isinstance(context_length, bool) and context_length > 0:
+                context_length = int(context_length)
+                budget["context_length"] = context_length
+                budget["used"] = f"{total_tokens / context_length:.1%}"
+                budget["remaining_tokens"] = context_length - total_tokens
+                if total_tokens > context_length:
+                    budget["warning"] = "over the context length, the prompt is truncated"
+                elif total_tokens >= context_length * Config.CONTEXT_WARNING_RATIO:
+                    budget["warning"] = "near truncation"
+                break
+
+        # Token cache
+        if self.tokens.encode is not None:
+            budget["token_cache"] = f"{self.tokens.hits} hits, {self.tokens.misses} misses"
+
+        return budget
+
+
+    def _digest_string(self, value: str) -> Any:
+        """Replace a large string (data URI, base64, long text) by a descriptor.
+
+        The string is never copied as a whole: it is hashed by slices of Config.DIGEST_CHUNK_SIZE characters.
+        Returns the string unchanged if it is not large enough.
+        """
+
+        # Init
+        length = len(value)
+        mime = None
+        offset = 0
+
+        # Data URI (e.g.: images in multimodal messages)
+        match = self.data_uri_pattern.match(value) if value.startswith("data:") else None
+        if match and length - match.end() >= Config.DIGEST_BASE64_MIN_SIZE:
+            kind = "data-uri"
+            mime = match.group(1) or "text/plain"
+            offset = match.end()
+
+        # Raw base64 (windows spread over the whole string are checked, not every character)
+        elif length >= Config.DIGEST_BASE64_MIN_SIZE and self._looks_base64(value):
+            kind = "base64"
+
+        # Long text (e.g.: extracted file contents)
+        elif length > Config.DIGEST_TEXT_MAX_SIZE:
+            kind = "text"
+
+        # Nothing to digest
+        else:
+            return value
+
+        # Streaming hash and byte length
+        try:
+            hasher = hashlib.new(Config.DIGEST_HASH)
+        except (ValueError, TypeError):
+            hasher = hashlib.sha256()
+        byte_length = 0
+        chunk_size = max(1, Config.DIGEST_CHUNK_SIZE)
+        for start in range(offset, length, chunk_size):
+            chunk = value[start:start + chunk_size].encode("utf-8", errors="surrogatepass")
+            hasher.update(chunk)
+            byte_length += len(chunk)
+
+        # Base64: decoded size and mime type from the magic number
+        if kind in ("data-uri", "base64"):
+            padding = (value[-1] == "=") + (value[-2] == "=")
+            byte_length = (length - offset) * 3 // 4 - padding
+            if mime is None:
+                mime = self._guess_mime(value[offset:offset + 24])
+
+        # Descriptor
+        descriptor = {
+            "digest": kind,
+            "mime": mime,
+            "bytes": byte_length,
+            "size": self._format_size(byte_length),
+            hasher.name: hasher.hexdigest(),
+        }
+        if kind == "text":
+            del descriptor["mime"]
+            descriptor["chars"] = length
+            descriptor["preview"] = value[:Config.DIGEST_TEXT_PREVIEW]
+
+        return descriptor
+
+
+    def _encode_chunks(self, serializable_data: Any, cancel: threading.Event | None = None) -> Iterator[str]:
+        """Encode sanitized data as indented JSON, yielded in chunks of about Config.LOG_CHUNK_SIZE characters.
+
+        Fragments of the iterative encoder are grouped, so memory is bounded by the chunk size (see _format_json_chunks).
+        Stops with Config.OFFLOAD_TRUNCATED after a chunk once cancel is set (formatting timeout, see _offload).
+        """
+
+        # Format (iterative encoder, fragments grouped in chunks)
+        buffer = []
+        buffer_size = 0
         try:
-            handler = RotatingFileHandler(
-                self.valves.file_path,
-                maxBytes=Config.LOG_SIZE * 1024 * 1024,
-                backupCount=Config.LOG_BACKUP_COUNT
-            )
-            handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
-            self.logger.addHandler(handler)
-            self.logger.setLevel(getattr(logging, Config.LOG_LEVEL.upper()))
-            self.logger.propagate = False
+            for fragment in self.json_encoder.iterencode(serializable_data):
+                buffer.append(fragment)
+                buffer_size += len(fragment)
+                if buffer_size >= Config.LOG_CHUNK_SIZE:
+                    yield "".join(buffer)
+                    buffer = []
+                    buffer_size = 0
+                    if cancel is not None and cancel.is_set():
+                        yield Config.OFFLOAD_TRUNCATED
+                        return
+
+        # Format error (the chunks already yielded are kept)
         except Exception as e:
+            buffer.append(f" <FORMAT ERROR: {e}>")
 
-            #DEBUG ERROR
+            # DEBUG ERROR
             if Config.DEBUG_ERROR:
-                print(f"[DEBUG FILTER DATA] ERROR | Failed to initialize logger: {e}")
+                print(f"[DEBUG FILTER DATA] ERROR | Error formatting data: {e}")
 
-            # Fallback to NullHandler to avoid crashes
-            self.logger.addHandler(logging.NullHandler())
+        if buffer:
+            yield "".join(buffer)
 
-        # DEBUG INFO
-        if Config.DEBUG_INFO:
-            print(f"[DEBUG FILTER DATA] INFO | Init")
 
+    def _estimate_size(self, data: Any, limit: int) -> int:
+        """Estimate the formatted size of data, stopping as soon as it exceeds limit.
 
-    def _format_json(self, data: dict | None = None) -> str:
-        """Format data as indented JSON string, with obfuscation and fallback for non-serializables.
+        Counts the string lengths and a few bytes per item, so the cost is bounded by the limit, not by the data size.
+        """
 
-        Converts callables/objects to str representations to avoid errors.
+        # Init
+        size = 0
+        stack = [data]
+        seen = set() # Containers already counted (cycles, shared objects)
+
+        while stack and size <= limit:
+            obj = stack.pop()
+            if isinstance(obj, str):
+                size += len(obj) + 4
+            elif isinstance(obj, dict):
+                if id(obj) in seen:
+                    continue
+                seen.add(id(obj))
+                size += 2
+                for key, value in obj.items():
+                    size += len(key) + 6 if isinstance(key, str) else 8
+                    stack.append(value)
+            elif isinstance(obj, (list, tuple)):
+                if id(obj) in seen:
+                    continue
+                seen.add(id(obj))
+                size += 2
+                stack.extend(obj)
+            else:
+                size += 8
+
+        return size
+
+
+    def _fingerprint(self, data: Any) -> bytes:
+        """Content digest of data (BLAKE2b of its structure), without copy of the containers.
+
+        Objects are fingerprinted through their adapted form (see TypeAdapters), as they are rendered. The containers
+        and objects fingerprinted less than Config.CACHE_FINGERPRINT_TTL ago (same object, same length) are not walked
+        again (see SectionCache).
         """
 
-        # No data
-        if data is None:
-            return "{}"  # Return empty JSON string instead of dict
+        # Options
+        max_depth = Config.SECURITY_SANITIZE_MAX_DEPTH
+        path_ids = set() # Containers on the current path (cycle detection)
+
+        def fingerprint(obj, depth, digest):
+
+            # Scalars (type included: 1, 1.0 and True are rendered differently)
+            if isinstance(obj, str):
+                digest.update(b"s%d:" % len(obj))
+                digest.update(obj.encode("utf-8", "surrogatepass"))
+                return
+            if obj is None or isinstance(obj, (bool, int, float)):
+                digest.update(f"{type(obj).__name__}:{obj!r};".encode("utf-8"))
+                return
+
+            # Depth and cycle guards
+            if depth > max_depth:
+                digest.update(b"depth;")
+                return
+            obj_id = id(obj)
+            if obj_id in path_ids:
+                digest.update(b"cycle;")
+                return
+
+            # Seen before
+            known = self.section_cache.known_fingerprint(obj)
+            if known is None:
+                inner = hashlib.blake2b(digest_size=16)
+                path_ids.add(obj_id)
+                try:
+                    if isinstance(obj, dict):
+                        inner.update(b"{%d:" % len(obj))
+                        for key, value in obj.items():
+                            fingerprint(key, depth + 1, inner)
+                            fingerprint(value, depth + 1, inner)
+                    elif isinstance(obj, (list, tuple)):
+                        inner.update(b"[%d:" % len(obj))
+                        for value in obj:
+                            fingerprint(value, depth + 1, inner)
+                    else:
+                        fingerprint(self.adapters.adapt(obj), depth + 1, inner)
+                finally:
+                    path_ids.discard(obj_id)
+                known = inner.digest()
+                self.section_cache.remember_fingerprint(obj, known)
+
+            digest.update(known)
+
+        result = hashlib.blake2b(digest_size=16)
+        fingerprint(data, 0, result)
+        return result.digest()
+
+
+    def _end_trace(self, trace: dict, body: dict | None = None) -> None:
+        """Build the spans of a finished request and queue them for export.
+
+        Root span from inlet to outlet, with child spans for the filter processing, the time to first chunk and the stream.
+        """
 
-        # Obfuscate sensitive data if enabled
-        obfuscated_data = self._obfuscate_data(data) if Config.SECURITY_OBFUSCATE else data
+        # Init
+        end = time.time_ns()
+        trace_id = trace["trace_id"]
+        root_id = trace["root_id"]
+        attributes = dict(trace["attributes"])
+        attributes["openwebui.stream_chunks"] = trace["chunks"]
+        if body is not None and "messages" in body:
+            attributes["openwebui.outlet_message_count"] = len(body.get("messages") or [])
+
+        def span(name, start, stop, span_id=None, parent_id=root_id, span_attributes=None):
+            return {
+                "traceId": trace_id,
+                "spanId": span_id or os.urandom(8).hex(),
+                "parentSpanId": parent_id or "",
+                "name": name,
+                "kind": 1, # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(start),
+                "endTimeUnixNano": str(max(start, stop)),
+                "attributes": [self._otlp_attribute(key, value) for key, value in (span_attributes or {}).items()],
+                "status": {},
+            }
+
+        # Root and filter processing
+        spans = [span("chat.request", trace["start"], end, span_id=root_id, parent_id=None, span_attributes=attributes)]
+        if trace.get("inlet_end"):
+            spans.append(span("debug_filter_data.inlet", trace["start"], trace["inlet_end"]))
+        if trace.get("outlet_start"):
+            spans.append(span("debug_filter_data.outlet", trace["outlet_start"], end))
+
+        # Model response
+        if trace.get("first_chunk"):
+            spans.append(span("llm.time_to_first_chunk", trace.get("inlet_end") or trace["start"], trace["first_chunk"]))
+            spans.append(span("llm.stream", trace["first_chunk"], trace["last_chunk"], span_attributes={"openwebui.stream_chunks": trace["chunks"]}))
+
+        self.exporter.export(spans)
+
+
+    def _drop_request(self, request_key: str) -> None:
+        """Remove a request from all the request temps."""
+
+        for temp in self.request_temps:
+            temp.pop(request_key, None)
+        self.pending_requests.pop(request_key, None)
+
+
+    async def _emit_status(
+        self,
+        __event_emitter__: Optional[Callable[[dict], Any]], # Event emitter of the interaction
+        description: str, # Text of the status
+        done: bool = False, # Last status
+        ) -> None:
+        """Emit a status in the chat if an emitter is available and Config.STATUS_USE is enabled."""
 
-        # Pre-convert non-serializable items (e.g., functions) to str
-        def make_serializable(obj):
+        # No status
+        if not __event_emitter__ or not Config.STATUS_USE:
+            return
 
-            if isinstance(obj, dict):
-                return {k: make_serializable(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [make_serializable(item) for item in obj]
-            elif callable(obj):  # Functions or callables
-                return f"<callable: {str(obj)}>"
-            elif not isinstance(obj, (str, int, float, bool, type(None))):  # Other non-serializables
-                return str(obj)
+        # Data
+        data = {"description": description, "done": done}
+        if not done:
+            data["hidden"] = False
 
-            return obj
-        
-        serializable_data = make_serializable(obfuscated_data)
+        await __event_emitter__({"type": "status", "data": data})
 
-        # Format
-        try:
-            # Json format
-            formatted_data = json.dumps(serializable_data, indent=2, ensure_ascii=False)
 
-        # Format error
+    def _flight_dump(self, plan: CapturePlan, dump: dict, context: dict | None = None, cancel: threading.Event | None = None) -> None:
+        """Append a flight recorder dump to 'flight_path' and log it (run by _offload, truncated by its timeout)."""
+
+        try:
+            line = json.dumps(self._sanitize_data(dump, cancel, plan), ensure_ascii=False)
+            with open(plan.flight_path, "a", encoding="utf-8") as file:
+                file.write(line + "\n")
         except Exception as e:
-            # Error: no format
-            formatted_data = str(serializable_data)  # Fallback if problem (use serializable data)
 
             # DEBUG ERROR
             if Config.DEBUG_ERROR:
-                print(f"[DEBUG FILTER DATA] ERROR | Error formatting data: {e}")
-                print(f"[DEBUG FILTER DATA] DEBUG | {serializable_data}\n")
+                print(f"[DEBUG FILTER DATA] ERROR | Flight recorder dump failed: {e}")
+
+            return
+
+        self._log(f"{Config.TITLE_FLIGHT} [{dump['dumped_at']}]", {"triggers": dump["triggers"], "message_id": dump["trigger_message_id"], "requests": len(dump["requests"]), "path": plan.flight_path}, indent=True, delimiters=None, context=context, plan=plan)
+
+
+    async def _flight_end(self, plan: CapturePlan, request_key: str, body: dict) -> None:
+        """Complete the flight record of a request at outlet and dump the recorder if a trigger fires.
+
+        Triggers: error in the reply, empty reply, latency above 'flight_latency_seconds', stream without finish_reason.
+        """
+
+        # Record of the request (none without inlet)
+        record = self.debug_flight_temp.pop(request_key, None)
+        if record is None:
+            return
+
+        # Outlet
+        last_message = ((body or {}).get("messages") or [{}])[-1]
+        last_message = last_message if isinstance(last_message, dict) and last_message.get("role") == "assistant" else {}
+        record["latency_seconds"] = round(time.monotonic() - record.pop("start"), 3)
+        record["outlet_message"] = dict(last_message)
+
+        # Triggers
+        triggers = []
+        if last_message.get("error") or (body or {}).get("error"):
+            triggers.append("error")
+        if not str(last_message.get("content") or "").strip() and not last_message.get("tool_calls"):
+            triggers.append("empty reply")
+        if plan.flight_latency and record["latency_seconds"] >= plan.flight_latency:
+            triggers.append(f"latency above {plan.flight_latency}s")
+        if record["stream"]["chunks"] and record["stream"]["finish_reason"] is None:
+            triggers.append("stream without finish_reason")
+        if not triggers:
+            return
+
+        await self._flight_trigger(plan, triggers, record, "outlet")
+
+
+    async def _flight_check(self, plan: CapturePlan) -> None:
+        """Dump the requests that never reached the outlet: evicted from the pending requests (see _track_request) or
+        older than Config.FLIGHT_STALL_SECONDS.
+
+        A stalled stream or a closed connection has no outlet to fire the triggers, the next inlet fires them.
+        """
+
+        # Stalled requests (the temps are in inlet order: oldest first)
+        now = time.monotonic()
+        stalled = []
+        for request_key, record in self.debug_flight_temp.items():
+            if now - record["start"] <= Config.FLIGHT_STALL_SECONDS:
+                break
+            stalled.append(request_key)
+        for request_key in stalled:
+            self.flight_stalled.append(self.debug_flight_temp.pop(request_key))
+
+        # Dump each one
+        while self.flight_stalled:
+            record = self.flight_stalled.popleft()
+            record["latency_seconds"] = round(now - record.pop("start"), 3)
+            trigger = "stream without finish_reason" if record["stream"]["chunks"] and record["stream"]["finish_reason"] is None else "no outlet"
+            await self._flight_trigger(plan, [f"{trigger} after {record['latency_seconds']}s"], record, "inlet")
+
+
+    async def _flight_trigger(self, plan: CapturePlan, triggers: list, record: dict, stage: str) -> None:
+        """Dump the flight recorder for the triggers fired by a request."""
+
+        # Dump (the only serialization of the recorder, in a worker thread when large; records copied as the requests in progress still update theirs)
+        dump = {"dumped_at": datetime.now().isoformat(timespec="milliseconds"), "triggers": triggers, "trigger_message_id": record["message_id"], "requests": [{**item, "stream": dict(item["stream"])} for item in self.flight_recorder]}
+        await self._offload(plan, dump, self._flight_dump, plan, dump, {"user": record["user_id"], "model": record["model"], "stage": stage})
 
-        return formatted_data
+
+    def _flight_start(
+        self,
+        request_key: str, # Key of the request temps
+        user_id: str, # Id of the user
+        body: dict | None = None,
+        __metadata__: dict | None = None,
+        __model__: dict | None = None,
+        __task__: str | None = None,
+        ) -> None:
+        """Add the compact record of a request to the flight recorder (references, no formatting).
+
+        The body and its messages are copied shallowly, since later filters may change them in place.
+        """
+
+        # Body (shallow copies only)
+        inlet_body = dict(body or {})
+        if isinstance(inlet_body.get("messages"), list):
+            inlet_body["messages"] = list(inlet_body["messages"])
+
+        # Record (in the ring while in progress)
+        record = {
+            "started_at": datetime.now().isoformat(timespec="milliseconds"),
+            "start": time.monotonic(),
+            "user_id": user_id,
+            "model": (__model__ or {}).get("id"),
+            "chat_id": (__metadata__ or {}).get("chat_id"),
+            "message_id": (__metadata__ or {}).get("message_id"),
+            "task": __task__,
+            "inlet_body": inlet_body,
+            "stream": {"chunks": 0, "finish_reason": None},
+        }
+        self.flight_recorder.append(record)
+        self.debug_flight_temp[request_key] = record
+
+
+    def _format_json(self, data: dict | None = None) -> str:
+        """Format data as indented JSON string, with obfuscation and fallback for non-serializables.
+
+        Converts callables/objects to str representations to avoid errors (see _sanitize_data).
+        """
+
+        return "".join(self._format_json_chunks(data))
+
+
+    def _format_json_chunks(self, data: dict | None = None, cancel: threading.Event | None = None, plan: CapturePlan | None = None) -> Iterator[str]:
+        """Format data as indented JSON, yielded in chunks of about Config.LOG_CHUNK_SIZE characters.
+
+        The sinks write the chunks as they come, so the formatted report is never built as a whole (see _log).
+        The top-level sections of Config.CACHE_SECTIONS are served from the section cache (see _render_section), unless
+        their estimated size exceeds Config.CACHE_MAX_SECTION_SIZE: they are streamed, never joined.
+        The formatting threads pass the plan compiled by the hook (see _sanitize_data).
+        """
+
+        # No data
+        if data is None:
+            yield "{}"
+            return
+
+        # No cached section
+        cached_keys = data.keys() & Config.CACHE_SECTIONS if isinstance(data, dict) else None
+        if not cached_keys:
+            yield from self._encode_chunks(self._sanitize_data(data, cancel, plan), cancel)
+            return
+
+        # Sections one by one (same output as a single encoding, the nested ones indented one level)
+        yield "{"
+        for index, (key, value) in enumerate(data.items()):
+            yield f"{',' if index else ''}\n  {json.dumps(str(key), ensure_ascii=False)}: "
+            if cancel is not None and cancel.is_set():
+                yield Config.OFFLOAD_TRUNCATED
+                return
+            if key in cached_keys and self._estimate_size(value, Config.CACHE_MAX_SECTION_SIZE) <= Config.CACHE_MAX_SECTION_SIZE:
+                yield self._render_section(key, value, cancel, plan)
+            else:
+                for chunk in self._encode_chunks(self._sanitize_data(value, cancel, plan), cancel):
+                    yield chunk.replace("\n", "\n  ")
+        yield "\n}"
 
 
     def _format_size(self, size: int) -> str:
@@ -342,244 +3123,983 @@ class Filter:
             return f"{size:.2f} {units[i]}".rstrip('0').rstrip('.')
 
 
-    def _get_by_path(self, data: dict | list | None, path: str) -> Any:
-        """Extract value from nested dict/list using dot-path with [index] support.
+    def _get_by_path(self, data: dict | list | None, path: str) -> Any:
+        """Extract value from nested dict/list using dot-path with [index] support.
+
+        Safe against invalid paths/indexes; returns None on failure with optional warning log.
+        """
+
+        # Empty
+        if not path or data is None:
+            return None
+        
+        # Tokenize path: find all keys and [indexes] with regex
+        # Matches keys or [num]
+        tokens = []
+        # Regex to split on '.' but capture [num] separately
+        parts = re.findall(r'[^.\[\]]+|\[\d+\]', path)
+        for part in parts:
+            if part.startswith('[') and part.endswith(']'):
+                index_str = part[1:-1]
+                if index_str.isdigit():
+                    tokens.append(int(index_str))
+                else:
+
+                    # DEBUG WARNING
+                    if Config.DEBUG_WARNING:
+                        print(f"[DEBUG FILTER DATA] WARNING | Invalid index in path '{path}': {index_str}")
+
+                    return None
+            else:
+                tokens.append(part)
+
+        # Check path
+        current = data
+        try:
+            for token in tokens:
+                if isinstance(token, int) and isinstance(current, list):
+                    current = current[token]  # List index
+                elif isinstance(current, dict):
+                    current = current.get(token)  # Dict key
+                else:
+                    return None
+                if current is None:
+                    return None
+            return current
+
+        # Invalid path
+        except (IndexError, ValueError, TypeError, KeyError) as e:
+
+            # DEBUG WARNING
+            if Config.DEBUG_WARNING:
+                print(f"[DEBUG FILTER DATA] WARNING | Invalid custom key path '{path}': {e}")
+
+            return None
+
+
+    def _get_executor(self, plan: CapturePlan) -> ThreadPoolExecutor:
+        """Return the formatting thread pool of the plan size, shared by the instances (no threads left by a reload).
+
+        A pool of another size is replaced: it is shut down without waiting, its running reports end on their own.
+        """
+
+        executors = get_shared_state("executors")
+        with get_shared_state("executor_locks").setdefault("pool", threading.Lock()):
+            executor = executors.get("pool")
+            if executor is None or executors.get("workers") != plan.offload_workers:
+                if executor is not None:
+                    executor.shutdown(wait=False)
+                executor = executors["pool"] = ThreadPoolExecutor(max_workers=plan.offload_workers, thread_name_prefix="dfd-format")
+                executors["workers"] = plan.offload_workers
+
+        return executor
+
+
+    def _looks_base64(self, value: str) -> bool:
+        """Check Config.DIGEST_BASE64_SAMPLES windows of 64 characters spread from the start to the end of a string.
+
+        Only the last window may end with the '=' padding. A string with other content between the windows is
+        still taken for base64 (sampling), but not one with base64-looking ends only.
+        """
+
+        length = len(value)
+        window = 64
+        samples = max(2, Config.DIGEST_BASE64_SAMPLES)
+        for index in range(samples):
+            start = (length - window) * index // (samples - 1)
+            end = start + window
+            if not self.base64_pattern.fullmatch(value, start, end) or (end < length and "=" in value[start:end]):
+                return False
+
+        return True
+
+
+    def _get_chunks_size(self, chunks: list) -> int:
+        """Return _get_json_size of the joined chunks of a formatted report, without joining them.
+
+        JSON escaping is per character, so the escaped chunks add up to the escaped string (plus its two quotes).
+        """
+
+        return 2 + sum(len(json.dumps(chunk, ensure_ascii=False).encode('utf-8')) - 2 for chunk in chunks)
+
+
+    def _get_json_size(self, data: Any) -> int:
+        """Calculate the byte size of JSON-serialized data.
+
+        Returns 0 on failure or None. Used for size display in logs/chat.
+        """
+
+        # No data
+        if data is None:
+            return 0
+
+        # Size
+        try:
+            json_str = json.dumps(data, ensure_ascii=False)  # To include non-ASCII characters without escaping them
+            return len(json_str.encode('utf-8'))
+
+        # Size error
+        except Exception as e:
+
+            # DEBUG ERROR
+            if Config.DEBUG_ERROR:
+                print(f"[DEBUG FILTER DATA] ERROR | Failed to get JSON size: {e}")
+
+            return 0
+
+
+    def _get_plan(self) -> CapturePlan:
+        """Return the capture plan, compiled again only when a valve value changed.
+
+        Open WebUI replaces or updates the Valves at any time, so the values are compared on each call (cheap tuple comparison).
+        """
+
+        # Valves values
+        signature = tuple(vars(self.valves).values())
+
+        # Compile plan
+        if self.plan is None or self.plan.signature != signature:
+            previous_plan = self.plan
+            self.plan = CapturePlan(self.valves, signature)
+
+            # Keep the armed capture state while its valves do not change
+            if previous_plan is not None and previous_plan.armed_settings == self.plan.armed_settings:
+                self.plan.armed_remaining = previous_plan.armed_remaining
+                self.plan.armed_deadline = previous_plan.armed_deadline
+                self.plan.armed_over = previous_plan.armed_over
+
+            # File sink (opened, swapped or closed)
+            self.sinks.configure(self.plan.file_settings)
+
+            # Live tail (the server of the previous path is released, stopped if no other filter uses it)
+            if self.tail is not None and self.tail.path != self.plan.tail_path:
+                self.tail.release()
+                self.tail = None
+            if self.plan.send_to_tail and self.tail is None:
+                self.tail = TailServer.get(self.plan.tail_path)
+
+            # Rendered sections (obfuscation and digest options may have changed)
+            self.section_cache.clear()
+
+            # Span exporter (the previous one exports its queue and stops when idle)
+            if self.plan.trace and (self.exporter is None or self.exporter.endpoint != self.plan.trace_endpoint):
+                self.exporter = SpanExporter(self.plan.trace_endpoint)
+
+            # Schema accumulator (reloaded from its file when the path changes)
+            if self.plan.schema and (self.schema is None or self.schema.path != self.plan.schema_path):
+                self.schema = SchemaAccumulator(self.plan.schema_path)
+
+            # Rolling statistics (kept while the valves change)
+            if self.plan.stats and self.stats is None:
+                self.stats = RollingStats()
+
+            # Prompt fingerprints (kept while the valves change)
+            if self.plan.prefix and self.prefixes is None:
+                self.prefixes = PrefixTracker()
+
+            # Task ledger (kept while the valves change)
+            if self.plan.accounting and self.tasks is None:
+                self.tasks = TaskLedger()
+
+            # Token counter (loaded again when the tokenizer changes)
+            if self.plan.budget:
+                self.tokens.configure(self.plan.tokenizer)
+
+            # DEBUG INFO
+            if Config.DEBUG_INFO:
+                print(f"[DEBUG FILTER DATA] INFO | Capture plan compiled (active:{self.plan.active})")
+
+        return self.plan
+
+
+    def _guess_mime(self, head: str) -> str:
+        """Guess the mime type of base64 data from the magic number of its first bytes."""
+
+        # Decode the head only
+        try:
+            head = head[:len(head) - len(head) % 4]
+            data = base64.b64decode(head, altchars=b"-_" if ("-" in head or "_" in head) else None)
+        except Exception:
+            return "application/octet-stream"
+
+        # Known signatures
+        signatures = (
+            (b"\x89PNG", "image/png"),
+            (b"\xff\xd8\xff", "image/jpeg"),
+            (b"GIF8", "image/gif"),
+            (b"%PDF", "application/pdf"),
+            (b"PK\x03\x04", "application/zip"),
+            (b"ID3", "audio/mpeg"),
+            (b"OggS", "audio/ogg"),
+        )
+        for signature, mime in signatures:
+            if data.startswith(signature):
+                return mime
+        if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+            return "image/webp"
+        if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+            return "audio/wav"
+
+        return "application/octet-stream"
+
+
+    def _infer_schema(
+        self,
+        plan: CapturePlan, # Capture plan
+        interaction: str, # INLET or OUTLET
+        body: dict | None = None,
+        __metadata__: dict | None = None,
+        __model__: dict | None = None,
+        ) -> list:
+        """Merge the structure of the sections in the schema and return the drifts found.
+
+        The schema is logged and saved every Config.SCHEMA_REPORT_EVERY requests or SCHEMA_REPORT_INTERVAL seconds.
+        """
+
+        # Init
+        drifts = []
+        sections = {"body": body, "__metadata__": __metadata__, "__model__": __model__}
+
+        # Merge
+        for section in Config.SCHEMA_SECTIONS:
+            if sections.get(section) is not None:
+                drifts += self.schema.add(f"{interaction.lower()}.{section}", sections[section])
+        drifts = drifts[:Config.SCHEMA_MAX_DRIFTS]
+
+        # Drift
+        if drifts:
+            self._log(f"{Config.TITLE_SCHEMA_DRIFT} {interaction} [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]", {"drifts": drifts}, indent=True, delimiters=None, context={"stage": interaction.lower()})
+
+        # Periodic report (counted once per request)
+        if interaction == "INLET":
+            self.schema.requests += 1
+            if self.schema.requests % Config.SCHEMA_REPORT_EVERY == 0 or time.monotonic() - self.schema.last_report >= Config.SCHEMA_REPORT_INTERVAL:
+                self.schema.last_report = time.monotonic()
+                self._log(f"{Config.TITLE_SCHEMA} ({self.schema.requests} requests) [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]", self.schema.render(), indent=True, delimiters="all")
+                self.schema.save()
+
+        return drifts
+
+
+    def _is_captured(
+        self,
+        plan: CapturePlan, # Capture plan
+        body: dict | None = None,
+        __user__: dict | None = None,
+        __metadata__: dict | None = None,
+        __model__: dict | None = None,
+        __chat_id__: str | None = None,
+        __task__: str | None = None,
+        consume: bool = True, # Count the request in the armed capture
+        ) -> bool:
+        """Check a request against the targeting valves and the armed capture.
+
+        Only the target types in use are read, and each check is a set lookup.
+        """
+
+        # Values of the request
+        values = {}
+        for target_type in plan.target_types:
+            if target_type == "user":
+                values["user"] = (__user__ or {}).get("id")
+            elif target_type == "email":
+                values["email"] = ((__user__ or {}).get("email") or "").lower()
+            elif target_type == "chat":
+                values["chat"] = __chat_id__ or (__metadata__ or {}).get("chat_id")
+            elif target_type == "model":
+                values["model"] = (__model__ or {}).get("id") or (body or {}).get("model")
+            elif target_type == "task":
+                values["task"] = __task__ or (__metadata__ or {}).get("task") or Config.CAPTURE_TASK_CHAT
+
+        # Denylist: any match
+        for target_type, targets in plan.capture_ignore.items():
+            if values[target_type] in targets:
+                return False
+
+        # Allowlist: each target type must match
+        for target_type, targets in plan.capture_only.items():
+            if values[target_type] not in targets:
+                return False
+
+        # Armed capture
+        if plan.armed:
+
+            # Over (time or number of requests)
+            if not plan.armed_over:
+                if plan.armed_deadline is not None and time.monotonic() > plan.armed_deadline:
+                    plan.armed_over = True
+                elif plan.armed_settings[0] and plan.armed_remaining <= 0:
+                    plan.armed_over = True
+
+                # DEBUG INFO
+                if plan.armed_over and Config.DEBUG_INFO:
+                    print(f"[DEBUG FILTER DATA] INFO | Armed capture is over, capture disabled until the valves change")
+
+            if plan.armed_over:
+                return False
+
+            # Count the request
+            if consume and plan.armed_settings[0]:
+                plan.armed_remaining -= 1
+
+        return True
+
+
+    def _keys_txt(self, data: Any) -> str:
+        """Return the keys of a dict joined in a string (empty if not a dict)."""
+
+        if isinstance(data, Mapping):
+            return ', '.join(str(key) for key in data.keys())
+
+        return ''
+
+
+    def _log(
+        self,
+        message: str | None = None,  # The message to log
+        data: dict | None = None,  # The data to log
+        indent: bool = True,  # Indent the data
+        delimiters: str | None = None,  # Delimiters to log (top/bottom)
+        context: dict | None = None,  # Context of the record for the live tail filters (user, model, stage)
+        cancel: threading.Event | None = None,  # Set to truncate the data (formatting timeout, see _offload)
+        sinks: frozenset | None = None,  # Log sinks written (console, file, tail), all by default
+        collect: list | None = None,  # Receives the formatted data chunks (chat report of the same profile)
+        plan: CapturePlan | None = None,  # Plan compiled by the hook (formatting threads), compiled here otherwise
+        ):
+        """Log message and/or data to console, file, and/or live tail based on settings.
+
+        Handles formatting, sending to destinations, and error resilience.
+        """
+
+        # No console, no file, no tail subscriber and no collector for this record
+        plan = plan or self._get_plan()
+        to_console = plan.send_to_console and (sinks is None or "console" in sinks)
+        to_file = plan.send_to_file and (sinks is None or "file" in sinks)
+        to_tail = plan.send_to_tail and (sinks is None or "tail" in sinks) and self.tail is not None and self.tail.wants(context)
+        if not (to_console or to_file or to_tail or collect is not None):
+            return
+
+        def entry_chunks():
+            """Yield the log entry in chunks."""
+
+            # Top delimiter
+            if delimiters == "all" or delimiters == "top":
+                yield f"\n{'='*80}\n"
+
+            # Message
+            if message is not None:
+                yield f"{message}\n"
+
+            # Data
+            if data:
+                # Format data
+                if indent:
+                    for chunk in self._format_json_chunks(data, cancel, plan):
+                        if collect is not None:
+                            collect.append(chunk)
+                        yield chunk
+                    yield "\n"
+                else:
+                    yield str(data) + "\n"
+
+            # Bottom delimiter
+            if delimiters == "all" or delimiters == "bottom":
+                yield f"\n{'='*80}\n"
+
+        # Sinks
+        console_write = sys.stdout.write if to_console else None
+        if to_file:
+            self.sinks.configure(plan.file_settings) # Another instance (reload) may have changed the file sink
+
+        # Live tail record (bounded)
+        tail_chunks = [f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - "] if to_tail else None
+        tail_size = 0
+
+        # Log to console, file and tail, chunk by chunk
+        try:
+            with self.sinks.record(to_file) as file_write:
+                for chunk in entry_chunks():
+                    if tail_chunks is not None and tail_size < Config.TAIL_MAX_RECORD_SIZE:
+                        tail_chunks.append(chunk)
+                        tail_size += len(chunk)
+                    elif console_write is None and file_write is None and collect is None:
+                        break
+                    if console_write is not None:
+                        console_write(chunk)
+                    if file_write is not None:
+                        try:
+                            file_write(chunk)
+                        except Exception as e:
+                            file_write = None
+
+                            # DEBUG WARNING
+                            if Config.LOG_ERROR_WARNING:
+                                print(f"[DEBUG FILTER DATA] WARNING | File logging failed: {e}")
+        except Exception as e:
+
+            # DEBUG WARNING
+            if Config.LOG_ERROR_WARNING:
+                print(f"[DEBUG FILTER DATA] WARNING | Logging failed: {e}")
+
+        # End of the console entry
+        if console_write is not None:
+            console_write("\n")
+            sys.stdout.flush()
+
+        # Publish to the tail subscribers
+        if tail_chunks is not None:
+            record = "".join(tail_chunks)
+            if tail_size >= Config.TAIL_MAX_RECORD_SIZE:
+                record = f"{record[:Config.TAIL_MAX_RECORD_SIZE]}\n... (truncated for the tail)\n"
+            self.tail.publish(record + "\n", context)
+
+
+    def _log_report(
+        self,
+        plan: CapturePlan, # Capture plan
+        message: str, # The message to log
+        data: dict | None, # The selected data (union of the profiles, see _select)
+        context: dict | None = None, # Context of the record for the live tail filters
+        chat: bool = False, # Also return the formatted chat report
+        cancel: threading.Event | None = None, # Set to truncate the data (formatting timeout, see _offload)
+        ) -> list | None:
+        """Log an inlet/outlet report to each group of log sinks sharing a profile, formatted once per profile.
+
+        When the chat profile is the profile of a log group, its chunks are collected while they are logged.
+        Returns the chunks of the chat report (if 'chat') or None.
+        """
+
+        # Log groups
+        chat_chunks = None
+        for profile, sinks in plan.log_groups.items():
+            collect = [] if chat and profile == plan.chat_profile else None
+            self._log(message, self._select_profile(plan, profile, data), indent=True, delimiters="all", context=context, cancel=cancel, sinks=sinks, collect=collect, plan=plan)
+            if collect:
+                chat_chunks = collect
+
+        # Chat profile without log group
+        if chat and chat_chunks is None:
+            chat_chunks = list(self._format_json_chunks(self._select_profile(plan, plan.chat_profile, data), cancel, plan))
+
+        return chat_chunks
+
+
+    def _memory_report(self, sections: dict) -> dict:
+        """Compute the deep in-memory size of each section and its heaviest subpaths.
+
+        Cycle-safe: each object is counted once per section. The total counts the objects shared by several sections once.
+        """
+
+        # Init
+        report = {}
+        all_sizes = {} # {object id: size} of all the sections
+        top_size = max(0, Config.MEMORY_TOP_PATHS)
+        path_depth = Config.MEMORY_PATH_DEPTH
+        max_depth = Config.SECURITY_SANITIZE_MAX_DEPTH
+
+        for name, section in sections.items():
+            sizes = {} # {object id: size} of the section
+            paths = [] # (deep size, path) of the subpaths
+
+            def walk(obj, path, depth, listed=True):
+
+                # Already counted (shared object or cycle)
+                obj_id = id(obj)
+                if obj_id in sizes:
+                    return 0
+                try:
+                    size = sys.getsizeof(obj)
+                except Exception:
+                    size = 0
+                sizes[obj_id] = size
+
+                # Children
+                if depth < max_depth:
+                    if isinstance(obj, dict):
+                        for key, value in obj.items():
+                            size += walk(key, None, depth + 1)
+                            size += walk(value, f"{path}.{key}" if path is not None and depth < path_depth else None, depth + 1)
+                    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+                        for index, value in enumerate(obj):
+                            size += walk(value, f"{path}[{index}]" if path is not None and depth < path_depth else None, depth + 1)
+                    elif not isinstance(obj, (str, bytes, bytearray, int, float, bool, type(None))):
+                        attributes = getattr(obj, "__dict__", None)
+                        if isinstance(attributes, dict):
+                            size += walk(attributes, path, depth, listed=False) # Attributes: subpaths of the object itself
+
+                # Subpath
+                if listed and path is not None and depth > 0:
+                    paths.append((size, path))
+
+                return size
+
+            # Walk
+            try:
+                section_size = walk(section, name, 0)
+            except Exception as e:
+
+                # DEBUG WARNING
+                if Config.DEBUG_WARNING:
+                    print(f"[DEBUG FILTER DATA] WARNING | Memory report failed for '{name}': {e}")
+
+                continue
+
+            all_sizes.update(sizes)
+            report[name] = {
+                "size": self._format_size(section_size),
+                "bytes": section_size,
+                "objects": len(sizes),
+                "top": [f"{path}: {self._format_size(size)}" for size, path in heapq.nlargest(top_size, paths)],
+            }
+
+        # Total (shared objects counted once)
+        total = sum(all_sizes.values())
+        report["total"] = {"size": self._format_size(total), "bytes": total, "objects": len(all_sizes)}
+
+        return report
+
+
+    async def _monitor_stream(
+        self,
+        plan: CapturePlan, # Capture plan
+        request_key: str, # Key of the request temps
+        event: dict, # Stream event
+        __event_emitter__: Any = None,
+        ) -> None:
+        """Track the throughput and the stalls of the stream, with a throttled live status.
+
+        A stall (gap above 'stream_stall_seconds') is logged as a warning record when the next chunk arrives.
+        """
+
+        # Monitor of the response
+        monitor = self.debug_monitor_temp.get(request_key)
+        if monitor is None:
+            monitor = self.debug_monitor_temp[request_key] = StreamMonitor(plan.stall_seconds)
+
+        # Chunk
+        stall = monitor.add(event)
+
+        # Stall
+        if stall is not None:
+            self._log(f"{Config.TITLE_STALL} WARNING [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]", {"request": request_key, **stall}, indent=True, delimiters=None, context={**self.debug_tail_temp.get(request_key, {}), "stage": "stream"})
 
-        Safe against invalid paths/indexes; returns None on failure with optional warning log.
-        """
+            # DEBUG WARNING
+            if Config.DEBUG_WARNING and not plan.send_to_console:
+                print(f"[DEBUG FILTER DATA] WARNING | Stream stall of {stall['gap_seconds']}s after chunk {stall['after_chunk']}")
 
-        # Empty
-        if not path or data is None:
-            return None
-        
-        # Tokenize path: find all keys and [indexes] with regex
-        # Matches keys or [num]
-        tokens = []
-        # Regex to split on '.' but capture [num] separately
-        parts = re.findall(r'[^.\[\]]+|\[\d+\]', path)
-        for part in parts:
-            if part.startswith('[') and part.endswith(']'):
-                index_str = part[1:-1]
-                if index_str.isdigit():
-                    tokens.append(int(index_str))
-                else:
+        # Live status (throttled)
+        status = monitor.status()
+        if status is not None:
+            await self._emit_status(__event_emitter__, status)
 
-                    # DEBUG WARNING
-                    if Config.DEBUG_WARNING:
-                        print(f"[DEBUG FILTER DATA] WARNING | Invalid index in path '{path}': {index_str}")
 
-                    return None
-            else:
-                tokens.append(part)
+    async def _offload(self, plan: CapturePlan, size_data: Any, function: Callable, *args, on_timeout: Any = None, **kwargs) -> Any:
+        """Run a formatting function inline, or in the formatting thread pool when size_data is large.
 
-        # Check path
-        current = data
+        The function must accept a 'cancel' event. After 'offload_timeout_seconds' the hook stops waiting and gets
+        on_timeout at once, and the event is set: the worker ends its report with Config.OFFLOAD_TRUNCATED at the next
+        chunk, container or section. The event loop is never blocked by large data.
+        The arguments of the function are passed as is (size_data is only used to choose inline or worker thread).
+        """
+
+        # Small data: inline
+        if not plan.offload_threshold or self._estimate_size(size_data, plan.offload_threshold) <= plan.offload_threshold:
+            return function(*args, **kwargs)
+
+        # Large data: worker thread
+        cancel = threading.Event()
+        future = asyncio.get_running_loop().run_in_executor(self._get_executor(plan), functools.partial(function, *args, cancel=cancel, **kwargs))
         try:
-            for token in tokens:
-                if isinstance(token, int) and isinstance(current, list):
-                    current = current[token]  # List index
-                elif isinstance(current, dict):
-                    current = current.get(token)  # Dict key
-                else:
-                    return None
-                if current is None:
-                    return None
-            return current
+            return await asyncio.wait_for(asyncio.shield(future), plan.offload_timeout)
 
-        # Invalid path
-        except (IndexError, ValueError, TypeError, KeyError) as e:
+        # Timeout: truncated report, the worker is not awaited
+        except asyncio.TimeoutError:
+            cancel.set()
+            future.add_done_callback(self._offload_done)
 
             # DEBUG WARNING
             if Config.DEBUG_WARNING:
-                print(f"[DEBUG FILTER DATA] WARNING | Invalid custom key path '{path}': {e}")
+                print(f"[DEBUG FILTER DATA] WARNING | Formatting timeout ({plan.offload_timeout}s), report truncated")
 
-            return None
+            return on_timeout
 
 
-    def _get_json_size(self, data: Any) -> int:
-        """Calculate the byte size of JSON-serialized data.
+    @staticmethod
+    def _offload_done(future: asyncio.Future) -> None:
+        """Report the failure of a worker no longer awaited (formatting timeout, see _offload)."""
 
-        Returns 0 on failure or None. Used for size display in logs/chat.
+        if not future.cancelled() and future.exception() is not None and Config.DEBUG_ERROR:
+            print(f"[DEBUG FILTER DATA] ERROR | Formatting failed after timeout: {future.exception()}")
+
+
+    def _otlp_attribute(self, key: str, value: Any) -> dict:
+        """Return an OTLP-JSON attribute."""
+
+        if isinstance(value, bool):
+            return {"key": key, "value": {"boolValue": value}}
+        if isinstance(value, int):
+            return {"key": key, "value": {"intValue": str(value)}}
+        if isinstance(value, float):
+            return {"key": key, "value": {"doubleValue": value}}
+
+        return {"key": key, "value": {"stringValue": str(value)}}
+
+
+    def _probe(
+        self,
+        plan: CapturePlan, # Capture plan
+        interaction: str, # INLET or OUTLET
+        body: dict | None = None,
+        __metadata__: dict | None = None,
+        __message_id__: str | None = None,
+        body_bytes: int | None = None, # Serialized size of the body if already computed
+        ) -> dict | None:
+        """Filter chain profiler: the start probe stamps the request, the end probe measures the filters in between.
+
+        Both probes are instances of this filter (lowest and highest priority) correlated by message id through a
+        process-wide registry. Returns the measure (end probe only) or None.
         """
 
-        # No data
-        if data is None:
-            return 0
+        # Message id
+        message_id = __message_id__ or (__metadata__ or {}).get("message_id")
+        if not message_id:
+            return None
 
-        # Size
-        try:
-            json_str = json.dumps(data, ensure_ascii=False)  # To include non-ASCII characters without escaping them
-            return len(json_str.encode('utf-8'))
+        # Registry shared by all the instances
+        probes = get_shared_state("probes")
+        key = (message_id, interaction)
 
-        # Size error
-        except Exception as e:
+        # Start probe: stamp (time, payload size, messages count)
+        if plan.probe == "start":
+            probes.pop(key, None)
+            probes[key] = (time.perf_counter_ns(), self._get_json_size(body) if body_bytes is None else body_bytes, len((body or {}).get("messages") or []))
+            while len(probes) > Config.PROFILER_MAX_PENDING:
+                probes.pop(next(iter(probes)))
+            return None
 
-            # DEBUG ERROR
-            if Config.DEBUG_ERROR:
-                print(f"[DEBUG FILTER DATA] ERROR | Failed to get JSON size: {e}")
+        # End probe: measure
+        now = time.perf_counter_ns()
+        start = probes.pop(key, None)
+        if start is None:
+            return None
+        elapsed_ms = (now - start[0]) / 1e6
+        size = self._get_json_size(body) if body_bytes is None else body_bytes
+        messages_count = len((body or {}).get("messages") or [])
 
-            return 0
+        # Running stats
+        stats = get_shared_state("probe_stats").setdefault(interaction, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        stats["count"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
 
+        return {
+            "time": f"{elapsed_ms:.2f} ms",
+            "size": f"{self._format_size(start[1])} -> {self._format_size(size)} ({size - start[1]:+d} bytes)",
+            "messages": f"{start[2]} -> {messages_count}",
+            "average": f"{stats['total_ms'] / stats['count']:.2f} ms (max {stats['max_ms']:.2f} ms) over {stats['count']} requests",
+        }
 
-    def _log(
+
+    def _record_stats(
         self,
-        message: str | None = None,  # The message to log
-        data: dict | None = None,  # The data to log
-        indent: bool = True,  # Indent the data
-        delimiters: str | None = None  # Delimiters to log (top/bottom)
-        ):
-        """Log message and/or data to console, file, and/or chat based on settings.
+        request_key: str, # Key of the request temps
+        __model__: dict | None = None,
+        __task__: str | None = None,
+        ) -> dict | None:
+        """Add the metrics of a request to the rolling statistics and return the statistics of its model and task.
 
-        Handles formatting, sending to destinations, and error resilience.
+        The statistics of all the groups are logged every Config.STATS_DUMP_INTERVAL seconds.
         """
 
-        # Init
-        log_entry = ""
+        # Request metrics (none without inlet)
+        stats_temp = self.debug_stats_temp.pop(request_key, None)
+        if stats_temp is None:
+            return None
 
-        # Top delimiter
-        if delimiters == "all" or delimiters == "top":
-            log_entry += f"\n{'='*80}\n"
+        # Add
+        model = (__model__ or {}).get("id") or "UNKNOWN"
+        group_name = self.stats.add(model, __task__ or Config.CAPTURE_TASK_CHAT, {
+            "messages": stats_temp["messages"],
+            "body_bytes": stats_temp["body_bytes"],
+            "chunks": stats_temp["chunks"] if stats_temp["chunks"] else None,
+            "generation_time_s": stats_temp["last_chunk"] - stats_temp["first_chunk"] if stats_temp["chunks"] else None,
+            "total_time_s": (stats_temp["last_chunk"] or time.monotonic()) - stats_temp["start"],
+        })
 
-        # Message
-        if message is not None:
-            log_entry += f"{message}\n"
+        # Periodic dump
+        if time.monotonic() - self.stats.last_dump >= Config.STATS_DUMP_INTERVAL:
+            self.stats.last_dump = time.monotonic()
+            self._log(f"{Config.TITLE_STATS} [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]", self.stats.render(), indent=True, delimiters="all")
 
-        # Data
-        if data:
-            # Format data
-            if indent:
-                log_entry += self._format_json(data) + "\n"
-            else:
-                log_entry += str(data) + "\n"
+        return {group_name: self.stats.render(group_name)}
 
-        # Bottom delimiter
-        if delimiters == "all" or delimiters == "bottom":
-            log_entry += f"\n{'='*80}\n"
 
-        # Log to console
-        if self.valves.send_to_console:
-            print(log_entry)
+    def _render_section(self, key: str, value: Any, cancel: threading.Event | None = None, plan: CapturePlan | None = None) -> str:
+        """Render a top-level section as JSON indented one level, served from the section cache when unchanged.
 
-        # Log to file
-        if self.valves.send_to_file:
+        The __user__ entries are also keyed by the user id: a user is never served the rendering of another one.
+        """
 
-            try:
-                self.logger.info(log_entry)
-            except Exception as e:
+        # Cached
+        cache_key = (key, value.get("id") if key == "__user__" and isinstance(value, dict) else None, self._fingerprint(value))
+        text = self.section_cache.get(cache_key)
+        if text is not None:
+            return text
 
-                # DEBUG WARNING
-                if Config.LOG_ERROR_WARNING:
-                    print(f"[DEBUG FILTER DATA] WARNING | File logging failed: {e}")
+        # Render (a section truncated by the formatting timeout is not cached)
+        text = "".join(self._encode_chunks(self._sanitize_data(value, cancel, plan), cancel)).replace("\n", "\n  ")
+        if cancel is None or not cancel.is_set():
+            self.section_cache.put(cache_key, text)
+
+        # DEBUG INFO
+        if Config.DEBUG_INFO:
+            print(f"[DEBUG FILTER DATA] INFO | Section cache miss '{key}' (hits:{self.section_cache.hits}, misses:{self.section_cache.misses})")
 
+        return text
 
-    def _obfuscate_data(self, data: Any, depth: int = 0) -> Any:
-        """Recursively obfuscate sensitive keys in data structures.
 
-        Limits depth to prevent infinite recursion. Uses Config.SECURITY_* settings.
+    def _request_key(
+        self,
+        user_id: str, # Id of the user
+        __metadata__: dict | None = None,
+        __model__: dict | None = None,
+        __message_id__: str | None = None,
+        task: str | None = None, # Background task
+        ) -> str:
+        """Return the key of the request temps: the id of the response message, one per model of a multi-model prompt.
+
+        Falls back to the user and model ids without message id. Background tasks get their own key.
         """
 
-        # Limit recursion depth
-        if depth > 10:
-            return data
+        key = __message_id__ or (__metadata__ or {}).get("message_id") or f"{user_id}|{(__model__ or {}).get('id')}"
+        task = task or (__metadata__ or {}).get("task")
 
-        # Check
-        if isinstance(data, dict):
-            return {k: Config.SECURITY_OBFUSCATE_MASK if (Config.SECURITY_OBFUSCATE and k.lower() in [key.lower() for key in Config.SECURITY_OBFUSCATE_DATA]) else self._obfuscate_data(v, depth + 1) for k, v in data.items()}
-        elif isinstance(data, list):
-            return [self._obfuscate_data(item) for item in data]
-        elif isinstance(data, (set, tuple)):
-            return type(data)(self._obfuscate_data(item) for item in data)
-        else:
-            return data
+        return f"{key}|{task}" if task else key
 
 
-    def _select(self, data: dict | None = None) -> dict | None:
-        """Filter and select specific keys from data based on Valves show_* settings.
+    def _sanitize_data(self, data: Any, cancel: threading.Event | None = None, plan: CapturePlan | None = None) -> Any:
+        """Obfuscate sensitive keys, digest large strings and convert non-serializables in one copy-on-write pass.
 
-        Includes custom key if enabled. Returns None on failure.
+        Unchanged subtrees are shared with the original data: only the containers on a path leading to a modified
+        value are copied. Guards against cycles and excessive depth. Once cancel is set (formatting timeout, see
+        _offload), the containers not walked yet are replaced by Config.OFFLOAD_TRUNCATED.
+        The formatting threads pass the plan compiled by the hook: only the event loop compiles it (see _get_plan).
         """
 
-        # No data
-        if data is None:
-            return None
+        # Options
+        plan = plan or self._get_plan()
+        obfuscate_keys = plan.obfuscate_keys
+        mask = Config.SECURITY_OBFUSCATE_MASK
+        digest = plan.digest
+        digest_min_size = min(Config.DIGEST_BASE64_MIN_SIZE, Config.DIGEST_TEXT_MAX_SIZE)
+        max_depth = Config.SECURITY_SANITIZE_MAX_DEPTH
+        path_ids = set() # Containers on the current path (cycle detection)
+
+        def sanitize(obj, depth):
+
+            # Scalars
+            if obj is None or isinstance(obj, (bool, int, float)):
+                return obj
+            if isinstance(obj, str):
+                return self._digest_string(obj) if digest and len(obj) >= digest_min_size else obj
+
+            # Containers
+            if isinstance(obj, (dict, list, tuple)):
+
+                # Formatting timeout
+                if cancel is not None and cancel.is_set():
+                    return Config.OFFLOAD_TRUNCATED
+
+                # Depth and cycle guards
+                if depth > max_depth:
+                    return "**** MAX DEPTH ****"
+                obj_id = id(obj)
+                if obj_id in path_ids:
+                    return "**** CIRCULAR REFERENCE ****"
+                path_ids.add(obj_id)
+
+                try:
+                    # Dict: copied from the first modified item only
+                    if isinstance(obj, dict):
+                        copy = None
+                        for index, (key, value) in enumerate(obj.items()):
+                            new_key = key if isinstance(key, (str, int, float, bool)) or key is None else str(key)
+                            if obfuscate_keys and isinstance(key, str) and key.lower() in obfuscate_keys:
+                                new_value = mask
+                            else:
+                                new_value = sanitize(value, depth + 1)
+                            if copy is None:
+                                if new_key is key and new_value is value:
+                                    continue
+                                copy = dict(itertools.islice(obj.items(), index))
+                            copy[new_key] = new_value
+                        return obj if copy is None else copy
+
+                    # List/tuple: copied from the first modified item only
+                    copy = None
+                    for index, value in enumerate(obj):
+                        new_value = sanitize(value, depth + 1)
+                        if copy is None:
+                            if new_value is value:
+                                continue
+                            copy = list(obj[:index])
+                        copy.append(new_value)
+                    return obj if copy is None else copy
+
+                finally:
+                    path_ids.discard(obj_id)
+
+            # Other objects: compact summary (requests, tools, callables...) walked with the same guards
+            if depth > max_depth:
+                return "**** MAX DEPTH ****"
+            obj_id = id(obj)
+            if obj_id in path_ids:
+                return "**** CIRCULAR REFERENCE ****"
+            adapted = self.adapters.adapt(obj)
+            if isinstance(adapted, str):
+                return adapted
+            path_ids.add(obj_id)
+            try:
+                return sanitize(adapted, depth + 1)
+            finally:
+                path_ids.discard(obj_id)
+
+        return sanitize(data, 0)
+
+
+    def _select(
+        self,
+        plan: CapturePlan, # Capture plan
+        summary_info: dict | None = None,
+        body: dict | None = None,
+        __user__: dict | None = None,
+        __metadata__: dict | None = None,
+        __model__: dict | None = None,
+        __messages__: list | None = None,
+        __chat_id__: str | None = None,
+        __session_id__: str | None = None,
+        __message_id__: str | None = None,
+        __event_emitter__: Any = None,
+        __event_call__: Any = None,
+        __files__: list | None = None,
+        __request__: Any = None,
+        __task__: str | None = None,
+        __task_body__: dict | None = None,
+        __tools__: Any = None,
+        ) -> dict | None:
+        """Select the data to show based on the capture plan (Valves show_* settings).
+
+        Only the live sections are referenced. Includes custom key if enabled. Returns None on failure.
+        """
 
         # Select data
         try:
+            sections = plan.section_set
             selected_data = {}
 
             # Summary
-            if self.valves.show_summary:
-                selected_data["summary"] = data.get("summary")
+            if plan.summary:
+                selected_data["summary"] = summary_info
 
             # Body
-            if self.valves.show_body:
-                selected_data["body"] = data.get("body")
+            if "body" in sections:
+                selected_data["body"] = body
 
             # __user__
-            if self.valves.show_user:
-                selected_data["__user__"] = data.get("__user__")
+            if "__user__" in sections:
+                selected_data["__user__"] = __user__
 
             # __metadata__
-            if self.valves.show_metadata:
-                selected_data["__metadata__"] = data.get("__metadata__")
+            if "__metadata__" in sections:
+                selected_data["__metadata__"] = __metadata__
 
             # __model__
-            if self.valves.show_model:
-                selected_data["__model__"] = data.get("__model__")
+            if "__model__" in sections:
+                selected_data["__model__"] = __model__
 
             # __messages__
-            if self.valves.show_messages:
-                selected_data["__messages__"] = data.get("__messages__")
+            if "__messages__" in sections:
+                selected_data["__messages__"] = __messages__
 
             # __chat_id__
-            if self.valves.show_chat_id:
-                selected_data["__chat_id__"] = data.get("__chat_id__")
+            if "__chat_id__" in sections:
+                selected_data["__chat_id__"] = __chat_id__
 
             # __session_id__
-            if self.valves.show_session_id:
-                selected_data["__session_id__"] = data.get("__session_id__")
+            if "__session_id__" in sections:
+                selected_data["__session_id__"] = __session_id__
 
             # __message_id__
-            if self.valves.show_message_id:
-                selected_data["__message_id__"] = data.get("__message_id__")
+            if "__message_id__" in sections:
+                selected_data["__message_id__"] = __message_id__
 
             # __event_emitter__
-            if self.valves.show_event_emitter:
-                selected_data["__event_emitter__"] = data.get("__event_emitter__")
+            if "__event_emitter__" in sections:
+                selected_data["__event_emitter__"] = __event_emitter__
 
             # __event_call__
-            if self.valves.show_event_call:
-                selected_data["__event_call__"] = data.get("__event_call__")
+            if "__event_call__" in sections:
+                selected_data["__event_call__"] = __event_call__
 
             # __files__
-            if self.valves.show_files:
-                selected_data["__files__"] = data.get("__files__")
+            if "__files__" in sections:
+                selected_data["__files__"] = __files__
 
             # __request__
-            if self.valves.show_request:
-                selected_data["__request__"] = data.get("__request__")
+            if "__request__" in sections:
+                selected_data["__request__"] = __request__
 
             # __task__
-            if self.valves.show_task:
-                selected_data["__task__"] = data.get("__task__")
+            if "__task__" in sections:
+                selected_data["__task__"] = __task__
 
             # __task_body__
-            if self.valves.show_task_body:
-                selected_data["__task_body__"] = data.get("__task_body__")
+            if "__task_body__" in sections:
+                selected_data["__task_body__"] = __task_body__
 
             # __tools__
-            if self.valves.show_tools:
-                selected_data["__tools__"] = data.get("__tools__")
+            if "__tools__" in sections:
+                selected_data["__tools__"] = __tools__
 
-            # Custom key (new logic)
-            if self.valves.show_custom_key:
-                custom_value = self._get_by_path(data, self.valves.show_custom_key)
-                custom_key_display = f"CUSTOM KEY {self.valves.show_custom_key}"
+            # Custom key (only the root of the path is looked up)
+            if plan.custom_key:
+                custom_root = re.match(r'[^.\[\]]*', plan.custom_key).group(0)
+                custom_sources = {
+                    "summary": summary_info,
+                    "body": body,
+                    "__user__": __user__,
+                    "__metadata__": __metadata__,
+                    "__model__": __model__,
+                    "__messages__": __messages__,
+                    "__chat_id__": __chat_id__,
+                    "__session_id__": __session_id__,
+                    "__message_id__": __message_id__,
+                    "__files__": __files__,
+                    "__task__": __task__,
+                    "__task_body__": __task_body__,
+                    "__tools__": __tools__,
+                }
+                custom_value = self._get_by_path({custom_root: custom_sources.get(custom_root)}, plan.custom_key)
+                custom_key_display = f"CUSTOM KEY {plan.custom_key}"
                 if custom_value is not None:
                     selected_data[custom_key_display] = custom_value  # Obfuscate will apply later in _format_json
                 else:
                     selected_data[custom_key_display] = "**** CUSTOM KEY NOT FOUND ****"
 
+            # Memory report
+            if plan.memory:
+                memory_sources = {
+                    "body": body,
+                    "__user__": __user__,
+                    "__metadata__": __metadata__,
+                    "__model__": __model__,
+                    "__messages__": __messages__,
+                    "__files__": __files__,
+                    "__task_body__": __task_body__,
+                    "__tools__": __tools__,
+                }
+                selected_data["memory"] = self._memory_report({name: memory_sources.get(name) for name in Config.MEMORY_SECTIONS})
+
             return selected_data
 
         # Select failed
@@ -592,6 +4112,73 @@ class Filter:
             return None
 
 
+    def _select_profile(self, plan: CapturePlan, profile: tuple, data: dict | None) -> dict | None:
+        """Return the view of the selected data for a sink profile (the data itself when the profile has all its keys)."""
+
+        # Nothing to filter
+        if not isinstance(data, dict):
+            return data
+
+        # View
+        keys = plan.profile_keys.get(profile, frozenset())
+        if keys.issuperset(data):
+            return data
+
+        return {key: value for key, value in data.items() if key in keys}
+
+
+    def _start_trace(
+        self,
+        body: dict | None = None,
+        __user__: dict | None = None,
+        __metadata__: dict | None = None,
+        __model__: dict | None = None,
+        __chat_id__: str | None = None,
+        __task__: str | None = None,
+        body_bytes: int | None = None, # Serialized size of the body if already computed
+        ) -> dict:
+        """Start the trace of a request, with the attributes of its summary."""
+
+        # Attributes
+        attributes = {
+            "gen_ai.request.model": (__model__ or {}).get("id") or (body or {}).get("model") or "-",
+            "openwebui.model_name": (__model__ or {}).get("name") or "UNKNOWN",
+            "enduser.id": (__user__ or {}).get("id") or "-",
+            "openwebui.chat_id": __chat_id__ or (__metadata__ or {}).get("chat_id") or "-",
+            "openwebui.message_count": len((body or {}).get("messages") or []),
+            "openwebui.body_bytes": self._get_json_size(body) if body_bytes is None else body_bytes,
+            "openwebui.task": __task__ or (__metadata__ or {}).get("task") or Config.CAPTURE_TASK_CHAT,
+        }
+
+        return {
+            "trace_id": os.urandom(16).hex(),
+            "root_id": os.urandom(8).hex(),
+            "start": time.time_ns(),
+            "inlet_end": None,
+            "outlet_start": None,
+            "first_chunk": None,
+            "last_chunk": None,
+            "chunks": 0,
+            "attributes": attributes,
+        }
+
+
+    def _track_request(self, request_key: str) -> None:
+        """Register a request with temps, dropping the oldest above Config.REQUEST_MAX_PENDING (requests without outlet).
+
+        The flight record of a dropped request is kept for a dump (see _flight_check).
+        """
+
+        if request_key in self.pending_requests:
+            return
+        self.pending_requests[request_key] = None
+        while len(self.pending_requests) > Config.REQUEST_MAX_PENDING:
+            oldest = next(iter(self.pending_requests))
+            if oldest in self.debug_flight_temp:
+                self.flight_stalled.append(self.debug_flight_temp[oldest])
+            self._drop_request(oldest)
+
+
     async def inlet(
         self, # self
         body: dict, # A dict usually destined to go almost directly to the model. Although it is not strictly a special argument, it is included here for easier reference and because it contains itself some special arguments
@@ -617,146 +4204,152 @@ class Filter:
         if Config.DEBUG_INFO:
             print(f"[DEBUG FILTER DATA] INFO | Inlet start (priority:{self.valves.priority})")
 
+        # Serialized size of the body, computed once for the profiler, trace and statistics (the inlet does not change the body)
+        body_bytes = None
+
         # Inlet
         try:
 
-            # Status start
-            if __event_emitter__ and Config.STATUS_USE:
-                await __event_emitter__(
-                    {
-                        "type": "status",
-                        "data": {
-                            "description": Config.STATUS_INFO_START,
-                            "done": False,
-                            "hidden": False,
-                        },
-                    }
-                )
-
-            # Required data
-            current_timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            user_id = __user__.get("id") if __user__ else "default"
-            self.debug_inlet_temp[user_id] = None
-            self.debug_stream_temp[user_id] = None
+            # Capture plan
+            plan = self._get_plan()
 
             # Clean chat history from last Debug Filter Data report
             if Config.MESSAGE_CLEAN_CHAT_HISTORY:
-                if "messages" in body and body["messages"]:
+                self._clean_reports(body, "INLET")
 
-                    # Report delimiters
-                    begin_escaped = re.escape(Config.RESULT_KEYWORD_BEGIN)
-                    end_escaped = re.escape(Config.RESULT_KEYWORD_END)
-                    pattern = re.compile(f'{begin_escaped}.*?{end_escaped}', flags=re.DOTALL)
-                    
-                    for message_content in body["messages"]:
-                        if "content" in message_content and isinstance(message_content["content"], str):
-                            original_content = message_content["content"]
-                            
-                            # Clean report
-                            cleaned_content = pattern.sub('', original_content)
-                            
-                            # Check for update
-                            if cleaned_content != original_content:
-                                message_content["content"] = cleaned_content
-                                
-                                # DEBUG INFO
-                                if Config.DEBUG_INFO:
-                                    print(f"[DEBUG FILTER DATA] INFO | Report CLEANED from INLET")
+            # Nothing would be emitted
+            if not plan.active:
+                return body
+
+            # Request key and background task policy
+            user_id = __user__.get("id") if __user__ else "default"
+            task = __task__ or (__metadata__ or {}).get("task")
+            request_key = self._request_key(user_id, __metadata__, __model__, __message_id__, task)
+            policy = plan.task_policy(task)
+
+            # Targeted capture (a request not captured only keeps its decision, read by stream and outlet)
+            if plan.targeted and policy != "skip":
+                captured = self._is_captured(plan, body, __user__, __metadata__, __model__, __chat_id__, __task__)
+                self._track_request(request_key)
+                self.debug_capture_temp[request_key] = captured
+                if not captured:
+                    return body
+
+            # Filter chain profiler: end probe
+            chain = None
+            if plan.probe == "end":
+                body_bytes = self._get_json_size(body)
+                chain = self._probe(plan, "INLET", body, __metadata__, __message_id__, body_bytes)
+                if chain is not None:
+                    self._log(f"{Config.TITLE_CHAIN} INLET [{__message_id__ or (__metadata__ or {}).get('message_id')}]", chain, indent=True, delimiters=None, context={"stage": "inlet"})
+
+            # Background task: accounting and capture policy (a skipped task leaves the request temps untouched)
+            self._track_request(request_key)
+            tasks = self._account_task(user_id, request_key, task, __metadata__, __chat_id__, __message_id__) if plan.accounting else None
+            if policy == "skip":
+                return body
+
+            # Required data (temps of the request, see _request_key)
+            self.debug_inlet_temp[request_key] = None
+            self.debug_stream_temp[request_key] = None
+            self.debug_monitor_temp.pop(request_key, None)
+            context = {"user": user_id, "model": (__model__ or {}).get("id"), "stage": "inlet"}
+            if plan.send_to_tail:
+                self.debug_tail_temp[request_key] = context
+
+            # Body size
+            if body_bytes is None and (plan.trace or plan.stats or plan.probe == "start"):
+                body_bytes = self._get_json_size(body)
+
+            # Trace
+            trace = None
+            if plan.trace:
+                trace = self._start_trace(body, __user__, __metadata__, __model__, __chat_id__, __task__, body_bytes)
+                self.debug_trace_temp[request_key] = trace
+
+            # Schema inference
+            drifts = self._infer_schema(plan, "INLET", body, __metadata__, __model__) if plan.schema else None
+
+            # Prompt prefix stability
+            prefix = self._analyze_prefix(plan, user_id, body, __metadata__, __chat_id__, __task__) if plan.prefix else None
+            if prefix is not None and trace is not None:
+                trace["attributes"]["openwebui.prompt_prefix_bytes"] = prefix["common_prefix_bytes"]
+
+            # Context budget
+            budget = self._context_budget(body, __model__) if plan.budget and plan.inlet else None
+            if budget is not None and trace is not None:
+                trace["attributes"]["openwebui.prompt_tokens"] = budget["total"]["tokens"]
+
+            # Rolling statistics: request metrics (completed by stream/outlet)
+            if plan.stats:
+                self.debug_stats_temp[request_key] = {
+                    "start": time.monotonic(),
+                    "messages": len((body or {}).get("messages") or []),
+                    "body_bytes": body_bytes,
+                    "chunks": 0,
+                    "first_chunk": None,
+                    "last_chunk": None,
+                }
+
+            # Flight recorder (the requests without outlet are dumped first)
+            if plan.flight:
+                await self._flight_check(plan)
+                self._flight_start(request_key, user_id, body, __metadata__, __model__, __task__)
+
+            # Multi-model comparison (the chat requests only)
+            if plan.compare and not task:
+                group_key = self._comparison_group(user_id, body, __metadata__, __chat_id__)
+                self.debug_compare_temp[request_key] = (group_key, self.comparison.add(group_key, request_key, (__model__ or {}).get("id") or (body or {}).get("model")))
+
+            # Status start
+            if plan.report:
+                await self._emit_status(__event_emitter__, Config.STATUS_INFO_START)
+
+            # Data
+            current_timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
             # Log inlet
-            if self.valves.log_inlet:
+            if plan.inlet:
 
                 # Status inlet start
-                if __event_emitter__ and Config.STATUS_USE:
-                    await __event_emitter__(
-                        {
-                            "type": "status",
-                            "data": {
-                                "description": Config.STATUS_INFO_INLET_START,
-                                "done": False,
-                                "hidden": False,
-                            },
-                        }
-                    )
-
-                # Init
-                summary_info = {}
+                await self._emit_status(__event_emitter__, Config.STATUS_INFO_INLET_START)
 
                 # Summary
-                if self.valves.show_summary:
-
-                    # Generate summary data
-                    summary_timestamp = current_timestamp
-                    summary_model_id = __model__.get("id") if __model__ else "-"
-                    summary_model_name = __model__.get("name") if __model__ else "UNKNOWN"
-                    summary_user_id = __user__.get("id") if __user__ else "-"
-                    summary_user_name = __user__.get("name") if __user__ else "UNKNOWN"
-                    summary_messages_count = len(body.get("messages", []))
-                    summary_body_keys_list = list((body or {}).keys())
-                    summary_body_keys_txt = '' + ', '.join(summary_body_keys_list or []) + ''
-                    summary_user_keys_list = list((__user__ or {}).keys())
-                    summary_user_keys_txt = '' + ', '.join(summary_user_keys_list or []) + ''
-                    summary_metadata_keys_list = list((__metadata__ or {}).keys())
-                    summary_metadata_keys_txt = '' + ', '.join(summary_metadata_keys_list or []) + ''
-                    summary_model_keys_list = list((__model__ or {}).keys())
-                    summary_model_keys_txt = '' + ', '.join(summary_model_keys_list or []) + ''
-                    summary_messages_keys_list = list((__messages__ or {}).keys())
-                    summary_messages_keys_txt = '' + ', '.join(summary_messages_keys_list or []) + ''
-
-                    # Summary final info
-                    summary_info = {
-                        "TYPE": f"INLET (Priority: {self.valves.priority}) [{summary_timestamp}]",
-                        "MODEL": f"{summary_model_name} [{summary_model_id}]",
-                        "USER": f"{summary_user_name} [{summary_user_id}]",
-                        "MESSAGES COUNT": summary_messages_count,
-                        "KEYS OF body": summary_body_keys_txt,
-                        "KEYS OF __user__": summary_user_keys_txt,
-                        "KEYS OF __metadata__": summary_metadata_keys_txt,
-                        "KEYS OF __model__": summary_model_keys_txt,
-                        "KEYS OF __messages__": summary_messages_keys_txt,
-                    }
-
-                # Debug data
-                debug_data_dict = {
-                    "summary": summary_info,
-                    "body": body,
-                    "__user__": __user__,
-                    "__metadata__": __metadata__,
-                    "__model__": __model__,
-                    "__messages__": __messages__,
-                    "__chat_id__": __chat_id__,
-                    "__session_id__": __session_id__,
-                    "__message_id__": __message_id__,
-                    "__event_emitter__": __event_emitter__,
-                    "__event_call__": __event_call__,
-                    "__files__": __files__,
-                    "__request__": __request__,
-                    "__task__": __task__,
-                    "__task_body__": __task_body__,
-                    "__tools__": __tools__,
-                }
-
-                # Select required data
-                debug_data = self._select(debug_data_dict)
+                summary_info = self._build_summary(plan, "INLET", current_timestamp, body, __user__, __metadata__, __model__, __messages__, chain, drifts, prefix=prefix, budget=budget, tasks=tasks) if plan.summary else {}
+
+                # Select required data (summary only by task policy)
+                debug_data = {"summary": summary_info} if policy == "summary" else self._select(
+                    plan,
+                    summary_info,
+                    body=body,
+                    __user__=__user__,
+                    __metadata__=__metadata__,
+                    __model__=__model__,
+                    __messages__=__messages__,
+                    __chat_id__=__chat_id__,
+                    __session_id__=__session_id__,
+                    __message_id__=__message_id__,
+                    __event_emitter__=__event_emitter__,
+                    __event_call__=__event_call__,
+                    __files__=__files__,
+                    __request__=__request__,
+                    __task__=__task__,
+                    __task_body__=__task_body__,
+                    __tools__=__tools__,
+                )
 
                 # Log inlet
-                self._log(f"{Config.TITLE_INLET} [{current_timestamp}]", debug_data, indent=True, delimiters="all")
+                await self._offload(plan, debug_data, self._log_report, plan, f"{Config.TITLE_INLET} [{current_timestamp}]", debug_data, context=context)
 
-                # Add data to debug temp
-                self.debug_inlet_temp[user_id] = {"inlet_data": debug_data, "inlet_timestamp": current_timestamp}
+                # Add data to debug temp (only the chat view, formatted by the outlet: no report kept during the generation)
+                self.debug_inlet_temp[request_key] = {"inlet_view": self._select_profile(plan, plan.chat_profile, debug_data) if plan.send_to_chat else None, "inlet_timestamp": current_timestamp}
 
                 # Status inlet OK
-                if __event_emitter__ and Config.STATUS_USE:
-                    await __event_emitter__(
-                        {
-                            "type": "status",
-                            "data": {
-                                "description": Config.STATUS_INFO_INLET_OK,
-                                "done": False,
-                                "hidden": False,
-                            },
-                        }
-                    )
+                await self._emit_status(__event_emitter__, Config.STATUS_INFO_INLET_OK)
+
+            # Trace: end of the inlet processing
+            if trace is not None:
+                trace["inlet_end"] = time.time_ns()
 
             # DEBUG INFO
             if Config.DEBUG_INFO:
@@ -769,6 +4362,11 @@ class Filter:
             if Config.DEBUG_ERROR:
                 print(f"[DEBUG FILTER DATA] ERROR | Inlet processing failed: {e}")
 
+        # Filter chain profiler: start probe (last thing of the inlet)
+        finally:
+            if self.plan is not None and self.plan.probe == "start":
+                self._probe(self.plan, "INLET", body, __metadata__, __message_id__, body_bytes)
+
         return body
 
 
@@ -800,143 +4398,140 @@ class Filter:
         # Outlet
         try:
 
-            # Data
-            current_timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            user_id = __user__.get("id") if __user__ else "default"
+            # Capture plan
+            plan = self._get_plan()
 
             # Remove old reports
             if Config.MESSAGE_REMOVE_OLD_REPORT:
-                if "messages" in body and body["messages"]:
+                self._clean_reports(body, "OUTLET")
 
-                    # Report delimiters
-                    begin_escaped = re.escape(Config.RESULT_KEYWORD_BEGIN)
-                    end_escaped = re.escape(Config.RESULT_KEYWORD_END)
-                    pattern = re.compile(f'{begin_escaped}.*?{end_escaped}', flags=re.DOTALL)
-                    
-                    for message_content in body["messages"]:
-                        if "content" in message_content and isinstance(message_content["content"], str):
-                            original_content = message_content["content"]
-                            
-                            # Clean report
-                            cleaned_content = pattern.sub('', original_content)
-                            
-                            # Check for update
-                            if cleaned_content != original_content:
-                                message_content["content"] = cleaned_content
-                                
-                                # DEBUG INFO
-                                if Config.DEBUG_INFO:
-                                    print(f"[DEBUG FILTER DATA] INFO | Report CLEANED from OUTLET")
+            # Nothing would be emitted
+            if not plan.active:
+                return body
+
+            # Filter chain profiler: end probe (first thing of the outlet)
+            chain = None
+            if plan.probe == "end":
+                chain = self._probe(plan, "OUTLET", body, __metadata__, __message_id__)
+                if chain is not None:
+                    self._log(f"{Config.TITLE_CHAIN} OUTLET [{__message_id__ or (__metadata__ or {}).get('message_id')}]", chain, indent=True, delimiters=None, context={"stage": "outlet"})
+
+            # Background task: accounting (end of the call or task calls of the turn so far) and capture policy
+            user_id = __user__.get("id") if __user__ else "default"
+            task = __task__ or (__metadata__ or {}).get("task")
+            request_key = self._request_key(user_id, __metadata__, __model__, __message_id__, task)
+            policy = plan.task_policy(task)
+            tasks = None
+            if plan.accounting:
+                if task:
+                    task_call = self.debug_task_temp.pop(request_key, None)
+                    if task_call is not None:
+                        TaskLedger.end_call(task_call)
+                else:
+                    tasks = self.tasks.current(__chat_id__ or (__metadata__ or {}).get("chat_id") or f"user:{user_id}")
+                    tasks = {"this_turn": tasks} if tasks else None
+            if policy == "skip":
+                self._drop_request(request_key)
+                return body
+
+            # Targeted capture (decision of the inlet if available)
+            if plan.targeted:
+                captured = self.debug_capture_temp.pop(request_key, None)
+                if captured is None:
+                    captured = self._is_captured(plan, body, __user__, __metadata__, __model__, __chat_id__, __task__, consume=False)
+                if not captured:
+                    self._drop_request(request_key)
+                    return body
+
+            # Trace
+            trace = self.debug_trace_temp.pop(request_key, None) if plan.trace else None
+            if trace is not None:
+                trace["outlet_start"] = time.time_ns()
+
+            # Schema inference
+            drifts = self._infer_schema(plan, "OUTLET", body, __metadata__, __model__) if plan.schema else None
+
+            # Rolling statistics
+            stats = self._record_stats(request_key, __model__, __task__) if plan.stats else None
+
+            # Stream monitor
+            monitor = self.debug_monitor_temp.pop(request_key, None)
+            monitor = monitor.to_dict() if monitor is not None and plan.monitor else None
+
+            # Flight recorder (before the report is added to the reply)
+            if plan.flight:
+                await self._flight_end(plan, request_key, body)
+
+            # Multi-model comparison (before the report is added to the reply, logged when all the models answered)
+            comparison = None
+            compare_temp = self.debug_compare_temp.pop(request_key, None)
+            if compare_temp is not None and plan.compare:
+                reply = ((body or {}).get("messages") or [{}])[-1]
+                reply = reply.get("content") if isinstance(reply, dict) and reply.get("role") == "assistant" else None
+                comparison, complete = self.comparison.end(compare_temp[0], request_key, len(str(reply or "").encode("utf-8")))
+                if comparison is not None and complete:
+                    self._log(f"{Config.TITLE_COMPARE} [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]", {"chat_id": __chat_id__ or (__metadata__ or {}).get("chat_id"), **comparison}, indent=True, delimiters=None, context={"user": user_id, "stage": "outlet"})
+
+            # Data
+            current_timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            inlet_view = None
+            inlet_timestamp = None
+            stream_assembler = None
+            debug_data = None
+            outlet_chunks = None
 
             # Get data inlet
-            if self.valves.log_inlet:
-                debug_inlet_temp = self.debug_inlet_temp.get(user_id)
-                inlet_data = None if debug_inlet_temp is None else debug_inlet_temp.get("inlet_data")
+            if plan.inlet:
+                debug_inlet_temp = self.debug_inlet_temp.get(request_key)
+                inlet_view = None if debug_inlet_temp is None else debug_inlet_temp.get("inlet_view")
                 inlet_timestamp = None if debug_inlet_temp is None else debug_inlet_temp.get("inlet_timestamp")
 
             # Get data stream
-            if self.valves.log_stream:
-                debug_stream_temp = self.debug_stream_temp.get(user_id)
-                stream_data = None if debug_stream_temp is None else debug_stream_temp.get("stream_data")
+            if plan.stream:
+                debug_stream_temp = self.debug_stream_temp.get(request_key)
+                stream_assembler = None if not isinstance(debug_stream_temp, dict) else debug_stream_temp.get("stream_assembler")
 
             # Reset
-            self.debug_inlet_temp[user_id] = None
-            self.debug_stream_temp[user_id] = None
+            self._drop_request(request_key)
 
             # Log outlet
-            if self.valves.log_outlet:
+            if plan.outlet:
 
                 # Status outlet start
-                if __event_emitter__ and Config.STATUS_USE:
-                    await __event_emitter__(
-                        {
-                            "type": "status",
-                            "data": {
-                                "description": Config.STATUS_INFO_OUTLET_START,
-                                "done": False,
-                                "hidden": False,
-                            },
-                        }
-                    )
-
-                # Init
-                summary_info = {}
+                await self._emit_status(__event_emitter__, Config.STATUS_INFO_OUTLET_START)
 
                 # Summary
-                if self.valves.show_summary:
-
-                    # Generate summary data
-                    summary_timestamp = current_timestamp
-                    summary_model_id = __model__.get("id") if __model__ else "-"
-                    summary_model_name = __model__.get("name") if __model__ else "UNKNOWN"
-                    summary_user_id = __user__.get("id") if __user__ else "-"
-                    summary_user_name = __user__.get("name") if __user__ else "UNKNOWN"
-                    summary_messages_count = len(body.get("messages", []))
-                    summary_body_keys_list = list((body or {}).keys())
-                    summary_body_keys_txt = '' + ', '.join(summary_body_keys_list or []) + ''
-                    summary_user_keys_list = list((__user__ or {}).keys())
-                    summary_user_keys_txt = '' + ', '.join(summary_user_keys_list or []) + ''
-                    summary_metadata_keys_list = list((__metadata__ or {}).keys())
-                    summary_metadata_keys_txt = '' + ', '.join(summary_metadata_keys_list or []) + ''
-                    summary_model_keys_list = list((__model__ or {}).keys())
-                    summary_model_keys_txt = '' + ', '.join(summary_model_keys_list or []) + ''
-                    summary_messages_keys_list = list((__messages__ or {}).keys())
-                    summary_messages_keys_txt = '' + ', '.join(summary_messages_keys_list or []) + ''
-
-                    # Summary final info
-                    summary_info = {
-                        "TYPE": f"OUTLET (Priority: {self.valves.priority}) [{summary_timestamp}]",
-                        "MODEL": f"{summary_model_name} [{summary_model_id}]",
-                        "USER": f"{summary_user_name} [{summary_user_id}]",
-                        "MESSAGES COUNT": summary_messages_count,
-                        "KEYS OF body": summary_body_keys_txt,
-                        "KEYS OF __user__": summary_user_keys_txt,
-                        "KEYS OF __metadata__": summary_metadata_keys_txt,
-                        "KEYS OF __model__": summary_model_keys_txt,
-                        "KEYS OF __messages__": summary_messages_keys_txt,
-                    }
-
-                # Debug data
-                debug_data_dict = {
-                    "summary": summary_info,
-                    "body": body,
-                    "__user__": __user__,
-                    "__metadata__": __metadata__,
-                    "__model__": __model__,
-                    "__messages__": __messages__,
-                    "__chat_id__": __chat_id__,
-                    "__session_id__": __session_id__,
-                    "__message_id__": __message_id__,
-                    "__event_emitter__": __event_emitter__,
-                    "__event_call__": __event_call__,
-                    "__files__": __files__,
-                    "__request__": __request__,
-                    "__task__": __task__,
-                    "__task_body__": __task_body__,
-                    "__tools__": __tools__,
-                }
-
-                # Select required data
-                debug_data = self._select(debug_data_dict)
+                summary_info = self._build_summary(plan, "OUTLET", current_timestamp, body, __user__, __metadata__, __model__, __messages__, chain, drifts, stats, monitor, tasks=tasks, comparison=comparison) if plan.summary else {}
+
+                # Select required data (summary only by task policy)
+                debug_data = {"summary": summary_info} if policy == "summary" else self._select(
+                    plan,
+                    summary_info,
+                    body=body,
+                    __user__=__user__,
+                    __metadata__=__metadata__,
+                    __model__=__model__,
+                    __messages__=__messages__,
+                    __chat_id__=__chat_id__,
+                    __session_id__=__session_id__,
+                    __message_id__=__message_id__,
+                    __event_emitter__=__event_emitter__,
+                    __event_call__=__event_call__,
+                    __files__=__files__,
+                    __request__=__request__,
+                    __task__=__task__,
+                    __task_body__=__task_body__,
+                    __tools__=__tools__,
+                )
 
-                # Log outlet
-                self._log(f"{Config.TITLE_OUTLET} [{current_timestamp}]", debug_data, indent=True, delimiters="all")
+                # Log outlet (and format the chat report, once if it shares the profile of a log sink)
+                outlet_chunks = await self._offload(plan, debug_data, self._log_report, plan, f"{Config.TITLE_OUTLET} [{current_timestamp}]", debug_data, context={"user": user_id, "model": (__model__ or {}).get("id"), "stage": "outlet"}, chat=plan.send_to_chat, on_timeout=[Config.OFFLOAD_TRUNCATED] if plan.send_to_chat else None)
 
                 # Status outlet OK
-                if __event_emitter__ and Config.STATUS_USE:
-                    await __event_emitter__(
-                        {
-                            "type": "status",
-                            "data": {
-                                "description": Config.STATUS_INFO_OUTLET_OK,
-                                "done": False,
-                                "hidden": False,
-                            },
-                        }
-                    )
+                await self._emit_status(__event_emitter__, Config.STATUS_INFO_OUTLET_OK)
 
             # Send to chat
-            if self.valves.send_to_chat:
+            if plan.send_to_chat:
                 if "messages" in body and body["messages"]:
                     last_message = body["messages"][-1]
                     if last_message.get("role") == "assistant":
@@ -946,9 +4541,9 @@ class Filter:
                         model_name = __model__.get("name") if __model__ else "UNKNOWN"
                         message_number = len(body["messages"])
                         content_header = ""
-                        content_inlet = ""
-                        content_outlet = ""
-                        content_stream = ""
+                        content_inlet = [] # Chunks of the JSON sections (joined once in the message)
+                        content_outlet = []
+                        content_stream = []
                         content_footer = ""
                         content_inlet_len = 0
                         content_outlet_len = 0
@@ -956,11 +4551,11 @@ class Filter:
 
                         # Interaction
                         interaction_displayed = []
-                        if self.valves.log_inlet:
+                        if plan.inlet:
                             interaction_displayed.append("INLET")
-                        if self.valves.log_outlet:
+                        if plan.outlet:
                             interaction_displayed.append("OUTLET")
-                        if self.valves.log_stream:
+                        if plan.stream:
                             interaction_displayed.append("STREAM")
 
                         if len(interaction_displayed) > 0:
@@ -973,48 +4568,14 @@ class Filter:
                                 print(f"[DEBUG FILTER DATA] WARNING | No interaction selected in Valves options")
 
                         # Data 
-                        data_displayed = []
-                        if self.valves.show_summary:
-                            data_displayed.append("summary")
-                        if self.valves.show_body:
-                            data_displayed.append("body")
-                        if self.valves.show_user:
-                            data_displayed.append("__user__")
-                        if self.valves.show_metadata:
-                            data_displayed.append("__metadata__")
-                        if self.valves.show_model:
-                            data_displayed.append("__model__")
-                        if self.valves.show_messages:
-                            data_displayed.append("__messages__")
-                        if self.valves.show_chat_id:
-                            data_displayed.append("__chat_id__")
-                        if self.valves.show_session_id:
-                            data_displayed.append("__session_id__")
-                        if self.valves.show_message_id:
-                            data_displayed.append("__message_id__")
-                        if self.valves.show_event_emitter:
-                            data_displayed.append("__event_emitter__")
-                        if self.valves.show_event_call:
-                            data_displayed.append("__event_call__")
-                        if self.valves.show_files:
-                            data_displayed.append("__files__")
-                        if self.valves.show_request:
-                            data_displayed.append("__request__")
-                        if self.valves.show_task:
-                            data_displayed.append("__task__")
-                        if self.valves.show_task_body:
-                            data_displayed.append("__task_body__")
-                        if self.valves.show_tools:
-                            data_displayed.append("__tools__")
-
-                        # Sent to 
+                        data_displayed = list(plan.chat_profile)
+
+                        # Sent to (with the profile of the log sinks that differ from the chat)
                         sent_to = []
-                        if self.valves.send_to_chat:
-                            sent_to.append("CHAT")
-                        if self.valves.send_to_console:
-                            sent_to.append("CONSOLE")
-                        if self.valves.send_to_file:
-                            sent_to.append("FILE")
+                        for sink in CapturePlan.SINKS:
+                            if sink in plan.profiles:
+                                sink_profile = plan.profiles[sink]
+                                sent_to.append(sink.upper() if sink_profile == plan.chat_profile else f"{sink.upper()} ({', '.join(sink_profile) or '-'})")
 
                         if len(sent_to) > 0:
                             sent_to_txt = '' + ' | '.join(sent_to or [])
@@ -1027,7 +4588,7 @@ class Filter:
 
 
                         # Inlet or Outlet
-                        if self.valves.log_inlet or self.valves.log_outlet:
+                        if plan.inlet or plan.outlet:
 
                             if len(data_displayed) > 0:
                                 data_displayed_txt = '' + ' | '.join(data_displayed or [])
@@ -1040,17 +4601,17 @@ class Filter:
 
                         # No Inlet and no Outlet
                         else:
-                            if self.valves.log_stream:
+                            if plan.stream:
                                 data_displayed_txt = "Stream info only"
                             else:
                                 data_displayed_txt = "-"
 
                         # Stream item nb
-                        if self.valves.log_stream:
-                            if stream_data is None:
+                        if plan.stream:
+                            if stream_assembler is None:
                                 stream_item_nb = 0
                             else:
-                                stream_item_nb = len(stream_data)
+                                stream_item_nb = stream_assembler.chunks
                             if stream_item_nb > 1:
                                 stream_item_nb_txt = f"{stream_item_nb} items"
                             else:
@@ -1073,40 +4634,38 @@ class Filter:
                             )
 
                         # Content inlet
-                        if self.valves.log_inlet:
-                            inlet_data_formatted = self._format_json(inlet_data)
-                            content_inlet_len = self._get_json_size(inlet_data_formatted)
-                            content_inlet = (
-                                f"#### {Config.TITLE_INLET} [{inlet_timestamp}] Size: {self._format_size(content_inlet_len)}\n"
-                                f"```json\n"
-                                f"{inlet_data_formatted}\n"
-                                f"```\n"
-                                f"\n"
-                            )
+                        if plan.inlet:
+                            inlet_data_formatted = await self._offload(plan, inlet_view, lambda cancel=None: list(self._format_json_chunks(inlet_view, cancel, plan)), on_timeout=[Config.OFFLOAD_TRUNCATED])
+                            content_inlet_len = self._get_chunks_size(inlet_data_formatted)
+                            content_inlet = [
+                                f"#### {Config.TITLE_INLET} [{inlet_timestamp}] Size: {self._format_size(content_inlet_len)}\n",
+                                f"```json\n",
+                                *inlet_data_formatted,
+                                f"\n```\n\n",
+                            ]
 
                         # Content outlet
-                        if self.valves.log_outlet:
-                            debug_data_formatted = self._format_json(debug_data)
-                            content_outlet_len = self._get_json_size(debug_data_formatted)
-                            content_outlet = (
-                                f"#### {Config.TITLE_OUTLET} [{current_timestamp}] Size: {self._format_size(content_outlet_len)}\n"
-                                f"```json\n"
-                                f"{debug_data_formatted}\n"
-                                f"```\n"
-                                f"\n"
-                            )
-
-                        # Content stream
-                        if self.valves.log_stream:
-                            stream_data_formatted = self._format_json(stream_data)
-                            content_stream_len = self._get_json_size(stream_data_formatted)
-                            content_stream = (
-                                f"#### {Config.TITLE_STREAM} [{stream_item_nb_txt}] Size: {self._format_size(content_stream_len)}\n"
-                                f"```json\n"
-                                f"{stream_data_formatted}\n"
-                                f"```\n"
-                                f"\n"
-                            )
+                        if plan.outlet:
+                            debug_data_formatted = outlet_chunks if outlet_chunks is not None else ["{}"]
+                            content_outlet_len = self._get_chunks_size(debug_data_formatted)
+                            content_outlet = [
+                                f"#### {Config.TITLE_OUTLET} [{current_timestamp}] Size: {self._format_size(content_outlet_len)}\n",
+                                f"```json\n",
+                                *debug_data_formatted,
+                                f"\n```\n\n",
+                            ]
+
+                        # Content stream (no stream data by the summary policy)
+                        if plan.stream and policy != "summary":
+                            stream_data = None if stream_assembler is None else stream_assembler.to_dict(original_content if isinstance(original_content, str) else None)
+                            stream_data_formatted = await self._offload(plan, stream_data, lambda cancel=None: list(self._format_json_chunks(stream_data, cancel, plan)), on_timeout=[Config.OFFLOAD_TRUNCATED])
+                            content_stream_len = self._get_chunks_size(stream_data_formatted)
+                            content_stream = [
+                                f"#### {Config.TITLE_STREAM} [{stream_item_nb_txt}] Size: {self._format_size(content_stream_len)}\n",
+                                f"```json\n",
+                                *stream_data_formatted,
+                                f"\n```\n\n",
+                            ]
 
                         # Content footer
                         if Config.RESULT_FOOTER:
@@ -1114,6 +4673,7 @@ class Filter:
                             content_footer = (
                                 f"DEBUG FILTER DATA status OK\n"
                                 f"- Report total size: {self._format_size(content_len)}\n"
+                                f"- Section cache: {self.section_cache.hits} hits, {self.section_cache.misses} misses\n"
                                 f"- Message number: {message_number}\n"
                             )
 
@@ -1123,22 +4683,22 @@ class Filter:
                         else:
                             content_end = f"\n{'_'*80}\n"
 
-                        # Update content
-                        debug_content = (
-                            f"{content_begin}\n"
-                            f"{content_header}\n"
-                            f"{content_inlet}\n"
-                            f"{content_outlet}\n"
-                            f"{content_stream}\n"
-                            f"{content_footer}\n"
-                            f"{content_end}\n"
-                        )
-
-                        # Update content
-                        last_message["content"] = (
-                            f"{original_content}\n"
-                            f"{debug_content}\n"
-                        )
+                        # Update content (single join of all the parts, no intermediate copy of the report)
+                        last_message["content"] = "".join([
+                            f"{original_content}\n",
+                            f"{content_begin}\n",
+                            f"{content_header}\n",
+                            *content_inlet, "\n",
+                            *content_outlet, "\n",
+                            *content_stream, "\n",
+                            f"{content_footer}\n",
+                            f"{content_end}\n",
+                            "\n",
+                        ])
+
+            # Trace: export the spans of the request
+            if trace is not None:
+                self._end_trace(trace, body)
 
         # Outlet processing failed
         except Exception as e:
@@ -1147,18 +4707,15 @@ class Filter:
             if Config.DEBUG_ERROR:
                 print(f"[DEBUG FILTER DATA] ERROR | Outlet processing failed: {e}")
 
+        # Filter chain profiler: start probe (last thing of the outlet)
+        finally:
+            if self.plan is not None and self.plan.probe == "start":
+                self._probe(self.plan, "OUTLET", body, __metadata__, __message_id__)
+
         # Status completed
         try:
-            if __event_emitter__ and Config.STATUS_USE:
-                await __event_emitter__(
-                    {
-                        "type": "status",
-                        "data": {
-                            "description": Config.STATUS_INFO_COMPLETED,
-                            "done": True,
-                        },
-                    }
-                )
+            if self.plan is not None and self.plan.report:
+                await self._emit_status(__event_emitter__, Config.STATUS_INFO_COMPLETED, done=True)
 
         # Status warning
         except Exception as e:
@@ -1178,6 +4735,8 @@ class Filter:
         self,
         event: Optional[dict] = None, # A dict of the token stream
         __user__: Optional[dict] = None, # A dict with user information
+        __metadata__: Optional[dict] = None, # A dict with wide ranging information about the chat, model, files, etc... (message_id of the response)
+        __model__: Optional[dict] = None, # A dict with information about the model
         __event_emitter__: Optional[Callable[[dict], Any]] = None, # A Callable used to display event information to the user
         ) -> dict:
         """Intercept stream responses"""
@@ -1186,114 +4745,154 @@ class Filter:
         if event is None:
             return event
 
+        # Capture plan
+        plan = self._get_plan()
+
+        # Nothing would be emitted
+        if not plan.active:
+            return event
+
+        # Get user id, background task and request key
+        user_id = __user__.get("id") if __user__ else "default"
+        task = (__metadata__ or {}).get("task")
+        request_key = self._request_key(user_id, __metadata__, __model__, task=task)
+        policy = plan.task_policy(task)
+
+        # Background task call: end of its stream
+        if plan.accounting and request_key in self.debug_task_temp:
+            for choice in event.get("choices") or []:
+                if choice.get("finish_reason"):
+                    TaskLedger.end_call(self.debug_task_temp.pop(request_key))
+                    break
+
+        # Background task: capture policy (as inlet and outlet)
+        if policy == "skip":
+            return event
+
+        # Targeted capture (decision of the inlet)
+        if plan.targeted and not self.debug_capture_temp.get(request_key, True):
+            return event
+        self._track_request(request_key)
+
+        # Multi-model comparison: chunks
+        if plan.compare:
+            compare_temp = self.debug_compare_temp.get(request_key)
+            if compare_temp is not None:
+                ModelComparison.chunk(compare_temp[1], event)
+
+        # Rolling statistics: chunks, first and last chunk
+        if plan.stats:
+            stats_temp = self.debug_stats_temp.get(request_key)
+            if stats_temp is not None:
+                stats_temp["chunks"] += 1
+                stats_temp["last_chunk"] = time.monotonic()
+                if stats_temp["first_chunk"] is None:
+                    stats_temp["first_chunk"] = stats_temp["last_chunk"]
+
+        # Flight recorder: chunks and finish reason
+        if plan.flight:
+            flight_record = self.debug_flight_temp.get(request_key)
+            if flight_record is not None:
+                flight_record["stream"]["chunks"] += 1
+                for choice in event.get("choices") or []:
+                    if choice.get("finish_reason"):
+                        flight_record["stream"]["finish_reason"] = choice["finish_reason"]
+
+        # Stream monitor: live throughput and stalls
+        if plan.monitor:
+            await self._monitor_stream(plan, request_key, event, __event_emitter__)
+
+        # Trace: first and last chunk (no other per-chunk cost)
+        if plan.trace:
+            trace = self.debug_trace_temp.get(request_key)
+            if trace is not None:
+                trace["last_chunk"] = time.time_ns()
+                if trace["first_chunk"] is None:
+                    trace["first_chunk"] = trace["last_chunk"]
+                trace["chunks"] += 1
+
+        # No report (the summary policy has no stream data)
+        if not plan.report or policy == "summary":
+            return event
+
         # Stream
         try:
 
             # Log stream
-            if self.valves.log_stream:
+            if plan.stream:
 
                 # Data
                 current_timestamp = datetime.now()#.strftime('%Y-%m-%d %H:%M:%S')
-                user_id = __user__.get("id") if __user__ else "default"
+                stream_stop = False
+                context = {**self.debug_tail_temp.get(request_key, {"user": user_id}), "stage": "stream"} if plan.send_to_tail else None
 
-                debug_stream_temp = self.debug_stream_temp.get(user_id)
-                stream_data = None if debug_stream_temp is None else debug_stream_temp.get("stream_data")
+                debug_stream_temp = self.debug_stream_temp.get(request_key)
+                stream_assembler = None if not isinstance(debug_stream_temp, dict) else debug_stream_temp.get("stream_assembler")
 
                 # First stream data
-                if stream_data is None:
+                if stream_assembler is None:
 
                     # DEBUG INFO
                     if Config.DEBUG_INFO:
                         print(f"[DEBUG FILTER DATA] INFO | Stream start (priority:{self.valves.priority})")
 
                     # Start of log
-                    self._log(message=f"{Config.TITLE_STREAM} [{current_timestamp}]", data=None, indent=False, delimiters="top")
+                    self._log(message=f"{Config.TITLE_STREAM} [{current_timestamp}]", data=None, indent=False, delimiters="top", context=context)
                     
-                    self.debug_stream_temp[user_id] = {"stream_data": [event]}
+                    stream_assembler = StreamAssembler(keep_events=plan.stream_events)
+                    self.debug_stream_temp[request_key] = {"stream_assembler": stream_assembler}
 
                     # Status stream start
-                    if __event_emitter__ and Config.STATUS_USE:
-                        await __event_emitter__(
-                            {
-                                "type": "status",
-                                "data": {
-                                    "description": Config.STATUS_INFO_STREAM_START,
-                                    "done": False,
-                                    "hidden": False,
-                                },
-                            }
-                        )
+                    await self._emit_status(__event_emitter__, Config.STATUS_INFO_STREAM_START)
 
                 # Update stream data
-                else:
-                    stream_data.append(event)
-                    self.debug_stream_temp[user_id] = {"stream_data": stream_data}
-
-                # Log stream
-                self._log(message=f"[DEBUG FILTER DATA] STREAM | {current_timestamp}", data=event, indent=True, delimiters=None)
-
-                # Check stream stop
                 try:
-                    stream_stop = event.get("choices", [{}])[0].get("finish_reason") == "stop"
+                    finish_reason = stream_assembler.finish_reason
+                    stream_assembler.add(event)
+                    stream_stop = finish_reason is None and stream_assembler.finish_reason is not None
                 except Exception as e:
 
                     # DEBUG ERROR
                     if Config.DEBUG_ERROR:
-                        print(f"[DEBUG FILTER DATA] ERROR | Error checking stream stop: {e}")
+                        print(f"[DEBUG FILTER DATA] ERROR | Error assembling stream event: {e}")
+
+                # Log stream event
+                if plan.stream_events:
+                    self._log(message=f"[DEBUG FILTER DATA] STREAM | {current_timestamp}", data=event, indent=True, delimiters=None, context=context)
 
                 # Stream stop
                 if stream_stop:
 
-                    # End of log
-                    self._log(message=None, data=None, indent=False, delimiters="bottom")
+                    # End of log (with the reconstructed response)
+                    if not plan.stream_events:
+                        stream_data = stream_assembler.to_dict()
+                        await self._offload(plan, stream_data, functools.partial(self._log, plan=plan), message=f"[DEBUG FILTER DATA] STREAM RECONSTRUCTED | {current_timestamp}", data=stream_data, indent=True, delimiters=None, context=context)
+                    self._log(message=None, data=None, indent=False, delimiters="bottom", context=context)
 
                     # Status stream OK
-                    if __event_emitter__ and Config.STATUS_USE:
-                        await __event_emitter__(
-                            {
-                                "type": "status",
-                                "data": {
-                                    "description": Config.STATUS_INFO_STREAM_OK,
-                                    "done": False,
-                                    "hidden": False,
-                                },
-                            }
-                        )
+                    await self._emit_status(__event_emitter__, Config.STATUS_INFO_STREAM_OK)
 
                     # DEBUG INFO
                     if Config.DEBUG_INFO:
                         print(f"[DEBUG FILTER DATA] INFO | Stream end")
 
             # No log stream
-            if not self.valves.log_stream:
-
-                # Get user id
-                user_id = __user__.get("id") if __user__ else "default"
+            else:
 
                 # Check temp
-                if not user_id in self.debug_stream_temp or self.debug_stream_temp[user_id] is None:
+                if not request_key in self.debug_stream_temp or self.debug_stream_temp[request_key] is None:
 
                     # Status stream OK
-                    if __event_emitter__ and Config.STATUS_USE:
-                        await __event_emitter__(
-                            {
-                                "type": "status",
-                                "data": {
-                                    "description": "🗐 Debug Filter Data - Wait while streaming...",
-                                    "done": False,
-                                    "hidden": False,
-                                },
-                            }
-                        )
+                    await self._emit_status(__event_emitter__, "🗐 Debug Filter Data - Wait while streaming...")
 
                     # Update temp
-                    self.debug_stream_temp[user_id] = True
+                    self.debug_stream_temp[request_key] = True
 
         # Stream processing failed
         except Exception as e:
 
             # Cleanup in case of exceptions
-            del self.debug_stream_temp[user_id]
+            self.debug_stream_temp.pop(request_key, None)
 
             # DEBUG ERROR
             if Config.DEBUG_ERROR:
@@ -1301,3 +4900,246 @@ class Filter:
 
         return event
 
+
+def merge_log_segments(file_path: str) -> Iterator[str]:
+    """Yield the records of all the segment files of a log (see ProcessFileHandler) in timestamp order.
+
+    The records of each segment (rotated backups first) are already in order, so the segments are merged lazily
+    with heapq.merge: memory use is bounded by one record per segment. The single file log is included if present.
+    """
+
+    # Segments: {pid: [paths from oldest to newest]}
+    root, ext = os.path.splitext(file_path)
+    segment_pattern = re.compile(rf'{re.escape(os.path.basename(root))}(?:\.(\d+))?{re.escape(ext)}(?:\.(\d+))?')
+    segments = {}
+    directory = os.path.dirname(file_path) or "."
+    for name in os.listdir(directory):
+        match = segment_pattern.fullmatch(name)
+        if match:
+            segments.setdefault(match.group(1), []).append((int(match.group(2) or 0), os.path.join(directory, name)))
+
+    def read_records(paths):
+        """Yield the records of a segment, a record starts with the timestamp of the log formatter."""
+
+        record = []
+        for _, path in sorted(paths, reverse=True):
+            with open(path, encoding="utf-8", errors="replace") as file:
+                for line in file:
+                    if ProcessFileHandler.RECORD_START.match(line) and record:
+                        yield "".join(record)
+                        record = []
+                    record.append(line)
+        if record:
+            yield "".join(record)
+
+    yield from heapq.merge(*(read_records(paths) for paths in segments.values()), key=lambda record: record[:23])
+
+
+def load_trace_columns(file_path: str) -> dict:
+    """Load the traces exported by the filter (see trace_export, JSON lines file) into columnar NumPy arrays.
+
+    One row per request (root span 'chat.request'), with the durations of its child spans. Missing values are NaN.
+    Requires NumPy (installed with Open WebUI).
+    """
+
+    import numpy as np
+
+    # Spans grouped by trace
+    requests = {} # {trace id: row}
+    with open(file_path, encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            for resource_spans in json.loads(line).get("resourceSpans", []):
+                for scope_spans in resource_spans.get("scopeSpans", []):
+                    for span in scope_spans.get("spans", []):
+                        row = requests.setdefault(span["traceId"], {})
+                        start = int(span["startTimeUnixNano"])
+                        duration = (int(span["endTimeUnixNano"]) - start) / 1e9
+                        if span["name"] == "chat.request":
+                            row["start"] = start / 1e9
+                            row["latency"] = duration
+                            for attribute in span.get("attributes", []):
+                                value = attribute["value"]
+                                row[attribute["key"]] = value.get("stringValue", value.get("intValue", value.get("doubleValue")))
+                        elif span["name"] == "llm.time_to_first_chunk":
+                            row["ttft"] = duration
+                        elif span["name"] == "llm.stream":
+                            row["generation"] = duration
+
+    # Columns (requests without root span are incomplete exports)
+    rows = [row for row in requests.values() if "start" in row]
+    def numbers(key):
+        return np.array([float(row[key]) if row.get(key) is not None else np.nan for row in rows], dtype=np.float64)
+    def labels(key):
+        return np.array([str(row.get(key) or "-") for row in rows], dtype=object)
+
+    return {
+        "start": numbers("start"),
+        "model": labels("gen_ai.request.model"),
+        "user": labels("enduser.id"),
+        "task": labels("openwebui.task"),
+        "body_bytes": numbers("openwebui.body_bytes"),
+        "messages": numbers("openwebui.message_count"),
+        "chunks": numbers("openwebui.stream_chunks"),
+        "ttft_seconds": numbers("ttft"),
+        "generation_seconds": numbers("generation"),
+        "latency_seconds": numbers("latency"),
+    }
+
+
+def build_capacity_report(columns: dict, group_by: tuple = ("model", "user", "task")) -> dict:
+    """Compute the distributions of the metrics grouped by model, user and task (vectorized, one sort per grouping).
+
+    Each metric gets count, mean, percentiles (Config.STATS_PERCENTILES) and max, NaN values ignored. Also includes
+    the load per hour of day and the peak requests per minute.
+    """
+
+    import numpy as np
+
+    # Overall load
+    start = columns["start"]
+    report = {"requests": int(start.size), "groups": {}}
+    if not start.size:
+        return report
+    report["period"] = f"{datetime.fromtimestamp(np.nanmin(start)):%Y-%m-%d %H:%M:%S} .. {datetime.fromtimestamp(np.nanmax(start)):%Y-%m-%d %H:%M:%S}"
+    utc_offset = datetime.now().astimezone().utcoffset().total_seconds() # Local hours (current offset)
+    hours = ((start + utc_offset) // 3600 % 24).astype(np.int64)
+    report["requests_per_hour_of_day"] = np.bincount(hours, minlength=24).tolist()
+    report["peak_requests_per_minute"] = int(np.bincount((start // 60 - np.nanmin(start) // 60).astype(np.int64)).max())
+
+    # Distributions by group
+    metrics = [key for key, values in columns.items() if key not in ("start", *group_by) and values.dtype != object]
+    percentiles = [float(value) for value in Config.STATS_PERCENTILES]
+    for dimension in group_by:
+        names, codes = np.unique(columns[dimension], return_inverse=True)
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(names.size + 1))
+        groups = {}
+        for index, name in enumerate(names):
+            rows = order[bounds[index]:bounds[index + 1]]
+            group = {"requests": int(rows.size)}
+            for metric in metrics:
+                values = columns[metric][rows]
+                values = values[~np.isnan(values)]
+                if not values.size:
+                    continue
+                stats = {"count": int(values.size), "mean": float(values.mean())}
+                stats.update({f"p{value:g}": float(result) for value, result in zip(percentiles, np.percentile(values, percentiles))})
+                stats["max"] = float(values.max())
+                group[metric] = stats
+            groups[str(name)] = group
+        report["groups"][dimension] = dict(sorted(groups.items(), key=lambda item: -item[1]["requests"]))
+
+    return report
+
+
+def format_capacity_report(report: dict, html: bool = False) -> str:
+    """Render a capacity report (see build_capacity_report) as a text or HTML document."""
+
+    # Rows: one per group and metric
+    header = ["group", "requests", "metric", "count", "mean"] + [f"p{value:g}" for value in Config.STATS_PERCENTILES] + ["max"]
+    sections = []
+    for dimension, groups in report.get("groups", {}).items():
+        rows = []
+        for name, group in groups.items():
+            for metric, stats in group.items():
+                if metric == "requests":
+                    continue
+                rows.append([name, str(group["requests"]), metric] + [f"{stats[key]:.3f}" if isinstance(stats[key], float) else str(stats[key]) for key in header[3:]])
+        sections.append((dimension, rows))
+    overview = [
+        f"Requests: {report.get('requests', 0)}",
+        f"Period: {report.get('period', '-')}",
+        f"Peak requests per minute: {report.get('peak_requests_per_minute', 0)}",
+        f"Requests per hour of day: {report.get('requests_per_hour_of_day', [])}",
+    ]
+
+    # HTML
+    if html:
+        import html as html_lib
+        parts = [f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{Config.TITLE_CAPACITY}</title>",
+                 "<style>body{font-family:sans-serif}table{border-collapse:collapse}td,th{border:1px solid #ccc;padding:2px 6px;text-align:right}td:first-child,td:nth-child(3){text-align:left}</style></head><body>",
+                 f"<h1>{Config.TITLE_CAPACITY}</h1><ul>", *[f"<li>{html_lib.escape(line)}</li>" for line in overview], "</ul>"]
+        for dimension, rows in sections:
+            parts.append(f"<h2>By {html_lib.escape(dimension)}</h2><table><tr>{''.join(f'<th>{cell}</th>' for cell in header)}</tr>")
+            parts.extend(f"<tr>{''.join(f'<td>{html_lib.escape(cell)}</td>' for cell in row)}</tr>" for row in rows)
+            parts.append("</table>")
+        parts.append("</body></html>")
+        return "\n".join(parts)
+
+    # Text (aligned columns)
+    lines = [Config.TITLE_CAPACITY, *overview]
+    for dimension, rows in sections:
+        widths = [max(len(row[index]) for row in [header] + rows) for index in range(len(header))]
+        lines += ["", f"By {dimension}", "  ".join(cell.ljust(width) for cell, width in zip(header, widths)).rstrip()]
+        lines += ["  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() for row in rows]
+    return "\n".join(lines) + "\n"
+
+
+def get_shared_state(name: str) -> dict:
+    """Return a process-wide dict shared by all the loaded copies of this filter.
+
+    Open WebUI loads each function in its own module, so module globals are not shared between two instances of
+    this filter (e.g. the profiler probes). The state lives in a namespace registered in sys.modules instead.
+    """
+
+    shared = sys.modules.get(SHARED_STATE_MODULE)
+    if shared is None:
+        shared = sys.modules.setdefault(SHARED_STATE_MODULE, types.ModuleType(SHARED_STATE_MODULE))
+
+    return shared.__dict__.setdefault(name, {})
+
+
+def main(argv: list | None = None) -> int:
+    """Command line tools working on the logs of the filter.
+
+    Usage: python debug-filter-data.py merge <file_path>
+           python debug-filter-data.py tail <socket_path> [user=<id>] [model=<id>] [stage=inlet|outlet|stream]
+           python debug-filter-data.py report <traces_file> [--html <output_file>]
+    """
+
+    argv = sys.argv[1:] if argv is None else argv
+
+    # Merge the segment files of a multi-process log
+    if len(argv) == 2 and argv[0] == "merge":
+        for record in merge_log_segments(argv[1]):
+            sys.stdout.write(record)
+        return 0
+
+    # Capacity report of the exported traces (see trace_export)
+    if len(argv) in (2, 4) and argv[0] == "report" and (len(argv) == 2 or argv[2] == "--html"):
+        try:
+            report = build_capacity_report(load_trace_columns(argv[1]))
+        except ImportError:
+            print("[DEBUG FILTER DATA] ERROR | The report requires NumPy (pip install numpy)")
+            return 1
+        if len(argv) == 4:
+            with open(argv[3], "w", encoding="utf-8") as file:
+                file.write(format_capacity_report(report, html=True))
+        else:
+            sys.stdout.write(format_capacity_report(report))
+        return 0
+
+    # Live tail (filters: comma separated values, e.g. 'stage=inlet,outlet')
+    if len(argv) >= 2 and argv[0] == "tail":
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+                connection.connect(argv[1])
+                connection.sendall((" ".join(argv[2:]) + "\n").encode("utf-8"))
+                while True:
+                    data = connection.recv(65536)
+                    if not data:
+                        break
+                    sys.stdout.buffer.write(data)
+                    sys.stdout.flush()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    print(main.__doc__)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""Fixtures of the Debug Filter Data tests: the filter module and a full request (inlet, stream, outlet)."""
+
+import asyncio
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+
+MODULE_PATH = Path(__file__).resolve().parent.parent / "debug-filter-data.py"
+
+
+@pytest.fixture(scope="session")
+def dfd():
+    """The filter module (its file name is not importable)."""
+
+    spec = importlib.util.spec_from_file_location("debug_filter_data", MODULE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def make_filter(dfd, tmp_path, monkeypatch):
+    """Return a filter factory: valves given as keyword arguments, files in tmp_path, console off."""
+
+    monkeypatch.setattr(dfd.Config, "TRACE_FLUSH_INTERVAL", 0.05) # Spans exported without waiting
+
+    def make(**valves):
+        debug_filter = dfd.Filter()
+        debug_filter.valves.send_to_console = False
+        debug_filter.valves.file_path = str(tmp_path / "debug_filter_data.log")
+        debug_filter.valves.trace_endpoint = str(tmp_path / "traces.jsonl")
+        debug_filter.valves.schema_path = str(tmp_path / "schema.json")
+        debug_filter.valves.flight_path = str(tmp_path / "flight.jsonl")
+        for name, value in valves.items():
+            setattr(debug_filter.valves, name, value)
+        return debug_filter
+
+    return make
+
+
+class Request:
+    """One chat request through inlet, stream and outlet, with the emitted events."""
+
+    def __init__(self, model="llama3", user_id="u1", chat_id="c1", message_id="m1", task=None, parent_id=None, content="Hello there"):
+        self.model = model
+        self.user = {"id": user_id, "name": "Alice", "email": "alice@example.com"}
+        self.metadata = {"chat_id": chat_id, "message_id": message_id, "session_id": "s1"}
+        if task:
+            self.metadata["task"] = task
+        if parent_id:
+            self.metadata["parent_message_id"] = parent_id
+        self.messages = [{"role": "system", "content": "You are helpful."}, {"role": "user", "content": content}]
+        self.tools = {"search": {"spec": {"name": "search", "parameters": {"query": {"type": "string"}}}, "callable": print}}
+        self.events = []
+
+    async def emitter(self, event):
+        self.events.append(event)
+
+    def kwargs(self):
+        return {
+            "__user__": self.user,
+            "__metadata__": self.metadata,
+            "__model__": {"id": self.model, "name": self.model},
+            "__event_emitter__": self.emitter,
+            "__chat_id__": self.metadata["chat_id"],
+            "__message_id__": self.metadata["message_id"],
+            "__task__": self.metadata.get("task"),
+            "__tools__": self.tools,
+        }
+
+    async def inlet(self, debug_filter):
+        return await debug_filter.inlet({"model": self.model, "stream": True, "messages": list(self.messages)}, **self.kwargs())
+
+    async def stream(self, debug_filter, chunks, finish=True):
+        for index, chunk in enumerate(chunks):
+            event = {"choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": "stop" if finish and index == len(chunks) - 1 else None}]}
+            await debug_filter.stream(event, __user__=self.user, __metadata__=self.metadata, __model__={"id": self.model}, __event_emitter__=self.emitter)
+
+    async def outlet(self, debug_filter, reply):
+        body = {"model": self.model, "messages": self.messages + [{"role": "assistant", "content": reply}]}
+        return await debug_filter.outlet(body, **self.kwargs())
+
+    async def run(self, debug_filter, chunks=("Hel", "lo", "!")):
+        """Run the request, return the outlet body."""
+
+        await self.inlet(debug_filter)
+        await self.stream(debug_filter, chunks)
+        return await self.outlet(debug_filter, "".join(chunks))
+
+    def statuses(self):
+        return [event["data"]["description"] for event in self.events if event.get("type") == "status"]
+
+
+@pytest.fixture
+def request_factory():
+    return Request
+
+
+@pytest.fixture
+def run():
+    """Run a coroutine to completion."""
+
+    return asyncio.run
@@ -0,0 +1,14 @@
+"""Body size: serialized once per inlet for the profiler, trace and rolling statistics."""
+
+
+def test_body_serialized_once(make_filter, request_factory, run, monkeypatch):
+    debug_filter = make_filter(send_to_chat=False, trace_export=True, rolling_stats=True, profiler_role="start")
+    bodies = []
+    get_json_size = debug_filter._get_json_size
+    monkeypatch.setattr(debug_filter, "_get_json_size", lambda data: bodies.append(data) or get_json_size(data))
+    request = request_factory()
+
+    run(request.inlet(debug_filter))
+
+    assert len([data for data in bodies if isinstance(data, dict) and "messages" in data]) == 1
+    assert debug_filter.debug_stats_temp["m1"]["body_bytes"] == debug_filter.debug_trace_temp["m1"]["attributes"]["openwebui.body_bytes"] > 0
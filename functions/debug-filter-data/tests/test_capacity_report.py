@@ -0,0 +1,88 @@
+"""Capacity report: distributions of the exported traces by model, user and task."""
+
+import json
+
+import pytest
+
+from test_features import wait_for
+
+
+BASE = 1_699_999_980 # Start of a minute (seconds)
+
+
+def span(trace_id, name, start, duration, attributes=()):
+    return {
+        "traceId": trace_id,
+        "name": name,
+        "startTimeUnixNano": str(int(start * 1e9)),
+        "endTimeUnixNano": str(int((start + duration) * 1e9)),
+        "attributes": [{"key": key, "value": value} for key, value in attributes],
+    }
+
+
+def write_traces(path, requests):
+    with open(path, "w", encoding="utf-8") as file:
+        for index, (model, user, offset, latency, ttft) in enumerate(requests):
+            trace_id = f"trace{index}"
+            spans = [span(trace_id, "chat.request", BASE + offset, latency, [("gen_ai.request.model", {"stringValue": model}), ("enduser.id", {"stringValue": user}), ("openwebui.body_bytes", {"intValue": "1000"})])]
+            if ttft is not None:
+                spans.append(span(trace_id, "llm.time_to_first_chunk", BASE + offset, ttft))
+            file.write(json.dumps({"resourceSpans": [{"scopeSpans": [{"spans": spans}]}]}) + "\n")
+
+
+@pytest.fixture
+def traces(tmp_path):
+    pytest.importorskip("numpy")
+    path = tmp_path / "traces.jsonl"
+    write_traces(path, [
+        ("llama3", "u1", 0, 1.0, 0.1),
+        ("llama3", "u1", 10, 2.0, 0.2),
+        ("llama3", "u1", 20, 3.0, 0.3),
+        ("qwen", "u2", 70, 4.0, None),
+        ("qwen", "u2", 80, 6.0, None),
+    ])
+    return path
+
+
+def test_distributions_by_model_and_peak_load(dfd, traces):
+    report = dfd.build_capacity_report(dfd.load_trace_columns(str(traces)))
+
+    assert report["requests"] == 5
+    assert report["peak_requests_per_minute"] == 3
+    assert sum(report["requests_per_hour_of_day"]) == 5
+    models = report["groups"]["model"]
+    assert list(models) == ["llama3", "qwen"]
+    assert models["llama3"]["latency_seconds"] == pytest.approx({"count": 3, "mean": 2.0, "p50": 2.0, "p90": 2.8, "p99": 2.98, "max": 3.0})
+    assert models["llama3"]["ttft_seconds"] == pytest.approx({"count": 3, "mean": 0.2, "p50": 0.2, "p90": 0.28, "p99": 0.298, "max": 0.3})
+    assert models["qwen"]["latency_seconds"] == pytest.approx({"count": 2, "mean": 5.0, "p50": 5.0, "p90": 5.8, "p99": 5.98, "max": 6.0})
+    assert "ttft_seconds" not in models["qwen"] # No value: no statistics
+    assert report["groups"]["user"]["u2"]["requests"] == 2
+
+
+def test_html_report_command(dfd, traces, tmp_path):
+    output = tmp_path / "report.html"
+
+    assert dfd.main(["report", str(traces), "--html", str(output)]) == 0
+
+    html = output.read_text()
+    assert html.startswith("<!DOCTYPE html>") and html.rstrip().endswith("</html>")
+    assert "<li>Requests: 5</li>" in html and "<li>Peak requests per minute: 3</li>" in html
+    assert "<tr><td>llama3</td><td>3</td><td>latency_seconds</td><td>3</td><td>2.000</td><td>2.000</td><td>2.800</td><td>2.980</td><td>3.000</td></tr>" in html
+    assert "<h2>By task</h2>" in html
+
+
+def test_capacity_report_of_exported_traces(dfd, make_filter, request_factory, run, tmp_path):
+    pytest.importorskip("numpy")
+    debug_filter = make_filter(send_to_chat=False, trace_export=True)
+    for index in range(3):
+        run(request_factory(message_id=f"m{index}").run(debug_filter))
+    traces = tmp_path / "traces.jsonl"
+    assert wait_for(lambda: traces.exists() and traces.read_text().count('"chat.request"') == 3)
+
+    report = dfd.build_capacity_report(dfd.load_trace_columns(str(traces)))
+
+    assert report["requests"] == 3 and report["peak_requests_per_minute"] in (2, 3)
+    llama3 = report["groups"]["model"]["llama3"]
+    assert llama3["requests"] == 3
+    assert llama3["latency_seconds"]["count"] == llama3["chunks"]["count"] == 3
+    assert llama3["chunks"]["max"] == 3.0 and llama3["messages"]["mean"] == 2.0
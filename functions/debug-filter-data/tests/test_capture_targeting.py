@@ -0,0 +1,50 @@
+"""Targeted capture: only the matching requests, or the next N requests, get a report."""
+
+
+def test_capture_only_lets_other_requests_through(make_filter, request_factory, run):
+    debug_filter = make_filter(capture_only="model:llama3")
+
+    captured = run(request_factory(model="llama3").run(debug_filter))["messages"][-1]["content"]
+    other = run(request_factory(model="qwen", message_id="m2").run(debug_filter))["messages"][-1]["content"]
+
+    assert "- Model: llama3" in captured
+    assert other == "Hello!"
+
+
+def test_capture_ignore_skips_matching_task(make_filter, request_factory, run):
+    debug_filter = make_filter(capture_ignore="task:title_generation")
+
+    task = run(request_factory(task="title_generation", message_id="m2").run(debug_filter))["messages"][-1]["content"]
+    chat = run(request_factory().run(debug_filter))["messages"][-1]["content"]
+
+    assert task == "Hello!"
+    assert "DFD REPORT BEGIN" in chat
+
+
+def test_capture_armed_for_next_requests_only(make_filter, request_factory, run):
+    debug_filter = make_filter(capture_armed_requests=1)
+
+    first = run(request_factory(message_id="m1").run(debug_filter))["messages"][-1]["content"]
+    second = run(request_factory(message_id="m2").run(debug_filter))["messages"][-1]["content"]
+
+    assert "DFD REPORT BEGIN" in first
+    assert second == "Hello!"
+    assert debug_filter._get_plan().armed_remaining == 0
+
+
+def test_request_not_captured_skips_all_inlet_work(make_filter, request_factory, run, dfd):
+    debug_filter = make_filter(capture_only="model:llama3", task_accounting=True, profiler_role="end", rolling_stats=True)
+    request = request_factory(model="qwen")
+    probes = dfd.get_shared_state("probes")
+    probes[("m1", "INLET")] = (0, 0, 0) # Stamp of a start probe, left for the captured requests
+
+    run(request.inlet(debug_filter))
+
+    assert debug_filter.debug_capture_temp == {"m1": False}
+    assert not any(temp for temp in debug_filter.request_temps if temp is not debug_filter.debug_capture_temp)
+    assert not debug_filter.tasks.turns
+    assert probes.pop(("m1", "INLET")) == (0, 0, 0)
+
+    run(request.stream(debug_filter, ("Hello!",)))
+    run(request.outlet(debug_filter, "Hello!"))
+    assert not debug_filter.pending_requests and not any(debug_filter.request_temps)
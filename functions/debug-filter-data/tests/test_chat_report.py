@@ -0,0 +1,25 @@
+"""Chat report: sections and sizes."""
+
+import re
+
+
+def test_section_sizes(make_filter, request_factory, run):
+    debug_filter = make_filter(log_stream=True, show_body=True)
+    request = request_factory(content='Quoted "text"\n\twith é ' * 2000)
+
+    reply = run(request.run(debug_filter))["messages"][-1]["content"]
+
+    sections = re.findall(r"#### .+? Size: (.+?)\n```json\n(.*?)\n```\n", reply, re.S)
+    assert len(sections) == 3
+    for size, formatted in sections:
+        assert size == debug_filter._format_size(debug_filter._get_json_size(formatted))
+
+
+def test_chunks_size_matches_joined_size(make_filter):
+    debug_filter = make_filter(digest_large_data=False)
+    data = {"text": 'Quoted "text"\n\twith é \\ ' * 5000, "items": list(range(20000))}
+
+    chunks = list(debug_filter._format_json_chunks(data))
+
+    assert len(chunks) > 1
+    assert debug_filter._get_chunks_size(chunks) == debug_filter._get_json_size("".join(chunks))
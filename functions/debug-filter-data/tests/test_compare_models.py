@@ -0,0 +1,32 @@
+"""Multi-model comparison: sibling requests of one prompt, streamed concurrently."""
+
+import asyncio
+
+
+def test_sibling_models_compared(make_filter, request_factory):
+    debug_filter = make_filter(compare_models=True, log_stream=True)
+    requests = [request_factory(model=model, message_id=f"m-{model}", parent_id="p1") for model in ("llama3", "qwen")]
+
+    async def scenario():
+        for request in requests:
+            await request.inlet(debug_filter)
+        for chunk in ("Hel", "lo", "!"):
+            for request in requests: # Interleaved streams
+                await request.stream(debug_filter, (chunk,), finish=chunk == "!")
+        return [await request.outlet(debug_filter, "Hello!") for request in requests]
+
+    first, last = [body["messages"][-1]["content"] for body in asyncio.run(scenario())]
+
+    assert '"running"' in first
+    assert '"running"' not in last and '"fastest_total"' in last
+    assert last.count('"chunks": 3') == 3 # Both models and the stream data of the last one
+    assert not debug_filter.comparison.groups and not debug_filter.pending_requests
+
+
+def test_single_request_not_compared(make_filter, request_factory, run):
+    debug_filter = make_filter(compare_models=True)
+
+    reply = run(request_factory(parent_id="p1").run(debug_filter))["messages"][-1]["content"]
+
+    assert "DFD REPORT BEGIN" in reply and '"MODEL COMPARISON"' not in reply
+    assert not debug_filter.comparison.groups
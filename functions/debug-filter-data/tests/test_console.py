@@ -0,0 +1,16 @@
+"""Console sink: the reports are written to stdout chunk by chunk."""
+
+
+def test_reports_written_to_console_in_chunks(make_filter, request_factory, run, capsys, dfd, monkeypatch):
+    monkeypatch.setattr(dfd.Config, "LOG_CHUNK_SIZE", 256)
+    debug_filter = make_filter(send_to_console=True, send_to_chat=False, show_body=True, digest_large_data=False)
+    writes = []
+    monkeypatch.setattr("sys.stdout.write", lambda text: writes.append(text) or len(text))
+
+    reply = run(request_factory(content="Hello there " * 200).run(debug_filter))["messages"][-1]["content"]
+
+    output = "".join(writes)
+    assert reply == "Hello!"
+    assert dfd.Config.TITLE_INLET in output and dfd.Config.TITLE_OUTLET in output
+    assert output.count("Hello there") >= 400
+    assert len(writes) > 10 and max(len(text) for text in writes) < len("Hello there " * 200) + 100 # At most one string per chunk, never a whole report
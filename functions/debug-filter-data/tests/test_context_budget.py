@@ -0,0 +1,39 @@
+"""Context budget: the prompt size by source, in bytes and tokens."""
+
+import threading
+import time
+
+
+def test_tokenizer_loaded_in_background(make_filter, dfd):
+    debug_filter = make_filter()
+    release = threading.Event()
+
+    def slow_loader(argument):
+        release.wait(5)
+        return lambda text: len(text.split())
+
+    debug_filter.tokens.register("slow", slow_loader)
+    debug_filter.tokens.configure("slow:words")
+
+    started = time.monotonic()
+    assert debug_filter.tokens.count("one two three four five six seven eight") == dfd.TokenCounter.estimate(39)
+    assert time.monotonic() - started < 1
+    assert "heuristic" in debug_filter.tokens.label
+
+    release.set()
+    deadline = time.monotonic() + 5
+    while debug_filter.tokens.encode is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert debug_filter.tokens.count("one two three four five six seven eight") == 8
+    assert debug_filter.tokens.label == "slow:words"
+
+
+def test_images_without_source_or_bytes(make_filter, dfd, monkeypatch):
+    debug_filter = make_filter()
+    body = {"messages": [{"role": "user", "content": [{"type": "text", "text": "What is it?"}, {"type": "image_url", "image_url": {"url": ""}}]}]}
+
+    assert "images" not in debug_filter._context_budget(body)["sources"]
+    assert debug_filter._context_budget({"messages": [{"role": "user", "content": "Hi", "images": ["abcd"]}]})["sources"]["images"]["count"] == 1
+
+    monkeypatch.setattr(dfd.Config, "CONTEXT_SOURCES", ["system", "user"])
+    assert list(debug_filter._context_budget(body)["sources"]) == ["user"]
@@ -0,0 +1,40 @@
+"""Large string digests: data URIs, raw base64 and long texts."""
+
+import base64
+import os
+
+
+def test_raw_base64_digested(make_filter):
+    debug_filter = make_filter()
+    value = base64.b64encode(b"\x89PNG\r\n\x1a\n" + os.urandom(6000)).decode()
+
+    digest = debug_filter._digest_string(value)
+
+    assert digest["digest"] == "base64"
+    assert digest["mime"] == "image/png"
+    assert digest["bytes"] == 6008
+
+
+def test_base64_looking_ends_not_base64(make_filter):
+    debug_filter = make_filter()
+    ends = base64.b64encode(os.urandom(300)).decode()
+    value = ends + "Plain text, with spaces and punctuation. " * 500 + ends
+
+    digest = debug_filter._digest_string(value)
+
+    assert digest["digest"] == "text"
+
+
+def test_data_uri_digested(make_filter):
+    debug_filter = make_filter()
+    value = "data:image/jpeg;base64," + base64.b64encode(os.urandom(3000)).decode()
+
+    digest = debug_filter._digest_string(value)
+
+    assert (digest["digest"], digest["mime"], digest["bytes"]) == ("data-uri", "image/jpeg", 3000)
+
+
+def test_short_string_unchanged(make_filter):
+    debug_filter = make_filter()
+
+    assert debug_filter._digest_string("short") == "short"
@@ -0,0 +1,122 @@
+"""Smoke test of each feature: a request through inlet, stream and outlet, without error and with its output.
+
+The features whose output needs several requests or filters are tested in their own files.
+"""
+
+import os
+import time
+
+import pytest
+
+
+def wait_for(predicate, timeout=5.0):
+    """Wait for a background thread (span exporter) to produce its output."""
+
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return predicate()
+
+
+def log_text(tmp_path):
+    return "".join(path.read_text() for path in tmp_path.glob("debug_filter_data*.log*"))
+
+
+FEATURES = {
+    "capture_plan_idle": (
+        {"send_to_chat": False, "log_inlet": False, "log_outlet": False},
+        lambda debug_filter, reply, tmp_path: reply == "Hello!" and not debug_filter._get_plan().active,
+    ),
+    "digest_large_data": (
+        {"show_body": True},
+        lambda debug_filter, reply, tmp_path: '"digest": "text"' in reply,
+    ),
+    "obfuscation": (
+        {"show_user": True},
+        lambda debug_filter, reply, tmp_path: "**** OBFUSCATED ****" in reply and "alice@example.com" not in reply,
+    ),
+    "log_stream": (
+        {"log_stream": True},
+        lambda debug_filter, reply, tmp_path: '"matches_final_message": true' in reply,
+    ),
+    "stream_keep_events": (
+        {"log_stream": True, "stream_keep_events": True},
+        lambda debug_filter, reply, tmp_path: '"events"' in reply,
+    ),
+    "send_to_file": (
+        {"send_to_file": True},
+        lambda debug_filter, reply, tmp_path: "OUTLET DATA" in log_text(tmp_path),
+    ),
+    "file_per_process": (
+        {"send_to_file": True, "file_per_process": True},
+        lambda debug_filter, reply, tmp_path: (tmp_path / f"debug_filter_data.{os.getpid()}.log").exists(),
+    ),
+    "trace_export": (
+        {"trace_export": True},
+        lambda debug_filter, reply, tmp_path: wait_for(lambda: "chat.request" in ((tmp_path / "traces.jsonl").read_text() if (tmp_path / "traces.jsonl").exists() else "")),
+    ),
+    "show_memory": (
+        {"show_memory": True, "show_body": True},
+        lambda debug_filter, reply, tmp_path: '"memory"' in reply and '"objects"' in reply,
+    ),
+    "schema_inference": (
+        {"schema_inference": True},
+        lambda debug_filter, reply, tmp_path: debug_filter.schema.requests >= 1 and "inlet.body" in debug_filter.schema.roots,
+    ),
+    "rolling_stats": (
+        {"rolling_stats": True},
+        lambda debug_filter, reply, tmp_path: "MODEL STATS" in reply,
+    ),
+    "section_cache": (
+        {"show_user": True, "show_model": True, "show_tools": True},
+        lambda debug_filter, reply, tmp_path: '"__model__"' in reply and debug_filter.section_cache.misses >= 2,
+    ),
+    "stream_monitor": (
+        {"stream_monitor": True},
+        lambda debug_filter, reply, tmp_path: "STREAM MONITOR" in reply,
+    ),
+    "tail_socket": (
+        {"tail_socket": "{tmp}/tail.sock"},
+        lambda debug_filter, reply, tmp_path: debug_filter.tail is not None and debug_filter.tail.server is not None,
+    ),
+    "flight_recorder": (
+        {"flight_recorder": True},
+        lambda debug_filter, reply, tmp_path: len(debug_filter.flight_recorder) == 1 and not (tmp_path / "flight.jsonl").exists(),
+    ),
+    "offload": (
+        {"offload_threshold_kb": 1, "show_body": True, "log_stream": True},
+        lambda debug_filter, reply, tmp_path: "STREAM DATA" in reply and "OUTLET DATA" in reply,
+    ),
+    "sink_profiles": (
+        {"send_to_file": True, "chat_profile": "summary", "file_profile": "full"},
+        lambda debug_filter, reply, tmp_path: '"body"' not in reply and '"body"' in log_text(tmp_path),
+    ),
+    "prefix_analysis": (
+        {"prefix_analysis": True},
+        lambda debug_filter, reply, tmp_path: len(debug_filter.prefixes.chats) == 1, # Compared from the second turn
+    ),
+    "context_budget": (
+        {"context_budget": True},
+        lambda debug_filter, reply, tmp_path: "CONTEXT BUDGET" in reply,
+    ),
+}
+
+
+@pytest.mark.parametrize("feature", FEATURES)
+def test_feature_request(feature, make_filter, request_factory, run, tmp_path, capsys):
+    valves, check = FEATURES[feature]
+    valves = {name: value.replace("{tmp}", str(tmp_path)) if isinstance(value, str) else value for name, value in valves.items()}
+    debug_filter = make_filter(**valves)
+    request = request_factory(content="Hello there " * 2000)
+
+    try:
+        reply = run(request.run(debug_filter))["messages"][-1]["content"]
+        output = capsys.readouterr().out
+
+        assert "ERROR |" not in output
+        assert check(debug_filter, reply, tmp_path)
+        assert not debug_filter.pending_requests
+    finally:
+        if debug_filter.tail is not None:
+            debug_filter.tail.release()
+
@@ -0,0 +1,61 @@
+"""Flight recorder: dump of the last requests when a trigger fires."""
+
+import json
+import threading
+
+
+def test_empty_reply_dumps_recorder(make_filter, request_factory, run, tmp_path):
+    debug_filter = make_filter(flight_recorder=True)
+
+    run(request_factory(message_id="m1").run(debug_filter))
+    run(request_factory(message_id="m2").run(debug_filter, ("",)))
+
+    dumps = [json.loads(line) for line in (tmp_path / "flight.jsonl").read_text().splitlines()]
+    assert len(dumps) == 1
+    assert dumps[0]["triggers"] == ["empty reply"]
+    assert [request["message_id"] for request in dumps[0]["requests"]] == ["m1", "m2"]
+
+
+def test_large_dump_written_by_worker(make_filter, request_factory, run, tmp_path, monkeypatch):
+    debug_filter = make_filter(flight_recorder=True, offload_threshold_kb=1)
+    threads = []
+    flight_dump = debug_filter._flight_dump
+    monkeypatch.setattr(debug_filter, "_flight_dump", lambda *args, **kwargs: threads.append(threading.current_thread()) or flight_dump(*args, **kwargs))
+
+    run(request_factory(content="word " * 1000).run(debug_filter, ("",)))
+
+    assert threads and threads[0] is not threading.main_thread()
+    assert "word word" in (tmp_path / "flight.jsonl").read_text()
+
+
+def read_dumps(tmp_path):
+    return [json.loads(line) for line in (tmp_path / "flight.jsonl").read_text().splitlines()]
+
+
+def test_stalled_stream_dumped_by_next_inlet(make_filter, request_factory, run, tmp_path, dfd, monkeypatch):
+    monkeypatch.setattr(dfd.Config, "FLIGHT_STALL_SECONDS", 0.0)
+    debug_filter = make_filter(flight_recorder=True)
+    stalled = request_factory(message_id="m1")
+
+    run(stalled.inlet(debug_filter))
+    run(stalled.stream(debug_filter, ("Hel", "lo"), finish=False)) # No finish_reason, no outlet
+    run(request_factory(message_id="m2").inlet(debug_filter))
+
+    dumps = read_dumps(tmp_path)
+    assert len(dumps) == 1 and dumps[0]["trigger_message_id"] == "m1"
+    assert dumps[0]["triggers"][0].startswith("stream without finish_reason after")
+    assert "m1" not in debug_filter.debug_flight_temp
+
+
+def test_request_evicted_without_outlet_dumped(make_filter, request_factory, run, tmp_path, dfd, monkeypatch):
+    monkeypatch.setattr(dfd.Config, "REQUEST_MAX_PENDING", 1)
+    debug_filter = make_filter(flight_recorder=True)
+
+    run(request_factory(message_id="m1").inlet(debug_filter))
+    run(request_factory(message_id="m2").inlet(debug_filter)) # Evicts m1, dumped by the same inlet
+    assert [dump["trigger_message_id"] for dump in read_dumps(tmp_path)] == ["m1"]
+    run(request_factory(message_id="m3").inlet(debug_filter))
+
+    dumps = read_dumps(tmp_path)
+    assert [dump["trigger_message_id"] for dump in dumps] == ["m1", "m2"]
+    assert all(dump["triggers"][0].startswith("no outlet after") for dump in dumps)
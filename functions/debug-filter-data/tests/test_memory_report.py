@@ -0,0 +1,18 @@
+"""Deep memory report of the sections."""
+
+
+class Tool:
+    def __init__(self):
+        self.spec = {"name": "search", "description": "x" * 1000}
+        self.callable = None
+
+
+def test_object_paths_listed_once(make_filter):
+    debug_filter = make_filter()
+
+    report = debug_filter._memory_report({"__tools__": {"search": Tool()}})
+
+    top = [line.split(":")[0] for line in report["__tools__"]["top"]]
+    assert len(top) == len(set(top))
+    assert "__tools__.search" in top and "__tools__.search.spec" in top
+    assert report["__tools__"]["bytes"] > 1000
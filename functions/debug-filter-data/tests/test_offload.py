@@ -0,0 +1,63 @@
+"""Formatting offload: large data formatted in a worker thread, bounded by the formatting timeout."""
+
+import threading
+import time
+
+
+def test_timeout_returns_without_waiting_for_worker(make_filter, run, dfd):
+    debug_filter = make_filter(offload_threshold_kb=1, offload_timeout_seconds=0.1)
+    plan = debug_filter._get_plan()
+    release = threading.Event()
+    cancelled = []
+
+    def slow(cancel=None):
+        release.wait(5)
+        cancelled.append(cancel.is_set())
+        return ["full report"]
+
+    started = time.monotonic()
+    result = run(debug_filter._offload(plan, "x" * 4096, slow, on_timeout=[dfd.Config.OFFLOAD_TRUNCATED]))
+    elapsed = time.monotonic() - started
+    release.set()
+
+    assert result == [dfd.Config.OFFLOAD_TRUNCATED]
+    assert elapsed < 1
+    deadline = time.monotonic() + 5
+    while not cancelled and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cancelled == [True]
+
+
+def test_cancelled_sanitize_truncates_remaining_containers(make_filter, dfd):
+    debug_filter = make_filter()
+    cancel = threading.Event()
+    cancel.set()
+
+    assert debug_filter._sanitize_data({"messages": [{"content": "Hello"}]}, cancel) == dfd.Config.OFFLOAD_TRUNCATED
+    assert debug_filter._render_section("body", {"model": "llama3"}, cancel).count(dfd.Config.OFFLOAD_TRUNCATED.strip()) == 1
+    assert len(debug_filter.section_cache.entries) == 0
+
+
+def test_worker_formats_with_the_plan_of_the_hook(make_filter, run, monkeypatch):
+    debug_filter = make_filter(offload_threshold_kb=1)
+    plan = debug_filter._get_plan()
+    compiled = []
+    monkeypatch.setattr(debug_filter, "_get_plan", lambda: compiled.append(threading.current_thread().name) or plan)
+
+    chunks = run(debug_filter._offload(plan, "x" * 4096, lambda cancel=None: list(debug_filter._format_json_chunks({"text": "x" * 4096}, cancel, plan))))
+
+    assert "".join(chunks).startswith("{")
+    assert compiled == []
+
+
+def test_executor_of_another_size_replaced_and_shut_down(make_filter):
+    debug_filter = make_filter(offload_workers=2)
+    first = debug_filter._get_executor(debug_filter._get_plan())
+    assert debug_filter._get_executor(debug_filter._get_plan()) is first
+
+    debug_filter.valves.offload_workers = 3
+    second = debug_filter._get_executor(debug_filter._get_plan())
+
+    assert second is not first
+    assert first._shutdown
+    assert not second._shutdown
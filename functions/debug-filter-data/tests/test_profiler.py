@@ -0,0 +1,20 @@
+"""Filter chain profiler: a start and an end probe measure the filters running between them."""
+
+
+def test_end_probe_measures_the_filters_in_between(make_filter, request_factory, run):
+    start = make_filter(profiler_role="start", send_to_chat=False)
+    end = make_filter(profiler_role="end", show_summary=True)
+    request = request_factory()
+
+    async def scenario():
+        body = {"model": request.model, "messages": list(request.messages)}
+        body = await start.inlet(body, **request.kwargs())
+        body["messages"].append({"role": "system", "content": "Context added by a filter in between"})
+        await end.inlet(body, **request.kwargs())
+        await request.stream(end, ("Hello!",))
+        return await request.outlet(end, "Hello!")
+
+    reply = run(scenario())["messages"][-1]["content"]
+
+    assert '"messages": "2 -> 3"' in reply
+    assert '"FILTER CHAIN"' in reply
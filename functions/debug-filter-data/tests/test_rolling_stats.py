@@ -0,0 +1,33 @@
+"""Rolling statistics: request metrics per model and task."""
+
+import time
+
+
+def test_generation_time_from_first_chunk(make_filter, request_factory, run):
+    debug_filter = make_filter(send_to_chat=False, rolling_stats=True)
+    request = request_factory()
+
+    run(request.inlet(debug_filter))
+    time.sleep(0.2) # Time to first chunk
+    for chunk in ("Hel", "lo!"):
+        run(request.stream(debug_filter, (chunk,), finish=chunk == "lo!"))
+        time.sleep(0.05)
+    run(request.outlet(debug_filter, "Hello!"))
+
+    metrics = debug_filter.stats.render("llama3 / chat")
+    assert metrics["requests"] == 1
+    assert metrics["chunks"]["mean"] == 2
+    assert 0.05 <= metrics["generation_time_s"]["mean"] < 0.2
+    assert metrics["total_time_s"]["mean"] >= 0.25
+
+
+def test_no_generation_time_without_stream(make_filter, request_factory, run):
+    debug_filter = make_filter(send_to_chat=False, rolling_stats=True)
+    request = request_factory()
+
+    run(request.inlet(debug_filter))
+    run(request.outlet(debug_filter, "Hello!"))
+
+    metrics = debug_filter.stats.render("llama3 / chat")
+    assert "generation_time_s" not in metrics and "chunks" not in metrics
+    assert metrics["total_time_s"]["mean"] >= 0
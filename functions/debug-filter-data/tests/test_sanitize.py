@@ -0,0 +1,90 @@
+"""Copy-on-write sanitizing: only the containers leading to a changed value are copied."""
+
+import json
+import tracemalloc
+
+
+def make_body(messages):
+    return {
+        "model": "llama3",
+        "user": {"name": "Alice", "email": "alice@example.com"},
+        "messages": [{"role": "user" if index % 2 else "assistant", "content": f"message {index} " + "x" * 2000} for index in range(messages)],
+    }
+
+
+def two_pass_sanitize(dfd, data):
+    """The previous path: obfuscated copy of every container, then a serializable copy of the result."""
+
+    def obfuscate(data, depth=0):
+        if depth > 10:
+            return data
+        if isinstance(data, dict):
+            return {k: dfd.Config.SECURITY_OBFUSCATE_MASK if k.lower() in [key.lower() for key in dfd.Config.SECURITY_OBFUSCATE_DATA] else obfuscate(v, depth + 1) for k, v in data.items()}
+        if isinstance(data, list):
+            return [obfuscate(item) for item in data]
+        return data
+
+    def make_serializable(obj):
+        if isinstance(obj, dict):
+            return {k: make_serializable(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [make_serializable(item) for item in obj]
+        return obj
+
+    return make_serializable(obfuscate(data))
+
+
+def peak_memory(function, *args):
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_unchanged_subtrees_shared(dfd, make_filter):
+    debug_filter = make_filter()
+    body = make_body(10)
+
+    sanitized = debug_filter._sanitize_data(body)
+
+    assert sanitized is not body and sanitized["user"] is not body["user"]
+    assert sanitized["user"]["email"] == dfd.Config.SECURITY_OBFUSCATE_MASK
+    assert body["user"]["email"] == "alice@example.com"
+    assert sanitized["messages"] is body["messages"]
+    assert all(copy is original for copy, original in zip(sanitized["messages"], body["messages"]))
+
+
+def test_unchanged_data_returned_as_is(make_filter):
+    debug_filter = make_filter()
+    data = {"messages": [{"role": "user", "content": "Hello"}], "options": {"temperature": 0.2}}
+
+    assert debug_filter._sanitize_data(data) is data
+
+
+def test_sanitize_memory_independent_of_payload(make_filter):
+    # 3000 messages (about 6 MB of JSON), one obfuscated key: the pass copies two small dicts only
+    debug_filter = make_filter()
+    body = make_body(3000)
+    debug_filter._sanitize_data(make_body(1)) # Plan compiled outside of the measure
+
+    peak = peak_memory(debug_filter._sanitize_data, body)
+
+    assert len(json.dumps(body)) > 6_000_000
+    assert peak < 100_000
+
+
+def test_sanitize_against_two_pass_and_encoding(dfd, make_filter):
+    # Same payload: the previous two-pass copy and the JSON encoding as baselines
+    debug_filter = make_filter()
+    body = make_body(3000)
+    debug_filter._sanitize_data(make_body(1))
+
+    assert two_pass_sanitize(dfd, body) == debug_filter._sanitize_data(body)
+    single_pass = peak_memory(debug_filter._sanitize_data, body)
+    two_pass = peak_memory(two_pass_sanitize, dfd, body)
+    encoding = peak_memory(json.dumps, body)
+
+    assert single_pass * 10 < two_pass
+    assert single_pass * 10 < encoding
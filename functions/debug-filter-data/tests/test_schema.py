@@ -0,0 +1,29 @@
+"""Schema inference: merged structure of the payloads, with drift detection."""
+
+
+def message_body(content):
+    return {"model": "llama3", "messages": [{"role": "user", "content": content}]}
+
+
+def test_multimodal_content_is_not_drift(dfd, monkeypatch):
+    monkeypatch.setattr(dfd.Config, "SCHEMA_STABLE_COUNT", 3)
+    schema = dfd.SchemaAccumulator()
+    parts = [{"type": "text", "text": "What is it?"}, {"type": "image_url", "image_url": {"url": "data:image/png;base64,AAAA"}}]
+
+    for _ in range(5):
+        assert schema.add("inlet.body", message_body("Hello")) == []
+    drifts = [schema.add("inlet.body", message_body(parts if index % 2 else "Hello")) for index in range(6)]
+
+    assert drifts == [[]] * 6
+    assert schema.add("inlet.body", {**message_body("Hello"), "stream": True}) == ["inlet.body.stream: new key"]
+
+
+def test_node_budget_bounds_the_schema(dfd, monkeypatch):
+    monkeypatch.setattr(dfd.Config, "SCHEMA_MAX_NODES", 50)
+    schema = dfd.SchemaAccumulator()
+
+    for index in range(20):
+        schema.add("inlet.body", {f"key_{index}_{child}": {"nested": [index]} for child in range(10)})
+
+    assert schema.nodes == 50 == sum(schema.count_nodes(root) for root in schema.roots.values())
+    assert schema.render()["inlet.body"]["not_tracked"] > 0
@@ -0,0 +1,93 @@
+"""Section cache: rendered sections served while their fingerprint is unchanged."""
+
+import pytest
+
+
+class ToolModel:
+    def __init__(self, specs):
+        self.id = "search"
+        self.name = "Search"
+        self.specs = specs
+
+
+def test_fingerprint_by_content_and_identity(make_filter):
+    debug_filter = make_filter()
+    model = {"id": "llama3", "info": {"params": {"system": "s" * 1000}}, "filters": [{"id": "f1"}]}
+
+    fingerprint = debug_filter._fingerprint(model)
+
+    assert debug_filter.section_cache.known_fingerprint(model) is not None
+    assert debug_filter._fingerprint({"id": "llama3", "info": {"params": {"system": "s" * 1000}}, "filters": [{"id": "f1"}]}) == fingerprint
+    model["actions"] = [] # A length change is detected at once
+    assert debug_filter._fingerprint(model) != fingerprint
+
+
+def test_fingerprint_of_object_modified_in_place_expires(make_filter, dfd, monkeypatch):
+    debug_filter = make_filter()
+    model = {"id": "llama3", "info": {"params": {"system": "Be brief."}}}
+    fingerprint = debug_filter._fingerprint(model)
+
+    model["info"]["params"]["system"] = "Be long." # Same lengths, reused by identity within the TTL
+    assert debug_filter._fingerprint(model) == fingerprint
+
+    monkeypatch.setattr(dfd.Config, "CACHE_FINGERPRINT_TTL", 0.0)
+    assert debug_filter._fingerprint(model) != fingerprint
+    assert '"Be long."' in debug_filter._render_section("__model__", model)
+
+
+def test_user_section_keyed_by_user_id(make_filter):
+    debug_filter = make_filter()
+
+    debug_filter._render_section("__user__", {"id": "u1", "name": "Alice"})
+    debug_filter._render_section("__user__", {"id": "u2", "name": "Alice"})
+
+    assert debug_filter.section_cache.misses == 2
+    assert {key[1] for key in debug_filter.section_cache.entries} == {"u1", "u2"}
+
+
+def test_section_rendered_once(make_filter):
+    debug_filter = make_filter()
+    model = {"id": "llama3", "name": "Llama 3"}
+
+    first = debug_filter._render_section("__model__", model)
+    second = debug_filter._render_section("__model__", model)
+
+    assert first is second
+    assert (debug_filter.section_cache.hits, debug_filter.section_cache.misses) == (1, 1)
+
+
+def test_tool_specs_serialized_once(make_filter):
+    debug_filter = make_filter()
+    specs = [{"name": "search", "parameters": {"query": {"type": "string"}}}]
+
+    first = debug_filter.adapters.adapt(ToolModel(specs))
+    debug_filter.adapters.sizes[id(specs)] = (specs, -1) # Served from the size cache
+    second = debug_filter.adapters.adapt(ToolModel(specs))
+
+    assert first["specs"] == ["search"] and first["specs_size"] > 0
+    assert second["specs_size"] == -1
+
+
+def test_large_section_streamed_without_caching(make_filter, dfd, monkeypatch):
+    monkeypatch.setattr(dfd.Config, "CACHE_MAX_SECTION_SIZE", 1000)
+    monkeypatch.setattr(dfd.Config, "LOG_CHUNK_SIZE", 256)
+    debug_filter = make_filter(digest_large_data=False)
+    rendered = debug_filter._render_section
+    monkeypatch.setattr(debug_filter, "_render_section", lambda *args: pytest.fail("large section joined"))
+
+    chunks = list(debug_filter._format_json_chunks({"__model__": {"id": "llama3", "system": ["word"] * 2000}}))
+
+    assert len(chunks) > 10 and max(len(chunk) for chunk in chunks) < 1000
+    assert '"system"' in "".join(chunks) and not debug_filter.section_cache.entries
+    assert rendered("__model__", {"id": "llama3"})
+
+
+def test_inlet_keeps_no_formatted_report(make_filter, request_factory, run):
+    debug_filter = make_filter()
+    request = request_factory()
+
+    run(request.inlet(debug_filter))
+
+    temp = debug_filter.debug_inlet_temp[request.metadata["message_id"]]
+    assert set(temp) == {"inlet_view", "inlet_timestamp"}
+    assert all(isinstance(value, dict) for value in temp["inlet_view"].values())
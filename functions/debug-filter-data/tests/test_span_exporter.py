@@ -0,0 +1,24 @@
+"""Span exporter: batched export by a worker thread started on demand and stopped when idle."""
+
+import threading
+import time
+
+
+def test_spans_queued_while_worker_stops_are_exported(dfd, tmp_path, monkeypatch):
+    monkeypatch.setattr(dfd.Config, "TRACE_FLUSH_INTERVAL", 0.05)
+    path = tmp_path / "traces.jsonl"
+    exporter = dfd.SpanExporter(str(path))
+    exporter.thread = threading.current_thread() # A worker about to stop (see SpanExporter.run)
+
+    with exporter.lock: # The worker holds the lock: queue checked empty, thread about to be cleared
+        queued = threading.Thread(target=exporter.export, args=([{"name": "chat.request"}],))
+        queued.start()
+        time.sleep(0.05)
+        assert not exporter.queue
+        exporter.thread = None
+    queued.join(5)
+
+    deadline = time.monotonic() + 5
+    while not (path.exists() and "chat.request" in path.read_text()) and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert "chat.request" in path.read_text()
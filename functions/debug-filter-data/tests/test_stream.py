@@ -0,0 +1,23 @@
+"""Stream logging: the response reconstructed from the stream events."""
+
+
+def test_reconstructed_stream_in_chat_report(make_filter, request_factory, run):
+    debug_filter = make_filter(log_stream=True)
+    request = request_factory()
+
+    reply = run(request.run(debug_filter, ("Hel", "lo", "!")))["messages"][-1]["content"]
+
+    assert "STREAM DATA [3 items]" in reply
+    assert '"content": "Hello!"' in reply
+    assert not request_factory().metadata["message_id"] in debug_filter.debug_stream_temp
+
+
+def test_reconstructed_stream_offloaded(make_filter, request_factory, run, tmp_path):
+    # Stream data larger than the threshold: formatted in a worker thread
+    debug_filter = make_filter(log_stream=True, send_to_file=True, offload_threshold_kb=1)
+    request = request_factory()
+
+    reply = run(request.run(debug_filter, ("word " * 400, "end")))["messages"][-1]["content"]
+
+    assert '"content_length": 2003' in reply
+    assert "STREAM RECONSTRUCTED" in (tmp_path / "debug_filter_data.log").read_text()
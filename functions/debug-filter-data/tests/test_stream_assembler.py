@@ -0,0 +1,30 @@
+"""Stream assembler: response reconstructed from the stream events."""
+
+
+def assembled(dfd, *parts):
+    assembler = dfd.StreamAssembler()
+    for part in parts:
+        assembler.add({"choices": [{"index": 0, "delta": {"content": part}, "finish_reason": None}]})
+    return assembler
+
+
+def test_whitespace_only_difference_matches(dfd):
+    data = assembled(dfd, "Hello", " world").to_dict("\n  Hello world\n")
+
+    assert data["matches_final_message"] is True
+    assert "first_difference_at" not in data
+
+
+def test_first_difference_in_content(dfd):
+    data = assembled(dfd, "  Hello", " world").to_dict("\nHello there")
+
+    assert data["matches_final_message"] is False
+    assert data["content"][data["first_difference_at"]:] == "world"
+
+
+def test_tool_calls_in_numeric_index_order(dfd):
+    assembler = dfd.StreamAssembler()
+    for index in (10, 2, "extra", 1):
+        assembler.add({"choices": [{"index": 0, "delta": {"tool_calls": [{"index": index, "id": f"call_{index}", "function": {"name": "search", "arguments": "{}"}}]}, "finish_reason": None}]})
+
+    assert [tool_call["index"] for tool_call in assembler.to_dict()["tool_calls"]] == [1, 2, 10, "extra"]
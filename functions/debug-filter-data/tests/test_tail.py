@@ -0,0 +1,84 @@
+"""Live tail server: shared by path, owner-only socket, stale socket detection and start back-off."""
+
+import os
+import socket
+import stat
+import time
+
+
+def test_server_shared_and_released(dfd, tmp_path):
+    path = str(tmp_path / "tail.sock")
+    first = dfd.TailServer.get(path)
+    second = dfd.TailServer.get(path)
+
+    assert first is second and first.server is not None
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+    first.release()
+    assert second.server is not None and os.path.exists(path)
+
+    second.release()
+    assert second.server is None and not os.path.exists(path)
+
+
+def test_probe_of_a_live_socket_not_a_subscriber(dfd, tmp_path):
+    path = str(tmp_path / "tail.sock")
+    server = dfd.TailServer.get(path)
+    try:
+        other = dfd.TailServer(path)
+        other.start()
+        time.sleep(0.2)
+
+        assert other.server is None
+        assert server.subscribers == []
+    finally:
+        server.release()
+
+
+def test_subscriber_registered(dfd, tmp_path):
+    path = str(tmp_path / "tail.sock")
+    server = dfd.TailServer.get(path)
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.connect(path)
+            connection.sendall(b"stage=inlet\n")
+            deadline = time.monotonic() + 2
+            while not server.subscribers and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            assert server.wants({"stage": "inlet"}) and not server.wants({"stage": "outlet"})
+    finally:
+        server.release()
+
+
+def test_failed_start_backed_off(dfd, tmp_path, monkeypatch):
+    path = tmp_path / "not_a_socket"
+    path.write_text("kept")
+    starts = []
+    monkeypatch.setattr(dfd.TailServer, "start", lambda self, start=dfd.TailServer.start: starts.append(1) or start(self))
+
+    server = dfd.TailServer.get(str(path))
+    for _ in range(10):
+        server.wants(None)
+    try:
+        assert server.server is None and len(starts) == 1
+        assert path.read_text() == "kept"
+
+        # Retried after the back-off
+        monkeypatch.setattr(dfd.Config, "TAIL_RETRY_SECONDS", 0.0)
+        server.wants(None)
+        assert len(starts) == 2
+    finally:
+        server.release()
+
+
+def test_socket_private_without_process_umask(dfd, tmp_path, monkeypatch):
+    monkeypatch.setattr(os, "umask", lambda mask: (_ for _ in ()).throw(AssertionError("process umask changed")))
+    path = str(tmp_path / "tail.sock")
+    server = dfd.TailServer.get(path)
+    try:
+        assert server.server is not None
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+        assert os.listdir(tmp_path) == ["tail.sock"] # Private bind directory removed
+    finally:
+        server.release()
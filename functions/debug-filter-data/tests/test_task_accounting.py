@@ -0,0 +1,15 @@
+"""Background task accounting: the task calls of a chat turn, shown in the summary."""
+
+
+def test_task_calls_of_previous_turn_in_next_inlet(make_filter, request_factory, run):
+    debug_filter = make_filter(task_accounting=True, show_summary=True)
+
+    run(request_factory(message_id="m1").run(debug_filter))
+    for task in ("title_generation", "tags_generation", "title_generation"):
+        run(request_factory(message_id="m1", task=task).run(debug_filter))
+    reply = run(request_factory(message_id="m2").run(debug_filter))["messages"][-1]["content"]
+
+    assert '"previous_turn"' in reply
+    assert '"message_id": "m1"' in reply and '"calls": 3' in reply
+    assert '"title_generation": {\n            "calls": 2,\n            "timed": 2' in reply
+    assert debug_filter.tasks.turns["c1"]["message_id"] == "m2"
@@ -0,0 +1,45 @@
+"""Background task capture policies, applied the same way by inlet, stream and outlet."""
+
+
+def test_skipped_task_not_captured(make_filter, request_factory, run, tmp_path):
+    debug_filter = make_filter(log_stream=True, send_to_file=True, task_policies="title_generation:skip")
+    request = request_factory(task="title_generation", message_id="m2")
+
+    reply = run(request.run(debug_filter))["messages"][-1]["content"]
+
+    assert reply == "Hello!"
+    assert request.statuses() == []
+    log_file = tmp_path / "debug_filter_data.log"
+    assert not log_file.exists() or log_file.read_text() == ""
+    assert not debug_filter.pending_requests
+
+
+def test_summary_task_without_stream_data(make_filter, request_factory, run, tmp_path):
+    debug_filter = make_filter(log_stream=True, send_to_file=True, show_body=True, task_policies="*:summary")
+    request = request_factory(task="title_generation", message_id="m2")
+
+    reply = run(request.run(debug_filter))["messages"][-1]["content"]
+
+    assert '"summary"' in reply
+    assert "STREAM DATA" not in reply
+    assert '"body"' not in reply
+    assert "STREAM" not in (tmp_path / "debug_filter_data.log").read_text()
+    assert not debug_filter.pending_requests
+
+
+def test_chat_request_captured_with_task_policies(make_filter, request_factory, run):
+    debug_filter = make_filter(log_stream=True, task_policies="*:skip")
+
+    reply = run(request_factory().run(debug_filter))["messages"][-1]["content"]
+
+    assert "STREAM DATA" in reply
+
+
+def test_not_captured_request_temps_dropped(make_filter, request_factory, run):
+    debug_filter = make_filter(log_stream=True, capture_only="model:other")
+
+    reply = run(request_factory().run(debug_filter))["messages"][-1]["content"]
+
+    assert reply == "Hello!"
+    assert not debug_filter.pending_requests
+    assert not any(debug_filter.request_temps)